@@ -0,0 +1,279 @@
+# === backtest.py ===
+# Backtest vetorizado da estratégia sobre o histórico M5.
+#
+# Aplica as mesmas regras do robô (suporte/resistência, lateralização, retração, entrada,
+# pavios anteriores e velas esticadas M15/M30/H1) como operações de array sobre toda a
+# linha do tempo, em vez de repetir o loop de main.py vela a vela.
+#
+# Como o histórico só tem o OHLC final de cada vela, a vela do sinal é aproximada assim:
+# - "toque" no nível = o nível está entre a mínima e a máxima da vela (preço de entrada = nível);
+# - retração = mesma regra de main.py aplicada ao OHLC final da vela;
+# - se a vela toca suporte e resistência, vale a compra (mesma prioridade de evaluate_entry);
+# - a janela de entrada (primeiros 120 s da vela M5) não é modelada: o OHLC não diz em que
+#   segundo o preço tocou o nível, então todo toque conta como dentro da janela.
+# O resultado segue check_signal_success: o preço de saída é o fechamento da vela que encerra
+# a expiração (expiry_bars=1 é o preço que main.py lê na abertura da vela seguinte).
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from support_resistance import calculate_support_resistance_keys, price_keys
+from symbol_registry import get_symbol_info, price_points
+from lateralization import is_lateralization_batch
+from patterns import retracement_mask, previous_wicks_mask, stretched_mask
+
+# Quantidade de velas M5 que o robô analisa a cada passada (mesmo valor de main.py)
+LOOKBACK = 100
+
+# Quantidade de janelas avaliadas por bloco (limita a memória dos arrays intermediários)
+CHUNK_SIZE = 20000
+
+# Versão das regras do backtest: incrementar sempre que uma mudança alterar os sinais gerados
+# (invalida os resultados em cache do sweep.py)
+# 2: máscaras de padrões sobre o histórico inteiro; 3: níveis e toques em pontos inteiros
+RULES_VERSION = 3
+
+
+# Carrega o histórico M5 fechado de cada símbolo
+# :param symbols: Lista de símbolos
+# :param count: Quantidade de velas por símbolo (um ano de M5 ≈ 75.000 velas)
+# :param store: Histórico local (candle_store.CandleStore); as séries com velas suficientes são
+#               lidas dele e só as demais são buscadas no MT5
+# :return: Dicionário {símbolo: array de velas}; símbolos sem dados ficam de fora
+def load_history(symbols, count, store=None):
+    from mt5_collector import get_rates
+
+    history = {}
+    for symbol in symbols:
+        if store is not None and store.length(symbol, 5) >= count:
+            rates = store.read_rates(symbol, 5, count=count)
+        else:
+            rates = get_rates(symbol, 5, 1, count)  # start_pos=1 ignora a vela em formação
+        if rates is None or len(rates) < LOOKBACK + 1:
+            print(f"{symbol} Histórico insuficiente para backtest.")
+            continue
+        history[symbol] = rates
+    return history
+
+
+# Carrega o histórico M5 dos símbolos do config.yaml com a fonte de dados configurada (MT5 ou
+# replay) e o histórico local (historico.diretorio), completando as lacunas pela fonte.
+# Com o histórico local a fonte só é consultada para completar as séries (e o backtest roda
+# mesmo sem o terminal, se o histórico já tiver as velas)
+# :param bars: Velas M5 por símbolo
+# :return: Dicionário {símbolo: array de velas} ou None se não houver fonte nem histórico local
+def load_configured_history(bars):
+    import main as bot
+    from candle_store import CandleStore
+    from data_sources import create_data_source
+    from mt5_collector import initialize_mt5, shutdown_mt5, set_data_source, set_candle_store, fill_gaps
+
+    store = None
+    if bot.historico_diretorio:
+        store = CandleStore(os.path.join(bot.historico_diretorio, bot.data_source_config.get("type", "mt5")))
+    set_data_source(create_data_source(bot.data_source_config))
+    set_candle_store(store)
+    connected = initialize_mt5()
+    if not connected and store is None:
+        return None
+    try:
+        if connected and store is not None:
+            for symbol in bot.symbols:
+                fill_gaps(symbol, 5, bars)
+        history = load_history(bot.symbols, bars, store)
+        # Metadados dos símbolos lidos enquanto a fonte está conectada (usados depois pelo backtest)
+        for symbol in history:
+            get_symbol_info(symbol)
+    finally:
+        if connected:
+            shutdown_mt5()
+        if store is not None:
+            store.close()
+    return history
+
+
+def _stretched_previous_candle(times, rates, seconds):
+    """
+    Para cada vela M5, indica se a última vela fechada do timeframe maior (M15/M30/H1) está esticada.
+
+    As velas do timeframe maior são montadas a partir das próprias velas M5 (agrupadas pelo
+    início do período), com a mesma regra de is_candle_stretched.
+    """
+    buckets = times // seconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    open_ = rates['open'][starts]
+    close = rates['close'][ends]
+    high = np.maximum.reduceat(rates['high'], starts)
+    low = np.minimum.reduceat(rates['low'], starts)
+
+    stretched = stretched_mask(open_, high, low, close)
+
+    # Índice do período da vela e, portanto, do período anterior (a última vela fechada)
+    previous = np.cumsum(np.r_[True, buckets[1:] != buckets[:-1]]) - 2
+    return np.where(previous >= 0, stretched[np.maximum(previous, 0)], False)
+
+
+def backtest_symbol(rates, symbol, min_distance_pips, min_retr_pct, min_touches=2,
+                    min_distance_between_touches=5, tolerance_pips=2, min_region_separation=10,
+                    expiry_bars=1, chunk_size=CHUNK_SIZE):
+    """
+    Executa o backtest de um símbolo sobre todo o histórico.
+
+    :param rates: Array estruturado de velas M5 fechadas, em ordem cronológica
+    :param symbol: Par de moedas (ex: "EURUSD")
+    :param expiry_bars: Quantidade de velas até a expiração (1 = fechamento da vela do sinal)
+    :return: Dicionário de arrays dos sinais: 'time', 'direction' (1 = compra, -1 = venda),
+             'entry_price', 'exit_price' e 'success'
+    """
+    n_windows = len(rates) - LOOKBACK + 1 - (expiry_bars - 1)
+    if n_windows <= 0:
+        empty = np.empty(0)
+        return {'time': empty.astype(np.int64), 'direction': empty.astype(np.int8),
+                'entry_price': empty, 'exit_price': empty, 'success': empty.astype(bool)}
+
+    # Janelas deslizantes (sem cópia): a janela k termina na vela k + LOOKBACK - 1
+    windows = np.lib.stride_tricks.sliding_window_view(rates, LOOKBACK)[:n_windows]
+    current = rates[LOOKBACK - 1:LOOKBACK - 1 + n_windows]
+
+    # Retração da vela atual (mesma regra de main.py, com o OHLC final da vela)
+    body_size = np.abs(current['close'] - current['open'])
+    has_retraced = (body_size > 0.00001) & retracement_mask(
+        current['open'], current['high'], current['low'], current['close'], min_retr_pct)
+
+    # Suporte e resistência só nas velas que ainda podem gerar sinal, em blocos.
+    # As chaves de bin dependem só do preço: são calculadas uma vez para todo o histórico e
+    # as janelas de velas relevantes (sem as 6 mais recentes) são views deslizantes sobre elas.
+    # Preços em pontos inteiros (symbol_registry); a tolerância também vai em pontos
+    info = get_symbol_info(symbol)
+    tolerance = tolerance_pips * info.pip_points
+    lows = price_points(rates, 'low', info.point)
+    highs = price_points(rates, 'high', info.point)
+    relevant = LOOKBACK - 6
+    low_windows = np.lib.stride_tricks.sliding_window_view(price_keys(lows, tolerance), relevant)
+    high_windows = np.lib.stride_tricks.sliding_window_view(price_keys(highs, tolerance), relevant)
+
+    eligible = np.flatnonzero(has_retraced)
+    has_levels = np.zeros(n_windows, bool)
+    supports = np.zeros(n_windows, np.int64)
+    resistances = np.zeros(n_windows, np.int64)
+    for start in range(0, len(eligible), chunk_size):
+        rows = eligible[start:start + chunk_size]
+        support_keys, resistance_keys, valid = calculate_support_resistance_keys(
+            low_windows[rows],
+            high_windows[rows],
+            min_touches=min_touches,
+            min_distance_between_touches=min_distance_between_touches,
+            min_region_separation=min_region_separation
+        )
+        rows = rows[valid]
+        has_levels[rows] = True
+        supports[rows] = np.rint(support_keys[valid] * tolerance)
+        resistances[rows] = np.rint(resistance_keys[valid] * tolerance)
+
+    # Entrada: abertura entre os níveis, com toque no nível e distância mínima, tudo em pontos
+    # (velas sem nível nunca geram sinal)
+    open_price = price_points(current, 'open', info.point)
+    low = lows[LOOKBACK - 1:LOOKBACK - 1 + n_windows]
+    high = highs[LOOKBACK - 1:LOOKBACK - 1 + n_windows]
+    min_distance = min_distance_pips * info.pip_points
+
+    window = has_levels & (supports < open_price) & (open_price < resistances)
+    buy = window & (low <= supports) & (supports <= high) & (np.abs(open_price - supports) >= min_distance)
+    sell = window & ~buy & (low <= resistances) & (resistances <= high) & (np.abs(resistances - open_price) >= min_distance)
+    directions = buy.astype(np.int8) - sell.astype(np.int8)
+
+    # Lateralização só precisa ser avaliada onde há candidato; os pavios das duas velas anteriores
+    # saem da máscara do histórico inteiro (vela k da janela atual = vela k + LOOKBACK - 1)
+    candidates = np.flatnonzero(directions)
+    keep = is_lateralization_batch(windows[candidates])
+    all_directions = np.zeros(len(rates), np.int8)
+    all_directions[LOOKBACK - 1:LOOKBACK - 1 + n_windows] = directions
+    wicks = previous_wicks_mask(rates['open'], rates['high'], rates['low'], rates['close'], all_directions)
+    keep &= wicks[LOOKBACK - 1:][candidates]
+
+    # Velas esticadas no M15/M30/H1 conforme o minuto da vela (mesmas faixas de main.py)
+    times = rates['time']
+    minute = (current['time'][candidates] // 60) % 60
+    for seconds, active in ((900, minute % 15 >= 10), (1800, minute % 30 >= 20), (3600, minute >= 40)):
+        stretched = _stretched_previous_candle(times, rates, seconds)[LOOKBACK - 1:][candidates]
+        keep &= ~active | stretched
+
+    signal_idx = candidates[keep]
+    direction = directions[signal_idx]
+    entry_points = np.where(direction == 1, supports[signal_idx], resistances[signal_idx])
+    exit_index = signal_idx + LOOKBACK - 1 + expiry_bars - 1
+    exit_points = price_points(rates[exit_index], 'close', info.point)
+    entry_price = info.to_price(entry_points)
+    exit_price = rates['close'][exit_index]
+
+    # Mesma semântica de check_signal_success
+    success = np.where(direction == 1, exit_points > entry_points, exit_points < entry_points)
+
+    return {
+        'time': current['time'][signal_idx],
+        'direction': direction,
+        'entry_price': entry_price,
+        'exit_price': exit_price,
+        'success': success,
+    }
+
+
+def run_backtest(history, min_distance_pips, min_retr_pct, **params):
+    """
+    Executa o backtest de todos os símbolos do histórico.
+
+    :param history: Dicionário {símbolo: array de velas M5}, ver load_history
+    :param params: Parâmetros repassados a backtest_symbol (suporte/resistência, expiry_bars, ...)
+    :return: Dicionário {símbolo: resultado de backtest_symbol}
+    """
+    return {
+        symbol: backtest_symbol(rates, symbol, min_distance_pips, min_retr_pct, **params)
+        for symbol, rates in history.items()
+    }
+
+
+# Imprime a tabela de resultados por símbolo e o total
+# :param results: Resultado de run_backtest
+def print_report(results):
+    total = success = 0
+    print(f"{'Símbolo':<10}{'Sinais':>8}{'Acertos':>9}{'Taxa':>8}")
+    for symbol, result in results.items():
+        n, hits = len(result['success']), int(result['success'].sum())
+        total += n
+        success += hits
+        rate = f"{hits / n:.1%}" if n else "-"
+        print(f"{symbol:<10}{n:>8}{hits:>9}{rate:>8}")
+    rate = f"{success / total:.1%}" if total else "-"
+    print(f"{'Total':<10}{total:>8}{success:>9}{rate:>8}")
+
+
+if __name__ == "__main__":
+    import main as bot
+
+    parser = argparse.ArgumentParser(description="Backtest vetorizado da estratégia sobre o histórico M5.")
+    parser.add_argument("--bars", type=int, default=75000, help="Velas M5 por símbolo (padrão: ~1 ano)")
+    parser.add_argument("--expiry", type=int, default=1, help="Velas até a expiração (padrão: 1)")
+    args = parser.parse_args()
+
+    history = load_configured_history(args.bars)
+    if history is None:
+        raise SystemExit(1)
+
+    started = time.perf_counter()
+    results = run_backtest(
+        history,
+        bot.min_distance_pips,
+        bot.min_retr_pct,
+        min_touches=bot.min_touches,
+        min_distance_between_touches=bot.min_distance_between_touches,
+        tolerance_pips=bot.tolerance_pips,
+        min_region_separation=bot.min_region_separation,
+        expiry_bars=args.expiry
+    )
+    print_report(results)
+    print(f"Backtest concluído em {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,92 @@
+# === batch_evaluation.py ===
+# Avalia todos os símbolos de uma vez sobre um array empilhado (símbolos x velas),
+# aplicando as mesmas regras do fluxo individual de main.py:
+# retração da vela atual, suporte/resistência, lateralização, entrada e pavios anteriores.
+
+import numpy as np
+
+from support_resistance import calculate_support_resistance_batch
+from lateralization import is_lateralization_batch
+from patterns import check_previous_wicks_batch
+from signals import evaluate_entry_batch
+from metrics import metrics
+
+
+def stack_rates(rates_by_symbol, count):
+    """
+    Empilha as velas de vários símbolos em um único array estruturado 2D.
+
+    :param rates_by_symbol: Dicionário {símbolo: array de velas} (ex: views do buffer do mt5_collector)
+    :param count: Quantidade de velas por símbolo; símbolos com menos velas ficam de fora
+    :return: Tupla (lista de símbolos empilhados, array 2D símbolos x count) ou ([], None)
+    """
+    symbols = [s for s, r in rates_by_symbol.items() if r is not None and len(r) >= count]
+    if not symbols:
+        return [], None
+    return symbols, np.stack([rates_by_symbol[s][-count:] for s in symbols])
+
+
+def update_retracement_batch(rates, has_retraced, min_retr_pct):
+    """
+    Atualiza o estado de retração de todos os símbolos com a vela atual (mesma regra de main.py).
+
+    :param rates: Array estruturado 2D (símbolos x velas); a última coluna é a vela atual
+    :param has_retraced: Array booleano com o estado anterior de retração
+    :param min_retr_pct: Percentual mínimo de retração (ex: 0.2)
+    :return: Tupla (novo has_retraced, body_size) por símbolo
+    """
+    current = rates[:, -1]
+    body_size = np.abs(current['close'] - current['open'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        retr_up = (current['high'] - current['close']) / body_size
+        retr_down = (current['close'] - current['low']) / body_size
+    retraced = (body_size > 0.00001) & ((retr_up >= min_retr_pct) | (retr_down >= min_retr_pct))
+    return np.asarray(has_retraced, dtype=bool) | retraced, body_size
+
+
+def evaluate_batch(rates, symbols, has_retraced, min_distance_pips, min_retr_pct, min_touches=2,
+                   min_distance_between_touches=5, tolerance_pips=2, min_region_separation=10, levels=None):
+    """
+    Executa o pipeline de regras para todos os símbolos em uma única passada vetorizada.
+
+    :param rates: Array estruturado 2D (símbolos x velas), ver stack_rates
+    :param symbols: Lista de símbolos, na mesma ordem das linhas de rates
+    :param has_retraced: Array booleano com o estado de retração antes desta passada
+    :param min_distance_pips: Distância mínima em pips da abertura até o suporte/resistência
+    :param min_retr_pct: Percentual mínimo de retração da vela atual
+    :param levels: Tupla (suportes, resistências) já calculados para estas velas (ex: os armados no
+                   trigger_index); se omitida, os níveis são calculados aqui
+    :return: Dicionário de arrays por símbolo: 'support', 'resistance' (NaN se não houver nível),
+             'lateral', 'direction' (1 = compra, -1 = venda, 0 = sem sinal), 'wicks_ok',
+             'has_retraced' e 'body_size'
+    """
+    has_retraced, body_size = update_retracement_batch(rates, has_retraced, min_retr_pct)
+
+    if levels is not None:
+        supports, resistances = (np.asarray(level, dtype=np.float64) for level in levels)
+    else:
+        with metrics.timer("sr"):
+            supports, resistances = calculate_support_resistance_batch(
+                rates,
+                symbols,
+                min_touches=min_touches,
+                min_distance_between_touches=min_distance_between_touches,
+                tolerance_pips=tolerance_pips,
+                min_region_separation=min_region_separation
+            )
+    with metrics.timer("lateralization"):
+        lateral = is_lateralization_batch(rates)
+    with metrics.timer("entry"):
+        directions = evaluate_entry_batch(rates, supports, resistances, symbols, min_distance_pips, has_retraced)
+    with metrics.timer("wicks"):
+        wicks_ok = check_previous_wicks_batch(rates, directions)
+
+    return {
+        'support': supports,
+        'resistance': resistances,
+        'lateral': lateral,
+        'direction': directions,
+        'wicks_ok': wicks_ok,
+        'has_retraced': has_retraced,
+        'body_size': body_size,
+    }
@@ -0,0 +1,390 @@
+# === benchmark.py ===
+# Benchmarks dos pontos críticos do pipeline de sinais.
+#
+# Mede calculate_support_resistance, is_lateralization, check_previous_wicks, evaluate_entry,
+# a avaliação em lote e uma passada completa de análise de main.py (buffer + regras + filtros)
+# sobre fixtures fixas: velas sintéticas determinísticas ou velas gravadas (.npy, ver
+# data_sources.record_rates), com 20, 200 e 2.000 símbolos e vários tamanhos de janela.
+#
+# Para cada caso são reportados os percentis de latência por chamada, o tempo de uma passada
+# por todos os símbolos e as alocações (pico e blocos, via tracemalloc). O resultado é salvo
+# em JSON para comparação entre execuções (--compare).
+#
+# O parsing do calendário do Investing.com também é medido (parser rápido contra o de referência
+# com BeautifulSoup), sobre uma semana sintética ou payloads gravados (--news DIR, ver
+# investing_news.py --gravar); os dois precisam extrair exatamente os mesmos eventos.
+#
+# Uso: python benchmark.py [--symbols 20,200,2000] [--lookbacks 100,500,2000] [--recorded DIR] [--news DIR]
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from support_resistance import calculate_support_resistance, calculate_support_resistance_batch
+from lateralization import is_lateralization
+from patterns import check_previous_wicks
+from signals import evaluate_entry
+from batch_evaluation import evaluate_batch
+
+# Mesmo layout do array retornado por MetaTrader5.copy_rates_from_pos
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
+
+# Pares base usados para nomear os símbolos sintéticos (com e sem JPY)
+BASE_SYMBOLS = ["EURUSD", "USDJPY", "GBPUSD", "EURJPY", "AUDCAD"]
+
+# Diretório padrão dos resultados
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "bench_results")
+
+
+def synthetic_rates(count, symbol, seed):
+    """
+    Gera velas M5 sintéticas determinísticas (passeio aleatório arredondado aos dígitos do par).
+
+    :param count: Quantidade de velas
+    :param symbol: Símbolo (define a escala de pips e os dígitos)
+    :param seed: Semente do gerador
+    :return: Array estruturado com o layout de RATES_DTYPE
+    """
+    rng = np.random.default_rng(seed)
+    jpy = "JPY" in symbol
+    pip, digits, base = (0.01, 3, 150.0) if jpy else (0.0001, 5, 1.1)
+
+    open_ = np.round(base + np.cumsum(rng.normal(0, pip * 3, count)), digits)
+    close = np.round(open_ + rng.normal(0, pip * 3, count), digits)
+    rates = np.zeros(count, dtype=RATES_DTYPE)
+    rates['open'] = open_
+    rates['close'] = close
+    rates['high'] = np.round(np.maximum(open_, close) + np.abs(rng.normal(0, pip * 1.5, count)), digits)
+    rates['low'] = np.round(np.minimum(open_, close) - np.abs(rng.normal(0, pip * 1.5, count)), digits)
+    rates['time'] = 1_700_000_100 // 300 * 300 + np.arange(count) * 300
+    rates['tick_volume'] = 100
+    rates['spread'] = 10
+    return rates
+
+
+def synthetic_universe(n_symbols, count):
+    """Dicionário {símbolo: velas} com n_symbols séries sintéticas."""
+    return {
+        f"{BASE_SYMBOLS[i % len(BASE_SYMBOLS)]}_{i}": synthetic_rates(count, BASE_SYMBOLS[i % len(BASE_SYMBOLS)], i)
+        for i in range(n_symbols)
+    }
+
+
+def recorded_universe(directory, n_symbols, count):
+    """
+    Dicionário {símbolo: velas} a partir de arquivos M5 gravados, repetidos até n_symbols séries.
+    """
+    files = sorted(f for f in os.listdir(directory) if f.endswith("_5.npy"))
+    if not files:
+        raise SystemExit(f"Nenhum arquivo M5 gravado em {directory}")
+    universe = {}
+    for i in range(n_symbols):
+        name = files[i % len(files)]
+        rates = np.load(os.path.join(directory, name))[-count:]
+        universe[f"{name[:-6]}_{i}"] = rates
+    return universe
+
+
+def synthetic_calendar_html(days=7, events_per_day=60, seed=0):
+    """
+    HTML sintético no formato da tabela do calendário do Investing.com (campo "data" da resposta):
+    separadores de dia e linhas de evento com moedas, impactos, feriados e entidades variadas.
+    """
+    rng = np.random.default_rng(seed)
+    currencies = ["USD", "EUR", "GBP", "JPY", "CHF", "AUD", "NZD", "CAD", "CNY", "BRL"]
+    names = ["Taxa de Desemprego", "Índice de Preços ao Consumidor (IPC) (Anual)", "Vendas no Varejo &amp; Serviços",
+             "PMI Industrial", "Discurso de Powell", "Decisão da Taxa de Juros", "Payroll (Não Agrícola)"]
+    day_start = 1_792_022_400  # 2026-10-14 00:00 UTC
+    rows = []
+    for day in range(days):
+        midnight = day_start + day * 86400
+        rows.append(f'<tr><td colspan="9" class="theDay" id="theDay{midnight}">'
+                    f'{datetime.fromtimestamp(midnight, timezone.utc):%d/%m/%Y}</td></tr>')
+        for i in range(events_per_day):
+            minute = int(rng.integers(0, 1440))
+            when = datetime.fromtimestamp(midnight + minute * 60, timezone.utc)
+            currency = currencies[int(rng.integers(0, len(currencies)))]
+            bulls = int(rng.integers(1, 4))
+            hour = "Dia todo" if rng.random() < 0.03 else f"{when:%H:%M}"
+            event_id = day * 1000 + i
+            name = names[int(rng.integers(0, len(names)))]
+            rows.append(
+                f'<tr id="eventRowId_{event_id}" class="js-event-item" event_attr_ID="{event_id % 997}" '
+                f'data-event-datetime="{when:%Y/%m/%d %H:%M:%S}">'
+                f'<td class="first left time js-time" title="">{hour}</td>'
+                f'<td class="left flagCur noWrap"><span title="País" class="ceFlags flag{currency}" '
+                f'data-img_key="{currency}">&nbsp;</span> {currency}</td>'
+                f'<td class="left textNum sentiment noWrap" title="Volatilidade &gt; esperada" data-img_key="bull{bulls}">'
+                + '<i class="grayFullBullishIcon"></i>' * bulls + '</td>'
+                f'<td class="left event" title="Evento"><a href="/economic-calendar/x-{event_id}" target="_blank">'
+                f'{name}&nbsp;</a><!-- {event_id} --><span class="smallGrayP">(Set)</span></td>'
+                f'<td class="bold act blackFont event-{event_id}-actual" id="eventActual_{event_id}">1,2%</td>'
+                f'<td class="fore event-{event_id}-forecast">1,1%</td>'
+                f'<td class="prev blackFont event-{event_id}-previous"><span title="">1,0%</span></td>'
+                f'<td class="alert js-injected-user-alert-container" data-name="{name}" data-event-id="{event_id}">'
+                f'<span class="newSiteIconsSprite notificationsIconBell"></span></td></tr>'
+            )
+    return "\n".join(rows)
+
+
+def _news_case(directory, repeats):
+    """Parser rápido do calendário contra o de referência (BeautifulSoup) nos mesmos payloads."""
+    from investing_news import extrair_eventos, extrair_eventos_bs4
+
+    if directory:
+        files = sorted(f for f in os.listdir(directory) if f.endswith(".html"))
+        if not files:
+            raise SystemExit(f"Nenhum payload do calendário gravado em {directory}")
+        payloads = []
+        for name in files:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                payloads.append(f.read())
+    else:
+        payloads = [synthetic_calendar_html(seed=seed) for seed in range(3)]
+
+    today = datetime(2026, 10, 14).date()
+    for payload in payloads:
+        if extrair_eventos(payload, today) != extrair_eventos_bs4(payload, today):
+            raise SystemExit("Os parsers do calendário extraíram eventos diferentes")
+
+    rows = sum(payload.count("js-event-item") for payload in payloads)
+    calls = [(payload, today) for payload in payloads]
+    return [measure(name, func, calls, repeats, symbols=rows, lookback=0)
+            for name, func in (("investing_news.extrair_eventos", extrair_eventos),
+                               ("investing_news.extrair_eventos_bs4", extrair_eventos_bs4))]
+
+
+def _latency_stats(samples_ns):
+    samples = np.asarray(samples_ns, dtype=np.float64) / 1000.0
+    return {
+        'calls': len(samples),
+        'mean_us': float(samples.mean()),
+        'p50_us': float(np.percentile(samples, 50)),
+        'p90_us': float(np.percentile(samples, 90)),
+        'p99_us': float(np.percentile(samples, 99)),
+        'max_us': float(samples.max()),
+    }
+
+
+def _allocations(func, calls):
+    """Pico de memória e blocos alocados ao executar as chamadas uma vez (tracemalloc)."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for args in calls:
+            func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    return {'peak_bytes': peak, 'blocks': blocks}
+
+
+def measure(name, func, calls, repeats, setup=None, **labels):
+    """
+    Mede uma função sobre uma lista de argumentos (uma chamada por símbolo = uma passada).
+
+    :param func: Função a medir
+    :param calls: Lista de tuplas de argumentos
+    :param repeats: Quantidade de passadas medidas
+    :param setup: Função chamada antes de cada passada, fora da medição (ex: limpar estado entre passadas)
+    :return: Dicionário com latência por chamada, tempo por passada e alocações
+    """
+    setup = setup or (lambda: None)
+    samples, passes = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for args in calls[:10]:
+            func(*args)  # Aquecimento
+
+        for _ in range(repeats):
+            setup()
+            pass_start = time.perf_counter_ns()
+            for args in calls:
+                started = time.perf_counter_ns()
+                func(*args)
+                samples.append(time.perf_counter_ns() - started)
+            passes.append(time.perf_counter_ns() - pass_start)
+        setup()
+        allocations = _allocations(func, calls)
+
+    result = {'name': name, **labels, **_latency_stats(samples)}
+    result['pass_ms_p50'] = float(np.percentile(passes, 50)) / 1e6
+    result.update(allocations)
+    return result
+
+
+def _analysis_pass_case(universe, repeats):
+    """
+    Passada completa de main.analysis_pass alimentada por um ReplayDataSource sem latência.
+
+    Mede dois casos sobre a mesma vela: "cold" zera antes de cada passada o estado que o robô
+    carrega entre passadas (gatilhos armados, índices de níveis, lateralização, visões
+    multi-timeframe e retração), como na primeira passada de uma vela nova; "warm" repete a
+    passada com esse estado já montado, como nas passadas seguintes da janela de análise.
+    """
+    import main as bot
+    import lateralization
+    import resampling
+    import support_resistance
+    from data_sources import MT5DataSource, ReplayDataSource
+    from mt5_collector import set_data_source
+    from trigger_index import TriggerIndex
+
+    with tempfile.TemporaryDirectory() as directory:
+        for symbol, rates in universe.items():
+            np.save(os.path.join(directory, f"{symbol}_5.npy"), rates)
+        source = ReplayDataSource(directory, start_time=int(next(iter(universe.values()))['time'][-1]))
+        set_data_source(source)
+        with contextlib.redirect_stdout(io.StringIO()):
+            source.initialize()
+        symbols = list(universe)
+        retracement_data = {}
+        now = datetime.fromtimestamp(source.start_time)
+
+        def reset():
+            bot.triggers = TriggerIndex(bot.triggers.tolerance_pips)
+            support_resistance._level_indexes.clear()
+            lateralization._rolling.clear()
+            resampling._views.clear()
+            retracement_data.update({symbol: {'has_retraced': False, 'body_size': 0} for symbol in symbols})
+
+        results = []
+        for state, setup in (("cold", reset), ("warm", None)):
+            reset()
+            results.append(measure(
+                f"main.analysis_pass.{state}", bot.analysis_pass, [(symbols, retracement_data, now)], repeats,
+                setup=setup, symbols=len(symbols), lookback=100
+            ))
+        # Libera os arquivos mapeados antes de remover o diretório temporário
+        source.series.clear()
+        set_data_source(MT5DataSource())
+        return results
+
+
+def run_benchmarks(symbol_counts, lookbacks, repeats, recorded=None, news=None):
+    """
+    Executa todos os casos de benchmark.
+
+    :param symbol_counts: Quantidades de símbolos (ex: [20, 200, 2000])
+    :param lookbacks: Tamanhos de janela para suporte/resistência (ex: [100, 500, 2000])
+    :param repeats: Passadas medidas por caso
+    :param recorded: Diretório com velas gravadas; se None, usa velas sintéticas
+    :param news: Diretório com payloads gravados do calendário; se None, usa uma semana sintética
+    :return: Lista de resultados (nos casos do calendário, "symbols" é a quantidade de linhas)
+    """
+    print(f"Calendário de notícias ({'gravado' if news else 'sintético'})...")
+    results = _news_case(news, repeats)
+    for n_symbols in symbol_counts:
+        count = max(lookbacks + [100])
+        universe = recorded_universe(recorded, n_symbols, count) if recorded else synthetic_universe(n_symbols, count)
+        symbols = list(universe)
+        # Menos repetições para universos grandes, mantendo o número de amostras por chamada
+        case_repeats = max(1, repeats * 20 // n_symbols)
+        print(f"{n_symbols} símbolos ({'gravados' if recorded else 'sintéticos'})...")
+
+        for lookback in lookbacks:
+            calls = [(universe[s][-lookback:], s) for s in symbols]
+            results.append(measure("calculate_support_resistance", calculate_support_resistance, calls,
+                                   case_repeats, symbols=n_symbols, lookback=lookback))
+
+        windows = {s: universe[s][-100:] for s in symbols}
+        retracement_data = {s: {'has_retraced': True, 'body_size': 0} for s in symbols}
+        results.append(measure("is_lateralization", is_lateralization,
+                               [(windows[s][-36:],) for s in symbols], case_repeats, symbols=n_symbols, lookback=36))
+        results.append(measure("check_previous_wicks", check_previous_wicks,
+                               [(windows[s], "buy") for s in symbols], case_repeats, symbols=n_symbols, lookback=3))
+
+        levels = {s: calculate_support_resistance(windows[s], s) for s in symbols}
+        entry_calls = [
+            (windows[s], levels[s][0], levels[s][1], s, 3, retracement_data)
+            for s in symbols if levels[s][0] is not None
+        ]
+        if entry_calls:
+            results.append(measure("evaluate_entry", evaluate_entry, entry_calls, case_repeats,
+                                   symbols=n_symbols, lookback=100))
+
+        stacked = np.stack([windows[s] for s in symbols])
+        has_retraced = np.ones(n_symbols, dtype=bool)
+        results.append(measure("calculate_support_resistance_batch", calculate_support_resistance_batch,
+                               [(stacked, symbols)], repeats, symbols=n_symbols, lookback=100))
+        results.append(measure("evaluate_batch", evaluate_batch,
+                               [(stacked, symbols, has_retraced, 3, 0.2)], repeats, symbols=n_symbols, lookback=100))
+
+        results.extend(_analysis_pass_case(universe, repeats))
+    return results
+
+
+def _metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        'timestamp': datetime.now().isoformat(timespec="seconds"),
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+    }
+
+
+# Imprime a tabela de resultados, com a variação em relação a uma execução anterior (se houver)
+# :param results: Lista de resultados de run_benchmarks
+# :param baseline: Lista de resultados anteriores (ou None)
+def print_results(results, baseline=None):
+    previous = {(r['name'], r['symbols'], r['lookback']): r for r in baseline or []}
+    print(f"{'Caso':<36}{'Símb.':>6}{'Janela':>7}{'p50 µs':>10}{'p99 µs':>10}{'Passada ms':>12}{'Pico KiB':>10}{'Var.':>8}")
+    for r in results:
+        old = previous.get((r['name'], r['symbols'], r['lookback']))
+        delta = f"{r['pass_ms_p50'] / old['pass_ms_p50'] - 1:+.0%}" if old and old['pass_ms_p50'] else ""
+        print(f"{r['name']:<36}{r['symbols']:>6}{r['lookback']:>7}{r['p50_us']:>10.1f}{r['p99_us']:>10.1f}"
+              f"{r['pass_ms_p50']:>12.2f}{r['peak_bytes'] / 1024:>10.1f}{delta:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks dos pontos críticos do pipeline de sinais.")
+    parser.add_argument("--symbols", default="20,200,2000", help="Quantidades de símbolos")
+    parser.add_argument("--lookbacks", default="100,500,2000", help="Janelas de suporte/resistência")
+    parser.add_argument("--repeats", type=int, default=20, help="Passadas medidas por caso")
+    parser.add_argument("--recorded", default=None, help="Diretório com velas M5 gravadas (.npy)")
+    parser.add_argument("--news", default=None, help="Diretório com payloads gravados do calendário (.html)")
+    parser.add_argument("--output", default=None, help="Arquivo JSON de saída")
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparação")
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        [int(n) for n in args.symbols.split(",")],
+        [int(n) for n in args.lookbacks.split(",")],
+        args.repeats,
+        recorded=args.recorded,
+        news=args.news
+    )
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({'meta': _metadata(), 'results': results}, f, indent=2)
+    print(f"Resultados salvos em {output}")
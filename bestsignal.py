@@ -1,4 +1,4 @@
-import MetaTrader5 as mt5
+from mt5_collector import initialize_mt5, shutdown_mt5, get_rates
 import time
 import requests
 from colorama import init
@@ -36,7 +36,7 @@ def calculate_support_resistance(symbol):
     :param symbol: Par de moeda
     :return: Valor do suporte e resistência.
     """
-    rates_m5 = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M5, 12, 24)  # Ignorar as últimas 12 velas, considerar as 24 anteriores
+    rates_m5 = get_rates(symbol, 5, 12, 24)  # Ignorar as últimas 12 velas, considerar as 24 anteriores
     if len(rates_m5) < 24:
         print(f"Dados insuficientes para cálculo de suporte e resistência para {symbol}")
         return None, None
@@ -124,9 +124,9 @@ def check_signal_success(signal, current_price, previous_price):
     return False
 
 # Conectar ao MetaTrader 5
-if not mt5.initialize():
+if not initialize_mt5():
     print("Falha ao inicializar")
-    mt5.shutdown()
+    shutdown_mt5()
 
 # Lista de pares de moedas
 symbols = ["EURUSD","EURJPY","EURGBP","USDJPY","GBPUSD","GBPJPY","AUDCHF","USDCAD","NZDJPY","NZDCAD","EURAUD","EURNZD","GBPAUD","GBPCHF","AUDJPY","EURCAD","GBPCAD","CADCHF","GBPNZD","AUDCAD"]
@@ -182,7 +182,7 @@ def main():
                         retracement_data[symbol] = {'has_retraced': False, 'body_size': 0}
 
                     # Coletar dados de velas M5
-                    rates_m5 = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M5, 0, 37)  # 37 para incluir a vela atual
+                    rates_m5 = get_rates(symbol, 5, 0, 37)  # 37 para incluir a vela atual
                     current_price = rates_m5[-1]['close']
 
                     # Atualizar os dados de retração
@@ -274,7 +274,7 @@ def main():
 
             # Verifica o resultado dos sinais após o início da nova vela M5
             for symbol, data in list(signals.items()):  # Itera sobre uma cópia dos itens do dicionário de sinais
-                new_rates_m5 = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M5, 0, 1)  # Pega a última vela M5
+                new_rates_m5 = get_rates(symbol, 5, 0, 1)  # Pega a última vela M5
                 current_price = new_rates_m5[-1]['close']  # Pega o preço de fechamento da última vela
 
                 # Formatar preços
@@ -321,4 +321,4 @@ def main():
 main()
 
 # Desconectar do MetaTrader 5
-mt5.shutdown()
\ No newline at end of file
+shutdown_mt5()
\ No newline at end of file
@@ -0,0 +1,246 @@
+# === candle_store.py ===
+# Histórico local de velas em colunas no disco, lido com numpy.memmap.
+#
+# Cada série (símbolo, timeframe) é um diretório com um arquivo binário de largura fixa por
+# coluna (time, open, high, low, close, tick_volume, spread) e um meta.json com a quantidade
+# de velas confirmadas. Só velas fechadas entram, sempre no fim e em ordem de horário:
+# - escrita só de acréscimo e à prova de queda: os bytes das colunas são gravados e
+#   sincronizados (fsync) antes do meta.json, que é trocado de uma vez (arquivo temporário +
+#   os.replace). Uma queda no meio do acréscimo deixa bytes a mais nas colunas, que os leitores
+#   ignoram (só mapeiam as velas confirmadas) e o próximo escritor descarta;
+# - leitura sem cópia: as colunas são mapeadas com numpy.memmap e as fatias por intervalo de
+#   horário (busca binária na coluna time) são views do arquivo. Abrir anos de M5 é instantâneo
+#   e só as páginas lidas ocupam memória.
+#
+# O mt5_collector acrescenta as velas fechadas que busca no MT5 e preenche as lacunas (ex: o
+# robô ficou parado) buscando na fonte de dados as velas que faltam (ver fill_gaps).
+
+import json
+import os
+
+import numpy as np
+
+# Colunas gravadas (nome, tipo) e formato completo das velas do MT5 devolvidas por read_rates
+COLUMNS = (
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'),
+)
+RATES_DTYPE = np.dtype(list(COLUMNS) + [('real_volume', '<u8')])
+
+
+class _Series:
+    # Uma série (símbolo, timeframe): colunas em disco, quantidade confirmada e mapas de leitura
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.length = 0
+        self.files = None  # Arquivos abertos para acréscimo (só no escritor)
+        self.maps = None  # Colunas mapeadas, válidas enquanto self.maps_length == self.length
+        self.maps_length = -1
+        self.last = None  # Horário da última vela confirmada
+        self.reload()
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def reload(self):
+        """Relê a quantidade confirmada (outro processo pode ter acrescentado velas)."""
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                length = int(json.load(f)["length"])
+        except (OSError, ValueError, KeyError, TypeError):
+            length = 0
+        if length != self.length or (length and self.last is None):
+            self.length = length
+            self.last = self._read_last_time() if length else None
+        return self.length
+
+    def _read_last_time(self):
+        # Leitura direta (sem mapear o arquivo, que o escritor pode precisar truncar)
+        with open(self._path('time'), "rb") as f:
+            f.seek((self.length - 1) * 8)
+            return int(np.frombuffer(f.read(8), dtype='<i8')[0])
+
+    def column(self, name):
+        if self.maps_length != self.length:
+            self.maps = {}
+            self.maps_length = self.length
+        column = self.maps.get(name)
+        if column is None:
+            dtype = np.dtype(dict(COLUMNS)[name])
+            if self.length:
+                column = np.memmap(self._path(name), dtype=dtype, mode="r", shape=(self.length,))
+            else:
+                column = np.empty(0, dtype=dtype)
+            self.maps[name] = column
+        return column
+
+    def _open_files(self):
+        # Abre as colunas para acréscimo, descartando os bytes de um acréscimo interrompido
+        os.makedirs(self.directory, exist_ok=True)
+        self.reload()
+        self.maps, self.maps_length = None, -1  # No Windows, arquivos mapeados não podem ser truncados
+        self.files = {}
+        for name, dtype in COLUMNS:
+            path = self._path(name)
+            size = self.length * np.dtype(dtype).itemsize
+            f = open(path, "ab")
+            if f.tell() != size:
+                f.truncate(size)
+                f.seek(size)
+            self.files[name] = f
+
+    def append(self, rates, durable=True):
+        if self.files is None:
+            self._open_files()
+        for name, _ in COLUMNS:
+            f = self.files[name]
+            f.write(np.ascontiguousarray(rates[name], dtype=dict(COLUMNS)[name]).tobytes())
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+
+        # Confirma as velas gravadas
+        length = self.length + len(rates)
+        temporary = self.meta_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"length": length, "columns": dict(COLUMNS)}, f)
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+        os.replace(temporary, self.meta_path)
+        self.length = length
+        self.last = int(rates['time'][-1])
+
+    def close(self):
+        for f in (self.files or {}).values():
+            f.close()
+        self.files = None
+
+
+class CandleStore:
+    """
+    Histórico local de velas fechadas por (símbolo, timeframe).
+
+    :param directory: Diretório do armazenamento (um subdiretório por série)
+    :param durable: Se True, sincroniza (fsync) cada acréscimo com o disco
+    """
+
+    def __init__(self, directory, durable=True):
+        self.directory = directory
+        self.durable = durable
+        self.series = {}
+        self.bars_appended = 0
+        self.bars_read = 0
+
+    def _series(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _Series(os.path.join(self.directory, f"{symbol}_{timeframe}"))
+        return series
+
+    def __len__(self):
+        return len(self.series)
+
+    def length(self, symbol, timeframe):
+        """Quantidade de velas confirmadas da série."""
+        return self._series(symbol, timeframe).reload()
+
+    def last_time(self, symbol, timeframe):
+        """Horário da última vela gravada, ou None se a série estiver vazia."""
+        return self._series(symbol, timeframe).last
+
+    def append(self, symbol, timeframe, rates):
+        """
+        Acrescenta velas fechadas; só as mais novas que a última gravada entram.
+
+        :param rates: Array estruturado de velas em ordem cronológica (ex: retornado pelo MT5)
+        :return: Quantidade de velas acrescentadas
+        """
+        series = self._series(symbol, timeframe)
+        if rates is None or not len(rates):
+            return 0
+        if series.last is not None:
+            rates = rates[rates['time'] > series.last]
+        if not len(rates):
+            return 0
+        try:
+            series.append(rates, self.durable)
+        except OSError as e:
+            # Nada foi confirmado: a próxima tentativa reabre as colunas e descarta o que foi gravado
+            print(f"Não foi possível gravar {symbol} M{timeframe} no histórico local: {e}")
+            series.close()
+            return 0
+        self.bars_appended += len(rates)
+        return len(rates)
+
+    def columns(self, symbol, timeframe, start=None, end=None):
+        """
+        Colunas das velas com start <= time < end, sem cópia (views do arquivo mapeado).
+
+        :param start: Horário inicial (epoch, incluído); None = desde a primeira vela
+        :param end: Horário final (epoch, excluído); None = até a última vela
+        :return: Dicionário {coluna: array}
+        """
+        series = self._series(symbol, timeframe)
+        series.reload()
+        times = series.column('time')
+        first = int(np.searchsorted(times, start, side="left")) if start is not None else 0
+        last = int(np.searchsorted(times, end, side="left")) if end is not None else len(times)
+        self.bars_read += max(0, last - first)
+        return {name: series.column(name)[first:last] for name, _ in COLUMNS}
+
+    def read_rates(self, symbol, timeframe, start=None, end=None, count=None):
+        """
+        Velas no formato do MT5 (array estruturado, cópia) com start <= time < end.
+
+        :param count: Se informado, só as últimas `count` velas do intervalo
+        :return: Array estruturado com RATES_DTYPE (real_volume zerado)
+        """
+        columns = self.columns(symbol, timeframe, start, end)
+        if count is not None:
+            columns = {name: column[max(0, len(column) - count):] for name, column in columns.items()}
+        rates = np.zeros(len(columns['time']), dtype=RATES_DTYPE)
+        for name, column in columns.items():
+            rates[name] = column
+        return rates
+
+    def close(self):
+        for series in self.series.values():
+            series.close()
+
+    def stats(self):
+        return {'series': len(self.series), 'bars_appended': self.bars_appended, 'bars_read': self.bars_read}
+
+
+if __name__ == "__main__":
+    import argparse
+    import yaml
+
+    from data_sources import create_data_source
+    from mt5_collector import set_data_source, set_candle_store, initialize_mt5, shutdown_mt5, fill_gaps
+
+    parser = argparse.ArgumentParser(description="Preenche o histórico local de velas a partir da fonte de dados.")
+    parser.add_argument("--dir", default=os.path.join(os.path.dirname(__file__), "candle_store"))
+    parser.add_argument("--bars", type=int, default=75000, help="Velas buscadas para iniciar uma série vazia (padrão: ~1 ano de M5)")
+    parser.add_argument("--timeframes", default="5", help="Timeframes separados por vírgula")
+    args = parser.parse_args()
+
+    with open(os.path.join(os.path.dirname(__file__), "config.yaml"), "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+
+    source_config = config.get("data_source") or {}
+    store = CandleStore(os.path.join(args.dir, source_config.get("type", "mt5")))
+    set_data_source(create_data_source(source_config))
+    set_candle_store(store)
+    if initialize_mt5():
+        try:
+            for symbol in config["symbols"]:
+                for timeframe in (int(t) for t in args.timeframes.split(",")):
+                    appended = fill_gaps(symbol, timeframe, args.bars)
+                    print(f"{symbol} M{timeframe}: {appended} velas acrescentadas, {store.length(symbol, timeframe)} no total.")
+        finally:
+            shutdown_mt5()
+            store.close()
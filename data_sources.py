@@ -0,0 +1,292 @@
+# === data_sources.py ===
+# Fontes de dados de mercado usadas pelo mt5_collector.
+#
+# Toda fonte expõe a mesma interface: initialize(), shutdown(),
+# copy_rates_from_pos(symbol, timeframe, start_pos, count) e copy_ticks_from(symbol, date_from, count),
+# com a mesma semântica das funções homônimas do MetaTrader5 (posição 0 = vela em formação,
+# resultado em ordem cronológica; ticks a partir de date_from, em segundos), e symbol_info(symbol)
+# com os dígitos, o point e o tick size do símbolo (ver symbol_registry.py).
+# - MT5DataSource: terminal MetaTrader 5 real (o pacote só é importado na inicialização);
+# - ReplayDataSource: velas gravadas em arquivos .npy, servidas por um relógio de replay e com
+#   latência configurável por chamada, para rodar e medir o robô sem o terminal Windows.
+#
+# Ambas contabilizam chamadas, velas e ticks retornados e o tempo gasto esperando a fonte.
+
+import os
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from symbol_registry import get_symbol_info, infer_digits
+
+# Formato dos ticks devolvidos pelo MT5 (copy_ticks_from)
+TICK_DTYPE = np.dtype([
+    ('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'),
+    ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8'),
+])
+
+
+class DataSource(ABC):
+    """
+    Base das fontes de dados: mantém as estatísticas de chamadas e de espera.
+
+    As subclasses implementam _copy_rates_from_pos e _copy_ticks_from (uma fonte sem algum
+    deles falha já ao ser criada, não na primeira chamada).
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.bars = 0
+        self.ticks = 0
+        self.wait_seconds = 0.0
+
+    def initialize(self):
+        return True
+
+    def shutdown(self):
+        pass
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        started = time.perf_counter()
+        try:
+            rates = self._copy_rates_from_pos(symbol, timeframe, start_pos, count)
+        finally:
+            self.calls += 1
+            self.wait_seconds += time.perf_counter() - started
+        if rates is not None:
+            self.bars += len(rates)
+        return rates
+
+    def copy_ticks_from(self, symbol, date_from, count):
+        started = time.perf_counter()
+        try:
+            ticks = self._copy_ticks_from(symbol, date_from, count)
+        finally:
+            self.calls += 1
+            self.wait_seconds += time.perf_counter() - started
+        if ticks is not None:
+            self.ticks += len(ticks)
+        return ticks
+
+    def symbol_info(self, symbol):
+        """Dicionário {'digits', 'point', 'tick_size'} do símbolo, ou None se a fonte não souber."""
+        return None
+
+    @abstractmethod
+    def _copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        """Velas com a semântica de MetaTrader5.copy_rates_from_pos (ou None)."""
+
+    @abstractmethod
+    def _copy_ticks_from(self, symbol, date_from, count):
+        """Ticks com a semântica de MetaTrader5.copy_ticks_from (ou None)."""
+
+    def stats(self):
+        return {'calls': self.calls, 'bars': self.bars, 'ticks': self.ticks, 'wait_seconds': self.wait_seconds}
+
+
+class MT5DataSource(DataSource):
+    """Fonte de dados do terminal MetaTrader 5."""
+
+    # Os metadados dos símbolos vêm do servidor da corretora e podem ir para o cache em disco
+    persist_symbol_info = True
+
+    def __init__(self):
+        super().__init__()
+        self.mt5 = None
+
+    def initialize(self):
+        import MetaTrader5 as mt5  # Importado só aqui: o resto do robô roda sem o pacote instalado
+
+        self.mt5 = mt5
+        if not mt5.initialize():
+            print("❌ Erro ao inicializar MetaTrader 5:", mt5.last_error())
+            return False
+        print("✅ Conectado ao MetaTrader 5 com sucesso.")
+        return True
+
+    def shutdown(self):
+        if self.mt5 is not None:
+            self.mt5.shutdown()  # Encerra a conexão com o MT5 corretamente
+
+    def symbol_info(self, symbol):
+        info = self.mt5.symbol_info(symbol) if self.mt5 is not None else None
+        if info is None:
+            return None
+        return {'digits': info.digits, 'point': info.point, 'tick_size': info.trade_tick_size}
+
+    def _copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        return self.mt5.copy_rates_from_pos(symbol, timeframe, start_pos, count)
+
+    def _copy_ticks_from(self, symbol, date_from, count):
+        # COPY_TICKS_INFO: só mudanças de bid/ask, que são o que forma as velas de forex
+        return self.mt5.copy_ticks_from(symbol, int(date_from), count, self.mt5.COPY_TICKS_INFO)
+
+
+class ReplayDataSource(DataSource):
+    """
+    Fonte de dados que reproduz velas gravadas em disco.
+
+    Cada arquivo `<directory>/<SYMBOL>_<timeframe>.npy` guarda o array estruturado retornado
+    pelo MT5 (ver record_rates). O relógio do replay começa em `start_time` e anda `speed`
+    vezes mais rápido que o relógio real; a vela em formação é a última com time <= agora.
+    Como os arquivos só têm o OHLC final, a vela em formação é servida já com seus valores finais.
+
+    Os ticks são sintetizados a partir das velas M5 (um por segundo), percorrendo
+    abertura -> mínima -> máxima -> fechamento nas velas de alta e abertura -> máxima ->
+    mínima -> fechamento nas de baixa, de modo que as velas montadas a partir deles batem
+    com as gravadas.
+    """
+
+    def __init__(self, directory, latency=0.0, start_time=None, speed=1.0, warmup_bars=100):
+        """
+        :param directory: Diretório com os arquivos .npy
+        :param latency: Latência artificial por chamada, em segundos
+        :param start_time: Horário (epoch) inicial do replay; padrão: a vela `warmup_bars` do primeiro arquivo
+        :param speed: Velocidade do relógio do replay em relação ao relógio real
+        :param warmup_bars: Velas disponíveis antes do início quando start_time não é informado
+        """
+        super().__init__()
+        self.directory = directory
+        self.latency = latency
+        self.start_time = start_time
+        self.speed = speed
+        self.warmup_bars = warmup_bars
+        self.series = {}
+        self.started_at = None
+
+    def initialize(self):
+        if not os.path.isdir(self.directory):
+            print(f"❌ Diretório de replay não encontrado: {self.directory}")
+            return False
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".npy"):
+                symbol, timeframe = name[:-4].rsplit("_", 1)
+                self.series[(symbol, int(timeframe))] = np.load(os.path.join(self.directory, name), mmap_mode="r")
+        if not self.series:
+            print(f"❌ Nenhum arquivo de velas em: {self.directory}")
+            return False
+        if self.start_time is None:
+            first = next(iter(self.series.values()))
+            self.start_time = int(first['time'][min(self.warmup_bars, len(first) - 1)])
+        self.started_at = time.monotonic()
+        print(f"✅ Replay iniciado com {len(self.series)} séries de {self.directory}.")
+        return True
+
+    def symbol_info(self, symbol):
+        # Os arquivos só têm as velas: os dígitos são deduzidos dos preços gravados
+        rates = self.series.get((symbol, 5))
+        if rates is None:
+            rates = next((r for (s, _), r in self.series.items() if s == symbol), None)
+        digits = infer_digits(rates['close']) if rates is not None else None
+        return {'digits': digits} if digits is not None else None
+
+    def now(self):
+        """Horário atual do replay (epoch, em segundos)."""
+        return self.start_time + (time.monotonic() - self.started_at) * self.speed
+
+    def _copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        if self.latency:
+            time.sleep(self.latency)
+        rates = self.series.get((symbol, timeframe))
+        if rates is None:
+            return None
+        end = int(np.searchsorted(rates['time'], self.now(), side="right")) - start_pos
+        if end <= 0:
+            return None
+        return np.array(rates[max(0, end - count):end])  # Cópia, como o MT5 devolve um array novo
+
+    def _copy_ticks_from(self, symbol, date_from, count):
+        if self.latency:
+            time.sleep(self.latency)
+        rates = self.series.get((symbol, 5))
+        if rates is None:
+            return None
+        seconds = np.arange(int(date_from), int(self.now()) + 1, dtype=np.int64)
+        index = np.searchsorted(rates['time'], seconds, side="right") - 1
+        offset = seconds - rates['time'][np.maximum(index, 0)]
+        valid = (index >= 0) & (offset < 300)  # Sem ticks nos intervalos sem vela (ex: fim de semana)
+        seconds, index, offset = seconds[valid][:count], index[valid][:count], offset[valid][:count]
+
+        bars = rates[index]
+        bullish = bars['close'] >= bars['open']
+        vertices = np.stack([
+            bars['open'],
+            np.where(bullish, bars['low'], bars['high']),
+            np.where(bullish, bars['high'], bars['low']),
+            bars['close'],
+        ], axis=1)
+        # Vértices nos segundos 0, 100, 200 e 299 da vela, interpolados linearmente entre eles
+        segment = np.minimum(offset // 100, 2)
+        fraction = (offset - segment * 100) / np.where(segment == 2, 99, 100)
+        rows = np.arange(len(bars))
+        start = vertices[rows, segment]
+        price = start + (vertices[rows, segment + 1] - start) * fraction
+
+        ticks = np.zeros(len(seconds), dtype=TICK_DTYPE)
+        ticks['time'] = seconds
+        ticks['time_msc'] = seconds * 1000
+        ticks['bid'] = price
+        ticks['ask'] = price + bars['spread'] * get_symbol_info(symbol).point
+        ticks['flags'] = 6  # TICK_FLAG_BID | TICK_FLAG_ASK
+        return ticks
+
+
+# Grava as velas de uma fonte em arquivos .npy para uso no ReplayDataSource
+# :param source: Fonte de dados já inicializada
+# :param directory: Diretório de destino
+# :param symbols: Lista de símbolos
+# :param timeframes: Timeframes a gravar (ex: [5, 15, 30])
+# :param count: Quantidade de velas por série
+def record_rates(source, directory, symbols, timeframes, count):
+    os.makedirs(directory, exist_ok=True)
+    for symbol in symbols:
+        for timeframe in timeframes:
+            rates = source.copy_rates_from_pos(symbol, timeframe, 0, count)
+            if rates is None or len(rates) == 0:
+                print(f"{symbol} M{timeframe}: sem dados para gravar.")
+                continue
+            np.save(os.path.join(directory, f"{symbol}_{timeframe}.npy"), rates)
+            print(f"{symbol} M{timeframe}: {len(rates)} velas gravadas.")
+
+
+# Cria a fonte de dados descrita no bloco 'data_source' do config.yaml
+# :param config: Dicionário do bloco (ex: {'type': 'replay', 'replay_dir': 'replay_data', 'latency_ms': 5})
+# :return: Instância de DataSource
+def create_data_source(config):
+    config = config or {}
+    kind = config.get("type", "mt5")
+    if kind == "mt5":
+        return MT5DataSource()
+    if kind == "replay":
+        directory = config.get("replay_dir", "replay_data")
+        if not os.path.isabs(directory):
+            directory = os.path.join(os.path.dirname(__file__), directory)
+        return ReplayDataSource(
+            directory,
+            latency=config.get("latency_ms", 0) / 1000,
+            start_time=config.get("start_time"),
+            speed=config.get("speed", 1.0)
+        )
+    raise ValueError(f"Tipo de fonte de dados desconhecido: {kind}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import yaml
+
+    parser = argparse.ArgumentParser(description="Grava velas do MT5 em arquivos .npy para o replay.")
+    parser.add_argument("--dir", default=os.path.join(os.path.dirname(__file__), "replay_data"))
+    parser.add_argument("--bars", type=int, default=5000, help="Velas por série")
+    parser.add_argument("--timeframes", default="5,15,30", help="Timeframes separados por vírgula")
+    args = parser.parse_args()
+
+    with open(os.path.join(os.path.dirname(__file__), "config.yaml"), "r", encoding="utf-8") as f:
+        symbols = yaml.safe_load(f)["symbols"]
+
+    source = MT5DataSource()
+    if source.initialize():
+        try:
+            record_rates(source, args.dir, symbols, [int(t) for t in args.timeframes.split(",")], args.bars)
+        finally:
+            source.shutdown()
@@ -0,0 +1,142 @@
+# === filter_chain.py ===
+# Cadeia de filtros por símbolo, com curto-circuito e ordem adaptativa.
+#
+# Cada filtro recebe os índices dos símbolos que ainda não foram rejeitados e devolve uma
+# máscara booleana (True = passa); só os aprovados seguem para o filtro seguinte. A cadeia mede
+# o custo (tempo por símbolo avaliado) e a taxa de rejeição de cada filtro com médias móveis
+# exponenciais e, a cada `reorder_every` execuções, reordena os filtros pela razão
+# custo / taxa de rejeição (o mais barato e mais seletivo primeiro), respeitando as
+# dependências declaradas (ex: os pavios dependem da direção calculada pela entrada): um filtro
+# com dependências é avaliado junto com elas, como um grupo que roda em sequência.
+#
+# Cada filtro decide cada símbolo de forma independente dos outros símbolos, então o conjunto
+# aprovado no fim não depende da ordem; só muda o trabalho gasto até chegar nele.
+
+import time
+
+import numpy as np
+
+from metrics import metrics
+
+
+class Filter:
+    """
+    Filtro da cadeia.
+
+    :param name: Nome do filtro (também é a etapa nas métricas de latência)
+    :param func: func(context, rows) -> máscara booleana com uma posição por índice de `rows`
+    :param requires: Nomes dos filtros que precisam rodar antes (ex: os que preenchem o contexto)
+    """
+
+    def __init__(self, name, func, requires=()):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.evaluated = 0
+        self.rejected = 0
+        self.seconds = 0.0
+        self.cost = None  # Média móvel do tempo por símbolo avaliado (s)
+        self.rejection = None  # Média móvel da taxa de rejeição
+
+    def record(self, evaluated, rejected, seconds, alpha):
+        self.evaluated += evaluated
+        self.rejected += rejected
+        self.seconds += seconds
+        cost, rejection = seconds / evaluated, rejected / evaluated
+        if self.cost is None:
+            self.cost, self.rejection = cost, rejection
+        else:
+            self.cost += alpha * (cost - self.cost)
+            self.rejection += alpha * (rejection - self.rejection)
+
+
+def _rank(group):
+    # Custo esperado por símbolo rejeitado de um grupo de filtros executados em sequência;
+    # grupos com filtros ainda sem medição vêm primeiro
+    if any(f.cost is None for f in group):
+        return 0.0
+    cost, passing = 0.0, 1.0
+    for f in group:
+        cost += passing * f.cost
+        passing *= 1.0 - f.rejection
+    return cost / max(1.0 - passing, 0.001)
+
+
+class FilterChain:
+    """
+    Cadeia de filtros com ordem adaptativa.
+
+    :param filters: Filtros na ordem inicial
+    :param alpha: Peso de cada execução nas médias móveis de custo e rejeição
+    :param reorder_every: Execuções entre reordenações
+    """
+
+    def __init__(self, filters, alpha=0.05, reorder_every=20):
+        self.filters = list(filters)
+        self.by_name = {f.name: f for f in self.filters}
+        self.order = list(self.filters)
+        self.alpha = alpha
+        self.reorder_every = reorder_every
+        self.runs = 0
+        self.reorders = 0
+
+    def _group(self, f, placed):
+        # O filtro precedido das dependências ainda não posicionadas
+        group = []
+        for name in f.requires:
+            if name not in placed:
+                group += [g for g in self._group(self.by_name[name], placed) if g not in group]
+        return group + [f]
+
+    def _reorder(self):
+        # Posiciona, a cada passo, o grupo (filtro + dependências pendentes) de menor custo por rejeição
+        order, placed = [], set()
+        while len(order) < len(self.filters):
+            groups = [self._group(f, placed) for f in self.filters if f.name not in placed]
+            for f in min(groups, key=_rank):
+                order.append(f)
+                placed.add(f.name)
+        if order != self.order:
+            self.order = order
+            self.reorders += 1
+
+    def run(self, context, count):
+        """
+        Aplica os filtros na ordem atual.
+
+        :param context: Dados compartilhados pelos filtros (ex: velas, níveis, horário)
+        :param count: Quantidade de símbolos (os índices vão de 0 a count - 1)
+        :return: Índices dos símbolos aprovados em todos os filtros, em ordem crescente
+        """
+        rows = np.arange(count)
+        for f in self.order:
+            if not len(rows):
+                break
+            started = time.perf_counter()
+            mask = np.asarray(f.func(context, rows), dtype=bool)
+            elapsed = time.perf_counter() - started
+            f.record(len(rows), len(rows) - int(mask.sum()), elapsed, self.alpha)
+            metrics.observe(f.name, elapsed)
+            rows = rows[mask]
+        self.runs += 1
+        if self.runs % self.reorder_every == 0:
+            self._reorder()
+        return rows
+
+    def stats(self):
+        """Contadores acumulados por filtro (avaliados, rejeitados, segundos) e reordenações."""
+        stats = {'reorders': self.reorders}
+        for f in self.filters:
+            stats[f"{f.name}_evaluated"] = f.evaluated
+            stats[f"{f.name}_rejected"] = f.rejected
+            stats[f"{f.name}_seconds"] = f.seconds
+        return stats
+
+    def describe(self):
+        """Resumo da ordem atual para o console: taxa de rejeição e custo por símbolo de cada filtro."""
+        parts = []
+        for f in self.order:
+            rate = f.rejected / f.evaluated * 100 if f.evaluated else 0.0
+            cost = f.seconds / f.evaluated * 1e6 if f.evaluated else 0.0
+            parts.append(f"{f.name} {f.rejected}/{f.evaluated} ({rate:.0f}%, {cost:.1f} µs)")
+        return " > ".join(parts)
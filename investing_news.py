@@ -1,47 +1,144 @@
 # === investing_news.py ===
 # Alternativa: busca eventos econômicos usando API AJAX do Investing.com (versão brasileira)
+#
+# O HTML da resposta é lido por um parser rápido (expressões regulares só sobre as células
+# usadas); o parser com BeautifulSoup fica como referência (ver benchmark.py --news).
 
-import requests
-from bs4 import BeautifulSoup
+import hashlib
+import html
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_right
 from datetime import datetime, timezone, timedelta
 
-def buscar_noticias_importantes():
+# Arquivo de cache do calendário (evita novo scraping ao reiniciar o robô)
+CACHE_FILE = os.path.join(os.path.dirname(__file__), ".news_cache.json")
+
+URL = "https://br.investing.com/economic-calendar/Service/getCalendarFilteredData"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "X-Requested-With": "XMLHttpRequest",
+    "Content-Type": "application/x-www-form-urlencoded",
+    "Origin": "https://br.investing.com",
+    "Referer": "https://br.investing.com/economic-calendar/"
+}
+
+MOEDAS_RELEVANTES = {"USD", "EUR"}
+
+# Última resposta do calendário: validadores HTTP (ETag/Last-Modified) para a requisição
+# condicional e resumo do payload, para não refazer o parsing quando nada mudou
+_ultima_resposta = {}
+_estatisticas = {'requests': 0, 'failures': 0, 'not_modified': 0, 'unchanged': 0, 'parsed': 0, 'parse_ms': 0.0}
+
+def buscar_noticias_importantes(dias=1, extrair=None):
     """
     Faz scraping da API de backend do Investing.com (versão brasileira)
-    para obter eventos do dia atual para moedas relevantes (USD, EUR, JPY, CHF, AUD, NZD),
-    incluindo o nível de impacto (1 a 3 estrelas).
-    """
-    url = "https://br.investing.com/economic-calendar/Service/getCalendarFilteredData"
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "X-Requested-With": "XMLHttpRequest",
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Origin": "https://br.investing.com",
-        "Referer": "https://br.investing.com/economic-calendar/"
-    }
+    para obter eventos de `dias` dias a partir de hoje (uma única requisição) para moedas
+    relevantes (USD, EUR), incluindo o nível de impacto (1 a 3 estrelas).
 
-    hoje = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    Se a resposta anterior trouxe ETag/Last-Modified, a requisição é condicional; se o
+    servidor responder 304 ou o payload for idêntico ao anterior, os eventos já extraídos são
+    devolvidos (a mesma lista) sem novo parsing.
 
+    :param dias: Quantidade de dias buscados (ex: 7 = semana seguinte inteira)
+    :param extrair: Parser do HTML (padrão: extrair_eventos; extrair_eventos_bs4 é a referência)
+    :return: Lista de eventos ou None se a requisição falhar (diferente de um período sem eventos)
+    """
+    # Importado só aqui: o robô inicia (ou reinicia a partir do cache) sem carregar requests
+    import requests
+
+    hoje = datetime.now(timezone.utc).date()
     payload = {
         "timeFilter": "timeOnly",
-        "dateFrom": hoje,
-        "dateTo": hoje,
+        "dateFrom": hoje.isoformat(),
+        "dateTo": (hoje + timedelta(days=dias - 1)).isoformat(),
         "currentTab": "custom"
     }
+    chave = (payload["dateFrom"], payload["dateTo"])
+    anterior = _ultima_resposta if _ultima_resposta.get("chave") == chave else {}
+
+    headers = dict(HEADERS)
+    if anterior.get("etag"):
+        headers["If-None-Match"] = anterior["etag"]
+    if anterior.get("modificado"):
+        headers["If-Modified-Since"] = anterior["modificado"]
 
-    response = requests.post(url, headers=headers, data=payload)
+    response = requests.post(URL, headers=headers, data=payload, timeout=15)
+    _estatisticas['requests'] += 1
+    if response.status_code == 304 and anterior:
+        _estatisticas['not_modified'] += 1
+        return anterior["eventos"]
     if response.status_code != 200:
-        return []
+        _estatisticas['failures'] += 1
+        return None  # Falha na requisição (diferente de um dia sem eventos)
+
+    resumo = hashlib.blake2b(response.content, digest_size=16).digest()
+    if anterior.get("resumo") == resumo:
+        _estatisticas['unchanged'] += 1
+        eventos, html_data = anterior["eventos"], anterior["html"]
+    else:
+        html_data = response.json().get("data", "")
+        inicio = time.perf_counter()
+        eventos = (extrair or extrair_eventos)(html_data, hoje) if html_data.strip() else []
+        _estatisticas['parsed'] += 1
+        _estatisticas['parse_ms'] += (time.perf_counter() - inicio) * 1000
 
-    html_data = response.json().get("data", "")
-    if not html_data.strip():
-        return []
+    _ultima_resposta.clear()
+    _ultima_resposta.update(chave=chave, etag=response.headers.get("ETag"),
+                            modificado=response.headers.get("Last-Modified"), resumo=resumo, eventos=eventos,
+                            html=html_data)
+    return eventos
+
+# Estatísticas das buscas do calendário (requisições, respostas sem alteração e tempo de parsing)
+def get_news_stats():
+    return dict(_estatisticas)
+
+# Impacto do evento (1 a 3 estrelas) a partir do atributo 'data-img_key' da célula de sentimento
+# :param data_img: Valor do atributo (ex: "bull3")
+def _estrelas(data_img):
+    data_img = data_img.lower()
+    if "bull1" in data_img:
+        return 1
+    elif "bull2" in data_img:
+        return 2
+    elif "bull3" in data_img:
+        return 3
+    return 0
 
+# Horário do evento: hora da célula de horário no dia da linha (atributo data-event-datetime,
+# ex: "2026/10/14 09:30:00") ou, sem ele, no dia de hoje
+# :return: datetime ou None se a hora não for válida (ex: "Dia todo")
+def _horario_evento(hora_str, data_evento, hoje):
+    dia = hoje
+    if data_evento:
+        try:
+            dia = datetime.strptime(data_evento[:10], "%Y/%m/%d").date()
+        except ValueError:
+            pass
+    try:
+        return datetime.strptime(hora_str, "%H:%M").replace(
+            year=dia.year, month=dia.month, day=dia.day
+        ) #- timedelta(hours=1)  # diminui 1 hora para alinhar com o horário exibido no site
+    except ValueError:
+        return None
+
+def extrair_eventos_bs4(html_data, hoje=None):
+    """
+    Extrai os eventos de 3 estrelas das moedas relevantes com BeautifulSoup (html.parser).
+    Parser de referência: mais lento, monta a árvore do payload inteiro.
+
+    :param html_data: HTML da tabela do calendário (campo "data" da resposta)
+    :param hoje: Dia usado nas linhas sem data (padrão: hoje, UTC)
+    """
+    from bs4 import BeautifulSoup
+
+    hoje = hoje or datetime.now(timezone.utc).date()
     soup = BeautifulSoup(html_data, "html.parser")
 
     eventos = []
-    moedas_relevantes = {"USD", "EUR"}
-
     linhas = soup.select("tr.js-event-item")
     for linha in linhas:
         try:
@@ -53,39 +150,22 @@ def buscar_noticias_importantes():
             if not hora_elem or not moeda_elem or not desc_elem or not impacto_container:
                 continue
 
-            hora_str = hora_elem.text.strip()
             moeda = moeda_elem.text.strip()
-            descricao = desc_elem.text.strip()
-
-            if moeda not in moedas_relevantes:
+            if moeda not in MOEDAS_RELEVANTES:
                 continue
 
-            # Define o impacto com base no atributo 'data-img_key'
-            estrelas = 0
-            data_img = impacto_container.get("data-img_key", "").lower()
-            if "bull1" in data_img:
-                estrelas = 1
-            elif "bull2" in data_img:
-                estrelas = 2
-            elif "bull3" in data_img:
-                estrelas = 3
-
+            estrelas = _estrelas(impacto_container.get("data-img_key", ""))
             if estrelas < 3:
                 continue  # ignora eventos com menos de 3 estrelas
 
-            try:
-                hora_evento = datetime.strptime(hora_str, "%H:%M").replace(
-                    year=datetime.now(timezone.utc).year,
-                    month=datetime.now(timezone.utc).month,
-                    day=datetime.now(timezone.utc).day
-                ) #- timedelta(hours=1)  # diminui 1 hora para alinhar com o horário exibido no site
-            except ValueError:
+            hora_evento = _horario_evento(hora_elem.text.strip(), linha.get("data-event-datetime"), hoje)
+            if hora_evento is None:
                 continue
 
             eventos.append({
                 "moeda": moeda,
                 "horario": hora_evento,
-                "descricao": descricao,
+                "descricao": desc_elem.text.strip(),
                 "impacto": estrelas
             })
 
@@ -94,18 +174,317 @@ def buscar_noticias_importantes():
 
     return eventos
 
-def dentro_de_janela_de_noticia(horario_atual, eventos, margem_minutos=15):
-    for evento in eventos:
-        janela_inicio = evento['horario'] - timedelta(minutes=margem_minutos)
-        janela_fim = evento['horario'] + timedelta(minutes=margem_minutos)
-        if janela_inicio <= horario_atual <= janela_fim:
-            return True
-    return False
+# Parser rápido: expressões sobre o HTML bruto, sem montar a árvore. Só as linhas de evento e as
+# quatro células usadas (horário, moeda, descrição e sentimento) são lidas, com os mesmos
+# critérios dos seletores CSS do parser de referência
+_ATRIBUTOS = r"((?:[^>\"']+|\"[^\"]*\"|'[^']*')*)"
+_LINHA_RE = re.compile(r"<tr\b" + _ATRIBUTOS + r">(.*?)</tr\s*>", re.S | re.I)
+_CELULA_RE = re.compile(r"<td\b" + _ATRIBUTOS + r">(.*?)</td\s*>", re.S | re.I)
+_ATRIBUTO_RE = re.compile(r"([^\s\"'=/>]+)(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s\"'>]+)))?")
+_TAG_RE = re.compile(r"<!--.*?-->|<[^>]*>", re.S)
+_COMENTARIO_RE = re.compile(r"<!--.*?(?:-->|$)", re.S)
+_CELULAS = (
+    ("hora", frozenset(("first", "left", "time"))),
+    ("moeda", frozenset(("left", "flagCur", "noWrap"))),
+    ("descricao", frozenset(("left", "event"))),
+    ("impacto", frozenset(("sentiment",))),
+)
+
+def _atributos(texto):
+    # Atributos de uma tag (nomes em minúsculas, entidades convertidas; repetidos: vale o último)
+    return {nome.lower(): html.unescape(aspas or apostrofo or simples)
+            for nome, aspas, apostrofo, simples in _ATRIBUTO_RE.findall(texto)}
+
+def _texto(conteudo):
+    # Texto de uma célula (sem tags e comentários, entidades convertidas), sem espaços nas pontas
+    return html.unescape(_TAG_RE.sub("", conteudo)).strip()
+
+def extrair_eventos(html_data, hoje=None):
+    """
+    Extrai os eventos de 3 estrelas das moedas relevantes (mesmo resultado de extrair_eventos_bs4).
+
+    :param html_data: HTML da tabela do calendário (campo "data" da resposta)
+    :param hoje: Dia usado nas linhas sem data (padrão: hoje, UTC)
+    """
+    hoje = hoje or datetime.now(timezone.utc).date()
+    if "<!--" in html_data:
+        html_data = _COMENTARIO_RE.sub("", html_data)  # Linhas comentadas não são eventos
+    eventos = []
+    for atributos_linha, conteudo in _LINHA_RE.findall(html_data):
+        # Descarta sem ler as células as linhas que não podem passar (sem 3 estrelas ou sem moeda relevante)
+        if ("js-event-item" not in atributos_linha or "bull3" not in conteudo.lower()
+                or not any(moeda in conteudo for moeda in MOEDAS_RELEVANTES)):
+            continue
+        linha = _atributos(atributos_linha)
+        if "js-event-item" not in linha.get("class", "").split():
+            continue
+
+        celulas = {}
+        for atributos_celula, texto in _CELULA_RE.findall(conteudo):
+            atributos = _atributos(atributos_celula)
+            classes = set(atributos.get("class", "").split())
+            for nome, exigidas in _CELULAS:
+                if nome not in celulas and exigidas <= classes:
+                    celulas[nome] = (atributos, texto)
+        if len(celulas) < len(_CELULAS):
+            continue
+
+        estrelas = _estrelas(celulas["impacto"][0].get("data-img_key", ""))
+        if estrelas < 3:
+            continue  # ignora eventos com menos de 3 estrelas
+        moeda = _texto(celulas["moeda"][1])
+        if moeda not in MOEDAS_RELEVANTES:
+            continue
+        hora_evento = _horario_evento(_texto(celulas["hora"][1]), linha.get("data-event-datetime"), hoje)
+        if hora_evento is None:
+            continue
+
+        eventos.append({
+            "moeda": moeda,
+            "horario": hora_evento,
+            "descricao": _texto(celulas["descricao"][1]),
+            "impacto": estrelas
+        })
+
+    return eventos
+
+class IndiceNoticias:
+    """
+    Índice de intervalos bloqueados por moeda.
+
+    Cada evento bloqueia a sua moeda de `margem_minutos` antes até `margem_minutos` depois do
+    horário. Como todas as janelas têm a mesma largura, ordenar por início também ordena por
+    fim: a única janela que pode conter um horário é a última que começou antes dele, achada
+    por busca binária (O(log n) por moeda).
+
+    :param eventos: Lista de eventos retornada por buscar_noticias_importantes()
+    :param margem_minutos: Minutos bloqueados antes e depois de cada evento
+    """
+
+    def __init__(self, eventos, margem_minutos=15):
+        margem = timedelta(minutes=margem_minutos)
+        self.eventos = eventos
+        self.inicios = {}  # moeda -> inícios das janelas (ordenados)
+        self.fins = {}     # moeda -> fins das janelas, na mesma ordem
+        self.por_moeda = {}  # moeda -> eventos, na mesma ordem
+        for evento in sorted(eventos, key=lambda e: e['horario']):
+            moeda = evento['moeda']
+            self.inicios.setdefault(moeda, []).append(evento['horario'] - margem)
+            self.fins.setdefault(moeda, []).append(evento['horario'] + margem)
+            self.por_moeda.setdefault(moeda, []).append(evento)
+
+    def __len__(self):
+        return len(self.eventos)
+
+    def evento_na_moeda(self, horario_atual, moeda):
+        """Retorna o evento cuja janela contém `horario_atual` para a moeda, ou None."""
+        inicios = self.inicios.get(moeda)
+        if not inicios:
+            return None
+        i = bisect_right(inicios, horario_atual) - 1
+        if i >= 0 and horario_atual <= self.fins[moeda][i]:
+            return self.por_moeda[moeda][i]
+        return None
+
+    def bloqueio(self, horario_atual, symbol=None):
+        """
+        Retorna o evento que bloqueia o símbolo no horário, ou None.
+
+        :param symbol: Par de moedas (ex: EURUSD); só as duas moedas do par são consultadas.
+                       Sem símbolo, qualquer moeda bloqueia (comportamento antigo, global).
+        """
+        moedas = (symbol[:3], symbol[3:6]) if symbol else self.inicios.keys()
+        for moeda in moedas:
+            evento = self.evento_na_moeda(horario_atual, moeda)
+            if evento is not None:
+                return evento
+        return None
+
+
+def dentro_de_janela_de_noticia(horario_atual, eventos, margem_minutos=15, symbol=None):
+    """
+    Verifica se o horário está dentro da janela de algum evento relevante.
+
+    :param eventos: IndiceNoticias (consulta O(log n)) ou lista de eventos (o índice é montado na hora)
+    :param symbol: Par de moedas; se informado, só eventos das moedas do par bloqueiam
+    """
+    if not isinstance(eventos, IndiceNoticias):
+        eventos = IndiceNoticias(eventos, margem_minutos)
+    return eventos.bloqueio(horario_atual, symbol) is not None
+
+
+# Grava os eventos no arquivo de cache (escrita atômica: arquivo temporário + os.replace)
+# :param eventos: Lista de eventos
+# :param caminho: Arquivo de cache
+# :param dias: Dias cobertos pelos eventos a partir de hoje (o cache vale até o último deles)
+def salvar_cache(eventos, caminho=CACHE_FILE, dias=1):
+    hoje = datetime.now(timezone.utc).date()
+    dados = {
+        "data": hoje.isoformat(),
+        "data_fim": (hoje + timedelta(days=dias - 1)).isoformat(),
+        "atualizado_em": time.time(),
+        "eventos": [dict(e, horario=e['horario'].isoformat()) for e in eventos],
+    }
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+# Lê os eventos do arquivo de cache, se ele cobrir o dia atual (UTC)
+# :param caminho: Arquivo de cache
+# :return: (eventos, horário da atualização em epoch) ou (None, 0) se não houver cache válido
+def carregar_cache(caminho=CACHE_FILE):
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            dados = json.load(f)
+        hoje = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        if not dados["data"] <= hoje <= dados.get("data_fim", dados["data"]):
+            return None, 0
+        eventos = [dict(e, horario=datetime.fromisoformat(e['horario'])) for e in dados["eventos"]]
+        return eventos, dados.get("atualizado_em", 0)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, 0
+
+
+class CalendarioNoticias:
+    """
+    Calendário econômico atualizado em segundo plano.
+
+    O scraping roda em uma thread própria a cada `intervalo` segundos, e o resultado é gravado
+    no cache em disco. Cada busca traz `dias` dias de uma vez (a semana seguinte, por padrão),
+    então a virada do dia e os reinícios dentro desse período não precisam de nova requisição.
+    O loop de análise só consulta o índice atual, que é trocado de uma vez a cada atualização,
+    sem nunca esperar pela rede.
+
+    :param margem_minutos: Minutos bloqueados antes e depois de cada evento
+    :param intervalo: Intervalo (s) entre atualizações
+    :param caminho_cache: Arquivo de cache (None desativa o cache)
+    :param dias: Dias buscados a cada atualização, a partir de hoje
+    """
+
+    def __init__(self, margem_minutos=15, intervalo=3600, caminho_cache=CACHE_FILE, dias=7):
+        self.margem_minutos = margem_minutos
+        self.intervalo = intervalo
+        self.dias = dias
+        self.caminho_cache = caminho_cache
+        self.atualizado_em = 0
+        self.falhas = 0
+        self._proxima_tentativa = 0
+        self.indice = IndiceNoticias([], margem_minutos)
+        self._parar = threading.Event()
+        self._thread = None
+
+        if caminho_cache:
+            eventos, atualizado_em = carregar_cache(caminho_cache)
+            if eventos is not None:
+                self.indice = IndiceNoticias(eventos, margem_minutos)
+                self.atualizado_em = atualizado_em
+                print(f"{len(eventos)} notícias de impacto carregadas do cache.")
+
+    def atualizar(self):
+        """Faz o scraping e troca o índice. Em caso de falha, mantém o índice anterior."""
+        try:
+            eventos = buscar_noticias_importantes(self.dias)
+        except Exception as e:
+            print(f"Atualização de notícias falhou: {e}")
+            eventos = None
+        if eventos is None:
+            # Mantém o índice anterior e espera mais a cada falha seguida (1, 2, 4... min)
+            self.falhas += 1
+            self._proxima_tentativa = time.time() + min(60 * 2 ** (self.falhas - 1), self.intervalo)
+            return False
+
+        self.falhas = 0
+
+        # Payload sem alteração: a busca devolve a mesma lista e o índice atual continua valendo
+        alterado = eventos is not self.indice.eventos
+        if alterado:
+            self.indice = IndiceNoticias(eventos, self.margem_minutos)
+        self.atualizado_em = time.time()
+        if self.caminho_cache:
+            try:
+                salvar_cache(eventos, self.caminho_cache, self.dias)
+            except OSError as e:
+                print(f"Não foi possível gravar o cache de notícias: {e}")
+        if alterado:
+            print(f"{len(eventos)} notícias de impacto carregadas.")
+        return True
+
+    def recarregar_cache(self):
+        """
+        Relê o cache em disco se outro processo o atualizou (no modo supervisor só o
+        coordenador faz o scraping; os workers usam o cache gravado por ele).
+
+        :return: True se o índice foi trocado
+        """
+        if not self.caminho_cache:
+            return False
+        eventos, atualizado_em = carregar_cache(self.caminho_cache)
+        if eventos is None or atualizado_em <= self.atualizado_em:
+            return False
+        self.indice = IndiceNoticias(eventos, self.margem_minutos)
+        self.atualizado_em = atualizado_em
+        return True
+
+    def restaurar(self, eventos, atualizado_em):
+        """
+        Usa eventos já buscados (ex: do snapshot de reinício), se ainda cobrirem o dia atual (UTC)
+        e forem mais novos que os carregados.
+
+        :return: True se o índice foi trocado
+        """
+        data = datetime.fromtimestamp(atualizado_em, timezone.utc).date()
+        if atualizado_em <= self.atualizado_em or (datetime.now(timezone.utc).date() - data).days >= self.dias:
+            return False
+        self.indice = IndiceNoticias(eventos, self.margem_minutos)
+        self.atualizado_em = atualizado_em
+        return True
+
+    def _vencido(self):
+        if time.time() < self._proxima_tentativa:
+            return False
+        data_cache = datetime.fromtimestamp(self.atualizado_em, timezone.utc).date()
+        return (time.time() - self.atualizado_em >= self.intervalo
+                or (datetime.now(timezone.utc).date() - data_cache).days >= self.dias)
+
+    def _executar(self):
+        while not self._parar.is_set():
+            if self._vencido():
+                self.atualizar()
+            # Reavalia a cada minuto (pega a virada do dia e novas tentativas após falha)
+            self._parar.wait(60)
+
+    def iniciar(self):
+        """Inicia a thread de atualização em segundo plano."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._executar, name="noticias", daemon=True)
+            self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def bloqueio(self, horario_atual, symbol=None):
+        """Evento que bloqueia o símbolo no horário, ou None (ver IndiceNoticias.bloqueio)."""
+        return self.indice.bloqueio(horario_atual, symbol)
 
 if __name__ == "__main__":
-    eventos = buscar_noticias_importantes()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Busca as notícias de impacto no Investing.com.")
+    parser.add_argument("--dias", type=int, default=1, help="Dias buscados a partir de hoje")
+    parser.add_argument("--gravar", default=None, help="Diretório onde gravar o HTML recebido (fixture do benchmark)")
+    args = parser.parse_args()
+
+    eventos = buscar_noticias_importantes(args.dias) or []
     for evento in eventos:
-        print(f"{evento['horario'].strftime('%H:%M')} - {evento['moeda']} - {evento['descricao']} ({evento['impacto']})")
+        print(f"{evento['horario'].strftime('%d/%m %H:%M')} - {evento['moeda']} - {evento['descricao']} ({evento['impacto']})")
+
+    if args.gravar and _ultima_resposta:
+        os.makedirs(args.gravar, exist_ok=True)
+        caminho = os.path.join(args.gravar, f"calendar-{datetime.now():%Y%m%d-%H%M%S}.html")
+        with open(caminho, "w", encoding="utf-8") as f:
+            f.write(_ultima_resposta["html"])
+        print(f"Payload gravado em {caminho}")
 
     agora = datetime.now()
     if dentro_de_janela_de_noticia(agora, eventos):
@@ -1,5 +1,9 @@
 # Verifica se o gráfico está lateralizado com base na variação dos candles
 
+from collections import deque
+
+import numpy as np
+
 # :param rates: Lista de candles
 # :return: True se estiver lateralizado, False caso contrário
 def is_lateralization(rates):
@@ -12,4 +16,185 @@ def is_lateralization(rates):
         # Verifica se está fora da faixa de variação esperada
         if size < avg_size * 0.5 and size > avg_size * 1.5:
             return False
-    return True
\ No newline at end of file
+    return True
+
+# Versão em lote de is_lateralization: avalia as últimas 36 velas de todos os símbolos de uma vez
+# :param rates: Array estruturado 2D (símbolos x velas)
+# :return: Array booleano com True para os símbolos lateralizados
+def is_lateralization_batch(rates):
+    if rates.shape[1] < 36:
+        return np.zeros(rates.shape[0], dtype=bool)
+    window = rates[:, -36:]
+    sizes = np.abs(window['close'] - window['open'])
+    avg_size = sizes.mean(axis=1, keepdims=True)
+    fora_da_faixa = (sizes < avg_size * 0.5) & (sizes > avg_size * 1.5)
+    return ~fora_da_faixa.any(axis=1)
+
+
+class _RollingWindow:
+    # Tamanhos dos corpos das `length - 1` velas fechadas mais recentes (a vela em formação completa a
+    # janela), com a soma corrente e filas monotônicas para o menor e o maior tamanho
+
+    def __init__(self, length):
+        self.length = length
+        self.sizes = deque()
+        self.total = 0.0
+        self.minima = deque()  # (posição, tamanho), tamanhos crescentes
+        self.maxima = deque()  # (posição, tamanho), tamanhos decrescentes
+        self.position = 0
+
+    def push(self, size):
+        self.sizes.append(size)
+        self.total += size
+        while self.minima and self.minima[-1][1] >= size:
+            self.minima.pop()
+        self.minima.append((self.position, size))
+        while self.maxima and self.maxima[-1][1] <= size:
+            self.maxima.pop()
+        self.maxima.append((self.position, size))
+        self.position += 1
+
+        if len(self.sizes) > self.length - 1:
+            self.total -= self.sizes.popleft()
+            oldest = self.position - len(self.sizes)
+            if self.minima[0][0] < oldest:
+                self.minima.popleft()
+            if self.maxima[0][0] < oldest:
+                self.maxima.popleft()
+        if self.position % self.length == 0:
+            self.total = sum(self.sizes)  # Evita o acúmulo de erro de arredondamento da soma corrente
+
+    def full(self):
+        return len(self.sizes) == self.length - 1
+
+
+class RollingLateralization:
+    """
+    Estado de lateralização de um símbolo mantido vela a vela.
+
+    Em vez de refazer a lista de tamanhos a cada passada, cada janela guarda a soma e o menor/maior
+    tamanho de corpo das velas fechadas, atualizados em O(1) quando uma vela fecha; a vela em
+    formação entra só na hora da consulta. Várias configurações (janela, faixa) são mantidas ao
+    mesmo tempo, para comparar configurações ao vivo.
+
+    A regra de is_lateralization só considera uma vela fora da faixa se ela estiver abaixo de
+    lower × média e acima de upper × média ao mesmo tempo, o que nunca acontece com lower <= upper:
+    o veredito equivalente é ter a janela completa. Por isso o estado também informa `in_band`
+    (todas as velas da janela dentro da faixa), para acompanhar a leitura estrita da faixa sem
+    mudar o filtro.
+
+    :param configs: Configurações (janela, lower, upper); a primeira é a usada pelo filtro
+    """
+
+    def __init__(self, configs=((36, 0.5, 1.5),)):
+        self.configs = [(int(length), float(lower), float(upper)) for length, lower, upper in configs]
+        for length, lower, upper in self.configs:
+            if length < 1 or lower > upper:
+                raise ValueError(f"Configuração de lateralização inválida: {(length, lower, upper)}")
+        self.windows = {length: _RollingWindow(length) for length, _, _ in self.configs}
+        self.max_length = max(self.windows)
+        self.last_time = None  # Horário da última vela fechada já incluída
+        self.forming_size = None  # Tamanho do corpo da vela em formação
+        self.rebuilds = 0
+
+    def _rebuild(self, closed):
+        self.windows = {length: _RollingWindow(length) for length in self.windows}
+        self.rebuilds += 1
+        self._push(closed[-(self.max_length - 1):] if self.max_length > 1 else closed[:0])
+
+    def _push(self, bars):
+        for size in np.abs(bars['close'] - bars['open']).tolist():
+            for window in self.windows.values():
+                window.push(size)
+
+    def update(self, rates):
+        """
+        Atualiza o estado com as velas mais recentes (a última em formação).
+
+        :param rates: Array estruturado de velas em ordem cronológica (ex: view do CandleBuffer)
+        """
+        if not len(rates):
+            self.last_time = self.forming_size = None
+            return
+        closed = rates[:-1]
+        forming = rates[-1]
+        self.forming_size = abs(float(forming['close']) - float(forming['open']))
+        if not len(closed):
+            self.windows = {length: _RollingWindow(length) for length in self.windows}
+            self.last_time = None
+            return
+        last_time = int(closed['time'][-1])
+        if last_time == self.last_time:
+            return  # Mesma vela: só o tamanho da vela em formação mudou
+        if self.last_time is None:
+            self._rebuild(closed)
+        else:
+            new = np.flatnonzero(closed['time'] > self.last_time)
+            if not len(new) or new[0] != len(closed) - len(new) or len(new) >= self.max_length:
+                self._rebuild(closed)  # Histórico que voltou no tempo ou lacuna maior que a janela
+            else:
+                self._push(closed[new])
+        self.last_time = last_time
+
+    def evaluate(self):
+        """
+        Avalia todas as configurações com a vela em formação atual.
+
+        :return: Dicionário {(janela, lower, upper): (lateral, in_band, média)}; `lateral` é o veredito
+                 de is_lateralization sobre as últimas `janela` velas
+        """
+        results = {}
+        for length, lower, upper in self.configs:
+            window = self.windows[length]
+            if self.forming_size is None or not window.full():
+                results[(length, lower, upper)] = (False, False, 0.0)
+                continue
+            size = self.forming_size
+            avg_size = (window.total + size) / length
+            smallest = min(window.minima[0][1], size) if window.minima else size
+            largest = max(window.maxima[0][1], size) if window.maxima else size
+            in_band = smallest >= avg_size * lower and largest <= avg_size * upper
+            results[(length, lower, upper)] = (True, in_band, avg_size)
+        return results
+
+    def is_lateral(self):
+        """Veredito da configuração principal (mesmo resultado de is_lateralization)."""
+        length, _, _ = self.configs[0]
+        return self.forming_size is not None and self.windows[length].full()
+
+
+# Estado de lateralização por símbolo e contadores por configuração (avaliações, na faixa)
+_rolling = {}
+_rolling_stats = {}
+
+# Atualiza o estado de lateralização de um símbolo (recriado se as configurações mudarem)
+# :param symbol: Par de moedas (ex: EURUSD)
+# :param rates: Velas mais recentes do símbolo (a última em formação)
+# :param configs: Configurações (janela, lower, upper); a primeira é a usada pelo filtro
+# :return: RollingLateralization atualizado
+def update_lateralization(symbol, rates, configs=((36, 0.5, 1.5),)):
+    state = _rolling.get(symbol)
+    if state is None or state.configs != [(int(n), float(lo), float(hi)) for n, lo, hi in configs]:
+        state = _rolling[symbol] = RollingLateralization(configs)
+    state.update(rates)
+    return state
+
+# Veredito de lateralização dos símbolos pelo estado incremental, contabilizando todas as configurações
+# :param symbols: Símbolos já atualizados com update_lateralization
+# :return: Array booleano com o veredito da configuração principal de cada símbolo
+def is_lateralization_rolling(symbols):
+    lateral = np.zeros(len(symbols), dtype=bool)
+    for i, symbol in enumerate(symbols):
+        state = _rolling.get(symbol)
+        if state is None:
+            continue
+        lateral[i] = state.is_lateral()
+        for (length, lower, upper), (_, in_band, _) in state.evaluate().items():
+            key = f"w{length}_b{round(lower * 100)}_{round(upper * 100)}"
+            _rolling_stats[f"{key}_evaluated"] = _rolling_stats.get(f"{key}_evaluated", 0) + 1
+            _rolling_stats[f"{key}_in_band"] = _rolling_stats.get(f"{key}_in_band", 0) + int(in_band)
+    return lateral
+
+# Contadores por configuração (avaliações e quantas estavam com todas as velas na faixa) e remontagens
+def get_lateralization_stats():
+    return dict(_rolling_stats, rebuilds=sum(state.rebuilds for state in _rolling.values()))
@@ -1,14 +1,32 @@
 # Módulo principal para executar o robô com base nos módulos importados
 
-from mt5_collector import initialize_mt5, shutdown_mt5, get_rates
-from support_resistance import calculate_support_resistance
-from lateralization import is_lateralization
-from patterns import check_retracement, check_previous_wicks, is_candle_stretched
-from signals import evaluate_entry, check_signal_success
-from telegram_notifier import send_telegram_message
+from mt5_collector import initialize_mt5, shutdown_mt5, get_buffered_rates, get_buffer_stats, get_source_stats, set_data_source, set_candle_store, fill_gaps
+from mt5_collector import get_buffered_close, get_latest_bar_time
+from candle_store import CandleStore
+from data_sources import create_data_source
+from patterns import is_candle_stretched
+from signals import SIGNAL_BY_DIRECTION
+from batch_evaluation import stack_rates, update_retracement_batch
+from lateralization import update_lateralization, is_lateralization_rolling, get_lateralization_stats
+from patterns import check_previous_wicks_batch
+from signals import evaluate_entry_batch
+from filter_chain import Filter, FilterChain
+from support_resistance import update_level_index, get_level_index_stats
+from trigger_index import TriggerIndex
+from symbol_registry import get_symbol_info
+from signal_journal import SignalJournal
+from outcome_resolver import OutcomeResolver
+from state_snapshot import capture_state, save_snapshot, load_snapshot, restore_state
+from metrics import metrics
+from tick_feed import TickFeed
+from resampling import update_timeframe_view, check_consistency, TIMEFRAME_M15, TIMEFRAME_M30, TIMEFRAME_H1
+from telegram_notifier import send_telegram_message, flush_telegram_queue, get_telegram_stats
+import asyncio
 import time
-from datetime import datetime, timedelta, timezone
-from investing_news import buscar_noticias_importantes, dentro_de_janela_de_noticia
+import numpy as np
+from datetime import datetime, timezone
+from investing_news import CalendarioNoticias, get_news_stats
+from scheduler import BarScheduler
 
 # Carrega configurações externas do arquivo YAML com validação
 import yaml, os, sys
@@ -53,6 +71,14 @@ min_touches = sr_config.get("min_touches", 2)
 min_distance_between_touches = sr_config.get("min_distance_between_touches", 5)
 tolerance_pips = sr_config.get("tolerance_pips", 2)
 min_region_separation = sr_config.get("min_region_separation", 10)
+# Velas (contando a em formação) consideradas no cálculo dos níveis
+sr_lookback = max(73, sr_config.get("lookback", 100))
+
+# Lateralização: janela (velas) e faixa em múltiplos do tamanho médio do corpo; as configurações
+# de `compare` são acompanhadas junto, só nas métricas
+lateral_config = config.get("lateralization", {})
+lateral_configs = [(lateral_config.get("window", 36), lateral_config.get("lower", 0.5), lateral_config.get("upper", 1.5))]
+lateral_configs += [tuple(c) for c in lateral_config.get("compare", [])]
 
 # Lista de pares de moedas definida no arquivo de configuração
 symbols = config["symbols"]
@@ -64,41 +90,512 @@ chat_id = config["telegram"]["chat_id"]
 # Distância mínima entre o preço de abertura e o nível de suporte/resistência
 min_distance_pips = config["min_distance_pips"]
 
+# Expirações avaliadas, em velas M5 (a primeira é a oficial: mensagem de resultado e totais)
+expiracoes = config.get("expiracoes", [1])
+
 # Percentual mínimo de retração da vela
 min_retr_pct = config["min_retracement_percent"]
 
 # Janela de tempo da análise (em segundos)
 tempo_analise = config["tempo_analise_segundos"]
 
+# Intervalo entre passadas de análise dentro da janela (em segundos)
+cadencia_analise = config.get("cadencia_analise_segundos", 1)
+
+# Filtro de notícias: margem em torno de cada evento, intervalo de atualização do calendário e
+# dias buscados a cada atualização
+noticias_config = config.get("noticias", {})
+margem_noticias = noticias_config.get("margem_minutos", 15)
+atualizacao_noticias = noticias_config.get("atualizacao_segundos", 3600)
+dias_noticias = noticias_config.get("dias", 7)
+
 # Horário de operação permitido
 hora_inicio = config["horario_operacao"]["inicio"]
 hora_fim = config["horario_operacao"]["fim"]
 
-def main():
-    # Inicializa conexão com MetaTrader 5
-    if not initialize_mt5():
+# Fonte de dados de mercado (terminal MT5 ou replay de arquivos locais)
+data_source_config = config.get("data_source", {"type": "mt5"})
+
+# Histórico local de velas (colunas em disco, ver candle_store.py); um subdiretório por tipo de
+# fonte, para o replay não se misturar com o histórico do MT5
+historico_config = config.get("historico", {})
+historico_diretorio = historico_config.get("diretorio", "")
+if historico_diretorio and not os.path.isabs(historico_diretorio):
+    historico_diretorio = os.path.join(os.path.dirname(__file__), historico_diretorio)
+historico_velas_iniciais = historico_config.get("velas_iniciais", 5000)
+
+# Vela em formação mantida pelo fluxo de ticks (a análise só roda quando chega tick que muda a vela)
+usar_ticks = data_source_config.get("ticks", False)
+
+# Exportação das métricas de latência (formato Prometheus): arquivo e/ou endpoint HTTP local
+metricas_config = config.get("metricas", {})
+metricas_arquivo = metricas_config.get("arquivo", "")
+if metricas_arquivo and not os.path.isabs(metricas_arquivo):
+    metricas_arquivo = os.path.join(os.path.dirname(__file__), metricas_arquivo)
+metricas_porta = metricas_config.get("porta", 0)
+
+# Snapshot do estado para reinício a quente (buffers, níveis, notícias, retração, contadores)
+snapshot_config = config.get("snapshot", {})
+snapshot_arquivo = snapshot_config.get("arquivo", "")
+if snapshot_arquivo and not os.path.isabs(snapshot_arquivo):
+    snapshot_arquivo = os.path.join(os.path.dirname(__file__), snapshot_arquivo)
+snapshot_intervalo = snapshot_config.get("intervalo_segundos", 5)
+snapshot_idade_maxima = snapshot_config.get("idade_maxima_segundos", 900)
+
+# Modo supervisor: quantidade de processos entre os quais os símbolos são divididos (0 ou 1 = processo único)
+supervisor_config = config.get("supervisor", {})
+workers = supervisor_config.get("workers", 0)
+reinicio_workers = supervisor_config.get("reinicio_segundos", 10)
+
+# Índice de gatilhos: faixas de suporte/resistência armadas a cada vela, conferidas a cada preço novo
+triggers = TriggerIndex(sr_config.get("trigger_tolerance_pips", 0.5))
+
+def higher_timeframes_stretched(symbol, rates, minuto):
+    """
+    Filtro de velas esticadas: nos últimos minutos de cada M15/M30/H1, a última vela fechada
+    desse timeframe precisa estar esticada.
+
+    :param rates: Velas M5 do símbolo (a última em formação)
+    :param minuto: Minuto atual da hora
+    :return: True se o sinal passa pelo filtro
+    """
+    view = update_timeframe_view(symbol, rates)
+    if minuto % 15 >= 10:
+        m15_candle = view.previous(TIMEFRAME_M15)
+        if m15_candle is None or not is_candle_stretched(m15_candle):
+            return False
+    if minuto % 30 >= 20:
+        m30_candle = view.previous(TIMEFRAME_M30)
+        if m30_candle is None or not is_candle_stretched(m30_candle):
+            return False
+    if minuto >= 40:
+        h1_candle = view.previous(TIMEFRAME_H1)
+        if h1_candle is None or not is_candle_stretched(h1_candle):
+            return False
+    return True
+
+# Filtros por símbolo aplicados aos símbolos cujo preço tocou um nível armado.
+# Cada um recebe o contexto da passada e os índices dos símbolos ainda aprovados e
+# devolve a máscara dos que passam (ver filter_chain.py)
+
+def filter_news(context, rows):
+    # Notícia de alto impacto no momento para alguma das moedas do símbolo
+    passed = np.ones(len(rows), dtype=bool)
+    calendario = context['calendario']
+    if calendario is None:
+        return passed
+    for k, i in enumerate(rows):
+        symbol = context['symbols'][i]
+        evento = calendario.bloqueio(context['now'], symbol)
+        if evento is not None:
+            print(f"{symbol} bloqueado por notícia: {evento['horario'].strftime('%H:%M')} - {evento['moeda']} - {evento['descricao']} ({evento['impacto']} estrelas)")
+            passed[k] = False
+    return passed
+
+def filter_lateralization(context, rows):
+    # Lateralização pelo estado incremental de cada símbolo (atualizado em analysis_pass)
+    lateral = is_lateralization_rolling([context['symbols'][i] for i in rows])
+    for i in rows[~lateral]:
+        print(f"{context['symbols'][i]} Gráfico não está lateralizado.")
+    return lateral
+
+def filter_entry(context, rows):
+    # Sinal técnico na vela atual (toque no nível armado, distância mínima, retração); guarda a direção
+    directions = evaluate_entry_batch(
+        context['rates'][rows],
+        context['supports'][rows],
+        context['resistances'][rows],
+        [context['symbols'][i] for i in rows],
+        min_distance_pips,
+        context['has_retraced'][rows]
+    )
+    context['directions'][rows] = directions
+    return directions != 0
+
+def filter_wicks(context, rows):
+    # Pavios das duas velas anteriores coerentes com a direção do sinal
+    return check_previous_wicks_batch(context['rates'][rows], context['directions'][rows])
+
+def filter_higher_timeframe(context, rows):
+    # Velas M15/M30/H1 montadas a partir das próprias velas M5 (sem chamadas extras ao MT5)
+    symbols = context['symbols']
+    return np.array([higher_timeframes_stretched(symbols[i], context['rates_by_symbol'][symbols[i]], context['now'].minute)
+                     for i in rows], dtype=bool)
+
+# Cadeia de filtros: reordenada conforme o custo e a taxa de rejeição medidos de cada filtro
+filter_chain = FilterChain([
+    Filter("news", filter_news),
+    Filter("lateralization", filter_lateralization),
+    Filter("entry", filter_entry),
+    Filter("wicks", filter_wicks, requires=("entry",)),
+    Filter("higher_timeframe", filter_higher_timeframe),
+])
+
+def analysis_pass(symbols, retracement_data, now, sync=True, calendario=None):
+    """
+    Executa uma passada de análise sobre todos os símbolos.
+
+    Coleta as velas M5 do buffer e atualiza a retração de todos os símbolos. Na primeira passada
+    de cada vela calcula suporte/resistência e arma o índice de gatilhos (imprimindo as
+    distâncias até os níveis); nas demais, só os símbolos cujo preço tocou uma faixa armada
+    passam pela cadeia de filtros (notícias, lateralização, entrada, pavios e velas esticadas
+    M15/M30/H1), na ordem adaptativa de filter_chain.
+
+    :param symbols: Lista de símbolos a analisar
+    :param retracement_data: Controle de retração por símbolo (atualizado no lugar)
+    :param now: Horário da passada (datetime), usado nos filtros de timeframe maior
+    :param sync: Se False, usa a vela em formação já mantida pelos ticks, sem consultar o MT5
+    :param calendario: CalendarioNoticias para o filtro de notícias (None = sem bloqueio)
+    :return: Lista de tuplas (símbolo, sinal, vela atual) dos sinais aprovados em todas as regras
+    """
+    approved = []
+
+    # Coleta as últimas velas M5 de cada símbolo do buffer incremental (só busca velas novas no MT5);
+    # os níveis usam as `sr_lookback` últimas e a lateralização, o estado incremental. O lote só
+    # precisa da vela atual e das duas anteriores: empilha as 37 últimas, o mesmo piso do loop
+    # original (36 anteriores + atual), para que símbolos com histórico curto continuem com a
+    # retração acompanhada (os níveis ficam NaN até haver 73 velas)
+    rates_by_symbol = {}
+    with metrics.timer("fetch"):
+        for symbol in symbols:
+            with metrics.timer("fetch", symbol):
+                rates_by_symbol[symbol] = get_buffered_rates(symbol, 5, max(100, sr_lookback), sync)
+        batch_symbols, batch_rates = stack_rates(rates_by_symbol, 37)
+    if batch_rates is None:
+        return approved
+    current = batch_rates[:, -1]
+
+    # Atualiza o controle de retração de todos os símbolos com a vela atual
+    with metrics.timer("retracement"):
+        has_retraced = np.array([retracement_data[symbol]['has_retraced'] for symbol in batch_symbols])
+        has_retraced, body_size = update_retracement_batch(batch_rates, has_retraced, min_retr_pct)
+        for i, symbol in enumerate(batch_symbols):
+            retracement_data[symbol]['body_size'] = body_size[i]
+            retracement_data[symbol]['has_retraced'] = bool(has_retraced[i])
+
+    # Atualiza o estado de lateralização (O(1) por vela fechada; a vela em formação só troca o tamanho)
+    with metrics.timer("lateralization_state"):
+        for symbol in batch_symbols:
+            update_lateralization(symbol, rates_by_symbol[symbol], lateral_configs)
+
+    # Arma o índice de gatilhos dos símbolos que abriram vela nova; os níveis vêm do índice
+    # incremental de cada símbolo (ignoram as 6 velas mais recentes)
+    to_arm = [i for i, symbol in enumerate(batch_symbols)
+              if triggers.needs_arming(symbol, int(current['time'][i]), float(current['open'][i]))]
+    if to_arm:
+        arm_symbols = [batch_symbols[i] for i in to_arm]
+        with metrics.timer("sr"):
+            levels = [update_level_index(
+                symbol,
+                rates_by_symbol[symbol][-sr_lookback:],
+                min_touches=min_touches,
+                min_distance_between_touches=min_distance_between_touches,
+                tolerance_pips=tolerance_pips,
+                min_region_separation=min_region_separation
+            ).levels for symbol in arm_symbols]
+        for symbol, i, (support, resistance) in zip(arm_symbols, to_arm, levels):
+            current_open = float(current['open'][i])
+            triggers.arm(symbol, int(current['time'][i]), current_open, support, resistance, min_distance_pips)
+            if np.isnan(support) or np.isnan(resistance):
+                print(f"{symbol} Suporte ou resistência não encontrado.")
+                continue
+
+            # 🔍 Imprime as distâncias para debug
+            info = get_symbol_info(symbol)
+            open_points, support_points, resistance_points = info.to_points([current_open, support, resistance])
+            distance_to_support = max(0, (open_points - support_points) / info.pip_points)
+            distance_to_resistance = max(0, (resistance_points - open_points) / info.pip_points)
+            now_str = datetime.now().strftime("%H:%M:%S")
+            print(f"{now_str} - Waiting for best entry. {symbol} - Sup: {support:.5f}, Resist: {resistance:.5f}, DS: {distance_to_support:.2f}, DR: {distance_to_resistance:.2f}")
+
+    # Só os símbolos cujo preço tocou (ou cruzou) uma faixa armada seguem para as regras completas
+    with metrics.timer("trigger"):
+        touched = [i for i, symbol in enumerate(batch_symbols) if triggers.check(symbol, float(current['close'][i]))]
+    if not touched:
+        return approved
+    touched_symbols = [batch_symbols[i] for i in touched]
+    touched_rates = batch_rates[touched]
+
+    # Cadeia de filtros sobre os símbolos tocados, com os níveis armados
+    supports, resistances = triggers.levels_of(touched_symbols)
+    context = {
+        'symbols': touched_symbols,
+        'rates': touched_rates,
+        'rates_by_symbol': rates_by_symbol,
+        'has_retraced': has_retraced[touched],
+        'supports': np.asarray(supports, dtype=np.float64),
+        'resistances': np.asarray(resistances, dtype=np.float64),
+        'directions': np.zeros(len(touched), dtype=np.int8),
+        'now': now,
+        'calendario': calendario,
+    }
+    for k in filter_chain.run(context, len(touched)):
+        signal = SIGNAL_BY_DIRECTION[int(context['directions'][k])]
+        approved.append((touched_symbols[k], signal, touched_rates[k][-1]))
+
+    return approved
+
+def verify_timeframes(symbols):
+    """
+    Confere, uma vez na inicialização, as velas M15/M30/H1 montadas a partir das M5 com as velas
+    nativas do MT5 e avisa sobre divergências (ex: histórico M5 incompleto no terminal).
+    """
+    for symbol in symbols:
+        rates = get_buffered_rates(symbol, 5, 100)
+        if rates is None:
+            continue
+        report = check_consistency(update_timeframe_view(symbol, rates))
+        for timeframe, result in report.items():
+            if result['mismatches']:
+                print(f"⚠️ {symbol}: {result['mismatches']} de {result['compared']} velas do timeframe {timeframe} "
+                      f"divergem do MT5 (máx {result['max_diff']:.5f}).")
+
+class Reporter:
+    """
+    Destino dos sinais e resultados: grava no diário e envia as mensagens ao Telegram.
+
+    No processo único é usado direto por run(); no modo supervisor fica só no coordenador,
+    que repassa a ele os eventos recebidos dos workers (ver supervisor.py).
+
+    :param journal: SignalJournal com os sinais pendentes e os totais da execução anterior
+    """
+
+    def __init__(self, journal):
+        self.journal = journal
+        self.pending = {}  # símbolo -> sinal pendente (com o id no diário)
+        for symbol, record in journal.pending_by_symbol().items():
+            self.pending[symbol] = {
+                'id': record['id'],
+                'signal': record['signal'],
+                'entry_price': record['entry_price'],
+                'timestamp': record['timestamp'],
+                'bar_time': record['bar_time']
+            }
+        for rid in set(journal.pending) - {data['id'] for data in self.pending.values()}:
+            journal.record_expired(rid)  # Mais de um pendente no mesmo símbolo: só o último é avaliado
+        journal.flush()
+
+    def restore(self, symbols):
+        """Sinais pendentes dos símbolos, no formato do dicionário `signals` de run()."""
+        return {symbol: dict(self.pending[symbol]) for symbol in symbols if symbol in self.pending}
+
+    def signal(self, symbol, signal, entry_price, bar_time, timestamp):
+        """Envia um sinal novo ao Telegram e registra no diário."""
+        formatted_price = f"{entry_price:.{get_symbol_info(symbol).digits}f}"
+
+        message = (
+            f"<b>NEW Time:</b> <code>{timestamp} 🕐</code>\n"
+            f"<b>Symbol:</b> <code>{symbol} 📊</code>\n"
+            f"<b>Signal:</b> <code>{signal}</code>\n"
+            f"<b>Price:</b> <code>{formatted_price} 💰</code>"
+        )
+        print(message)
+        send_telegram_message(bot_token, chat_id, message)
+
+        self.pending[symbol] = {
+            'id': self.journal.record_signal(symbol, signal, entry_price, bar_time, timestamp),
+            'signal': signal,
+            'entry_price': entry_price,
+            'timestamp': timestamp,
+            'bar_time': int(bar_time)
+        }
+
+    def result(self, symbol, final_price, success):
+        """Registra o resultado do sinal pendente do símbolo e envia a mensagem com o histórico."""
+        data = self.pending.pop(symbol, None)
+        if data is None:
+            return
+        self.journal.record_result(data['id'], final_price, success)
+
+        # Formata o preço de saída com os dígitos do símbolo
+        formatted_price = f"{final_price:.{get_symbol_info(symbol).digits}f}"
+        result = "NEW Successful ✅" if success else "NEW Failed ❌"
+
+        # Monta mensagem com resultado e histórico
+        totals = self.journal.totals
+        result_msg = (
+            f"<b>NEW Symbol:</b> <code>{symbol} 📊</code>\n"
+            f"<b>Price:</b> <code>{formatted_price} 💰</code>\n"
+            f"<b>Resultado:</b> <code>{result}</code>\n\n"
+            f"<b>Histórico:</b>\n"
+            f"<b>Total:</b> <code>{totals['total']}</code>\n"
+            f"<b>Successful:</b> <code>{totals['success']} ✅</code>\n"
+            f"<b>Failure:</b> <code>{totals['failed']} ❌</code>"
+        )
+        print(result_msg)
+        send_telegram_message(bot_token, chat_id, result_msg)
+
+    def expiry(self, symbol, bar_time, bars, final_price, success):
+        """Registra no diário o resultado do sinal em uma das expirações comparadas."""
+        self.journal.record_expiry(symbol, bar_time, bars, final_price, success)
+
+    def expired(self, symbol):
+        """Marca o sinal pendente do símbolo como expirado (vela de saída indisponível)."""
+        data = self.pending.pop(symbol, None)
+        if data is not None:
+            print(f"{symbol}: sinal das {data['timestamp']} expirou sem resultado.")
+            self.journal.record_expired(data['id'])
+
+    def flush(self):
+        self.journal.flush()
+
+    def close(self):
+        self.journal.close()
+
+def window_snapshot(symbols, window_cycles, scheduler, feed, resolver):
+    """
+    Estatísticas de uma janela de análise em um dicionário plano (enviado pelos workers ao
+    coordenador do supervisor).
+    """
+    snapshot = {
+        'bar_time': int(time.time() // scheduler.period * scheduler.period),
+        'symbols': len(symbols),
+        'cycles': window_cycles,
+    }
+    groups = [("buffer", get_buffer_stats()), ("source", get_source_stats()),
+              ("scheduler", scheduler.stats()), ("triggers", triggers.stats()),
+              ("levels", get_level_index_stats()), ("lateralization", get_lateralization_stats()),
+              ("filter", filter_chain.stats()), ("outcomes", resolver.stats())]
+    if feed is not None:
+        groups.append(("tick_feed", feed.stats()))
+    for prefix, stats in groups:
+        for key, value in stats.items():
+            snapshot[f"{prefix}_{key}"] = value
+    for stage, (p50, p99) in metrics.summary().items():
+        snapshot[f"{stage}_p50_ms"] = p50
+        snapshot[f"{stage}_p99_ms"] = p99
+    return snapshot
+
+async def run(symbols=symbols, reporter=None, snapshot_path=snapshot_arquivo):
+    """
+    Loop principal do robô.
+
+    :param symbols: Símbolos analisados por este processo
+    :param reporter: Destino dos sinais e resultados. None = processo único (diário, Telegram,
+                     atualização das notícias e exportação das métricas neste processo); no modo
+                     supervisor, o worker recebe um supervisor.QueueReporter e só analisa
+    :param snapshot_path: Arquivo do snapshot de reinício a quente ("" desativa)
+    """
+    coordinated = reporter is not None
+
+    # Agendador: acorda na abertura das velas M5 e na cadência da janela de análise
+    scheduler = BarScheduler(period=300)
+
+    # Seleciona a fonte de dados e inicializa a conexão
+    set_data_source(create_data_source(data_source_config))
+    if not await scheduler.run_blocking(initialize_mt5):
+        scheduler.close()
         return
-    
-    # 🔎 Carrega notícias importantes do dia
-    eventos_importantes = buscar_noticias_importantes()
-    if eventos_importantes is None or len(eventos_importantes) == 0:
-        print("Nenhuma notícia importante carregada. Operando sem bloqueio.")
 
-    last_news_update = time.time()  # para atualizar a cada 1 hora
-
-    # Dicionário que armazena sinais enviados e dados relacionados
-    signals = {}
-
-    # Contadores para estatísticas
-    total_signals = 0
-    success_signals = 0
-    failed_signals = 0
+    # Histórico local: completa as séries M5 com as velas fechadas desde a última gravada
+    store = None
+    if historico_diretorio:
+        store = CandleStore(os.path.join(historico_diretorio, data_source_config.get("type", "mt5")))
+        set_candle_store(store)
+        started = time.perf_counter()
+        appended = 0
+        for symbol in symbols:
+            appended += await scheduler.run_blocking(fill_gaps, symbol, 5, historico_velas_iniciais)
+        print(f"Histórico local de velas atualizado em {time.perf_counter() - started:.2f}s: {appended} velas novas.")
+
+    # 🔎 Carrega notícias importantes da semana (do cache, se ainda cobrir hoje; senão, faz o scraping
+    # uma vez) e passa a atualizá-las em segundo plano
+    # (no modo supervisor só o coordenador faz o scraping; os workers releem o cache a cada vela)
+    calendario = CalendarioNoticias(margem_noticias, atualizacao_noticias, dias=dias_noticias)
+
+    # Fluxo de ticks: atualiza a vela em formação e a retração de cada símbolo a cada tick
+    feed = TickFeed(timeframe=5, count=100, min_retr_pct=min_retr_pct) if usar_ticks else None
 
     # Dicionário de controle de retração por símbolo
     retracement_data = {
         symbol: {'has_retraced': False, 'body_size': 0} for symbol in symbols
     }
 
+    # Reinício a quente: restaura buffers, níveis, notícias e a retração da vela atual do snapshot recente
+    restored = None
+    if snapshot_path:
+        started = time.perf_counter()
+        state = load_snapshot(snapshot_path, snapshot_idade_maxima)
+        if state is not None:
+            bar_time = int(time.time() // scheduler.period * scheduler.period)
+            restored = restore_state(state, bar_time, triggers, retracement_data, calendario, feed)
+            print(f"Snapshot de estado restaurado em {(time.perf_counter() - started) * 1000:.1f} ms "
+                  f"(gravado há {time.time() - state['saved_at']:.0f}s): {restored['buffers']} buffers, "
+                  f"{restored['levels']} níveis armados, {restored['news']} notícias"
+                  f"{', retração da vela atual' if restored['same_bar'] else ''}.")
+
+    if not calendario.atualizado_em and not coordinated:
+        await scheduler.run_blocking(calendario.atualizar)
+    if not len(calendario.indice):
+        print("Nenhuma notícia importante carregada. Operando sem bloqueio.")
+    if not coordinated:
+        calendario.iniciar()
+
+    # Estatísticas dos componentes exportadas junto com as métricas de latência
+    metrics.register_collector("buffer", get_buffer_stats)
+    metrics.register_collector("source", get_source_stats)
+    if store is not None:
+        metrics.register_collector("candle_store", store.stats)
+    metrics.register_collector("scheduler", scheduler.stats)
+    metrics.register_collector("triggers", triggers.stats)
+    metrics.register_collector("levels", get_level_index_stats)
+    metrics.register_collector("lateralization", get_lateralization_stats)
+    metrics.register_collector("filter", filter_chain.stats)
+    if feed is not None:
+        metrics.register_collector("tick_feed", feed.stats)
+
+    if not coordinated:
+        # Diário de sinais: restaura os sinais pendentes e os totais da execução anterior
+        journal = SignalJournal()
+        reporter = Reporter(journal)
+        print(f"Diário de sinais relido em {journal.replay_seconds * 1000:.1f} ms: "
+              f"{journal.totals['total']} sinais, {len(reporter.pending)} pendentes.")
+        metrics.register_collector("telegram", get_telegram_stats)
+        metrics.register_collector("journal", lambda: journal.totals)
+        metrics.register_collector("news", get_news_stats)
+        if metricas_porta:
+            metrics.serve(metricas_porta)
+            print(f"Métricas em http://127.0.0.1:{metricas_porta}/metrics")
+
+    # Dicionário que armazena sinais enviados e dados relacionados
+    signals = reporter.restore(symbols)
+
+    # Expirações dos sinais, resolvidas com as velas dos buffers assim que a vela de saída fecha
+    resolver = OutcomeResolver(expiracoes, period=300)
+    for symbol, data in signals.items():
+        resolver.add(symbol, data['signal'], data['entry_price'], data['bar_time'], restored=True)
+    metrics.register_collector("outcomes", resolver.stats)
+
+    def resolve_outcomes():
+        # Resolve em lote as expirações vencidas (sem consultar o MT5) e envia os resultados oficiais
+        now = get_latest_bar_time(5)
+        if now is None or not len(resolver) or resolver.next_due() > now:
+            return
+        with metrics.timer("outcome"):
+            for symbol, bar_time, bars, official, signal, entry_price, final_price, success in resolver.resolve(
+                    now, lambda symbol, bar_time: get_buffered_close(symbol, 5, bar_time)):
+                reporter.expiry(symbol, bar_time, bars, final_price, success)
+                if not official or signals.get(symbol, {}).get('bar_time') != bar_time:
+                    continue
+                if success is None:
+                    reporter.expired(symbol)
+                else:
+                    # Verifica se o movimento foi na direção esperada e envia o resultado com o histórico
+                    reporter.result(symbol, final_price, success)
+                del signals[symbol]  # Remove o sinal já avaliado
+        reporter.flush()
+
+    def save_state():
+        # Grava o snapshot no executor, junto das chamadas que alteram os buffers
+        with metrics.timer("snapshot"):
+            bar_time = int(time.time() // scheduler.period * scheduler.period)
+            save_snapshot(snapshot_path, capture_state(bar_time, triggers, retracement_data, calendario, feed))
+    last_snapshot = time.monotonic()
+
+    if restored is None:
+        # Conferência das velas montadas (já feita antes do reinício quando o snapshot é restaurado)
+        await scheduler.run_blocking(verify_timeframes, symbols)
+
     print("Robô iniciado. Aguardando vela M5...")
 
     try:
@@ -107,196 +604,138 @@ def main():
             hour = current_time.tm_hour
             day = datetime.now().weekday()  # Dia da semana (0=segunda)
 
-            # ⏳ Atualiza as notícias a cada 1 hora
-            if time.time() - last_news_update > 3600:
-                print("Atualizando eventos econômicos...")
-                eventos_importantes = buscar_noticias_importantes()
-                last_news_update = time.time()
-                if eventos_importantes is None or len(eventos_importantes) == 0:
-                    print("Atualização de notícias falhou. Continuando operação sem bloqueio.")
-                else:
-                    print(f"{len(eventos_importantes)} notícias de impacto carregadas.")
-
             # Valida se está dentro do horário de operação: dias úteis das 6h às 17h
             if 0 <= day <= 4 and hora_inicio <= hour < hora_fim:
-                # Aguarda até o próximo múltiplo de 5 minutos
+                # Aguarda a abertura da próxima vela M5
                 if current_time.tm_min % 5 != 0:
-                    wait_time = (5 - current_time.tm_min % 5) * 60 - current_time.tm_sec
-                    time.sleep(wait_time)
-
-                # Início da janela de 2 minutos de análise (tempo_analise configurado no YAML)
-                start_time = time.time()
-                while time.time() - start_time < tempo_analise:
-                    #print(f"Analisando ativos às {datetime.now().strftime('%H:%M:%S')}...")
-
-                    # Verifica se há alguma notícia de alto impacto no momento
+                    await scheduler.wait_for_bar_open()
+                if coordinated:
+                    calendario.recarregar_cache()
+
+                # Janela de análise (tempo_analise configurado no YAML), contada a partir da abertura da vela,
+                # com uma passada a cada cadencia_analise segundos
+                window = max(0.0, tempo_analise - scheduler.seconds_into_bar())
+                window_cycles = 0
+                async for _ in scheduler.ticks(window, cadencia_analise):
                     now = datetime.now()
-                    bloqueado = False
-
-                    for evento in eventos_importantes:
-                        janela_inicio = evento['horario'] - timedelta(minutes=15)
-                        janela_fim = evento['horario'] + timedelta(minutes=15)
-
-                        if janela_inicio <= now <= janela_fim:
-                            print(f"Sinal bloqueado por notícia: {evento['horario'].strftime('%H:%M')} - {evento['moeda']} - {evento['descricao']} ({evento['impacto']} estrelas)")
-                            bloqueado = True
-                            break
-
-                    if bloqueado:
+                    liberados = symbols
+                    if feed is not None:
+                        # Só analisa os símbolos cuja vela em formação mudou com os ticks novos
+                        started = time.perf_counter()
+                        liberados = await scheduler.run_blocking(feed.poll, liberados, retracement_data)
+                        metrics.observe("tick_poll", time.perf_counter() - started)
+
+                    # Expirações vencidas saem mesmo sem ticks novos (no executor: o diário faz fsync)
+                    await scheduler.run_blocking(resolve_outcomes)
+                    if not liberados:
                         continue
 
-                    for symbol in symbols:
-                        # Coleta 37 velas M5 (36 anteriores + atual)
-                        rates = get_rates(symbol, 5, 0, 100)
-                        if rates is None or len(rates) < 37:
-                            continue
-
-                        current = rates[-1]
-                        high = current['high']
-                        low = current['low']
-                        open_ = current['open']
-                        close = current['close']
-
-                        # Calcula tamanho do corpo da vela
-                        body_size = abs(close - open_)
-                        retracement_data[symbol]['body_size'] = body_size
-
-                        # Verifica retração mínima
-                        if body_size > 0.00001:
-                            retr_up = (high - close) / body_size
-                            retr_down = (close - low) / body_size
-                            if retr_up >= min_retr_pct or retr_down >= min_retr_pct:
-                                retracement_data[symbol]['has_retraced'] = True
-
-                        # Suporte e resistência com as 24 velas (ignorando 12 mais recentes)
-                        support, resistance = calculate_support_resistance(
-                            rates,
-                            symbol,
-                            min_touches=min_touches,
-                            min_distance_between_touches=min_distance_between_touches,
-                            tolerance_pips=tolerance_pips,
-                            min_region_separation=min_region_separation
-                        )
-                        if support is None or resistance is None:
-                            print(f"{symbol} Suporte ou resistência não encontrado.")
-                            continue
-
-                        # Verifica lateralização nas últimas 36 velas
-                        if not is_lateralization(rates[-36:]):
-                            print(f"{symbol} Gráfico não está lateralizado.")
-                            continue
-
-                        # Avalia sinal técnico
-                        signal = evaluate_entry(rates, support, resistance, symbol, min_distance_pips, retracement_data)
-
-                        # Se houver sinal, checa pavios e vela esticada se necessário
-                        if signal:
-                            direction = "buy" if "buy" in signal else "sell"
-                            if not check_previous_wicks(rates, direction):
-                                continue
-
-                            minuto = now.minute
-                            if minuto % 15 >= 10:
-                                m15_rates = get_rates(symbol, 15, 1, 1)
-                                if not m15_rates or not is_candle_stretched(m15_rates[0]):
-                                    continue
-                            if minuto % 30 >= 20:
-                                m30_rates = get_rates(symbol, 30, 1, 1)
-                                if not m30_rates or not is_candle_stretched(m30_rates[0]):
-                                    continue
-                            if minuto >= 40:
-                                h1_rates = get_rates(symbol, 60, 1, 1)
-                                if not h1_rates or not is_candle_stretched(h1_rates[0]):
-                                    continue
-
+                    # Uma passada de análise sobre os símbolos liberados (no executor, junto das chamadas ao MT5)
+                    started = time.perf_counter()
+                    # (o bloqueio por notícia é um dos filtros da cadeia, aplicado só aos símbolos que tocaram um nível)
+                    approved = await scheduler.run_blocking(analysis_pass, liberados, retracement_data, now, feed is None, calendario)
+                    metrics.observe("analysis_pass", time.perf_counter() - started)
+                    metrics.inc("analysis_cycles_total")
+                    window_cycles += 1
+                    if snapshot_path and time.monotonic() - last_snapshot >= snapshot_intervalo:
+                        await scheduler.run_blocking(save_state)
+                        last_snapshot = time.monotonic()
+                    for symbol, signal, current in approved:
                         # Se for um novo sinal, envia ao Telegram e registra
-                        if signal and symbol not in signals:
-                            total_signals += 1
-                            entry_price = current['close']
-                            now_str = datetime.now().strftime("%H:%M:%S")
-                            price_fmt = "{:.3f}" if "JPY" in symbol else "{:.5f}"
-                            formatted_price = price_fmt.format(entry_price)
-
-                            message = (
-                                f"<b>NEW Time:</b> <code>{now_str} 🕐</code>\n"
-                                f"<b>Symbol:</b> <code>{symbol} 📊</code>\n"
-                                f"<b>Signal:</b> <code>{signal}</code>\n"
-                                f"<b>Price:</b> <code>{formatted_price} 💰</code>"
-                            )
-                            print(message)
-                            send_telegram_message(bot_token, chat_id, message)
-
-                            signals[symbol] = {
-                                'signal': signal,
-                                'entry_price': entry_price,
-                                'timestamp': now_str
-                            }
-
-                        # 🔍 Imprime sempre as distâncias para debug, mesmo que tenha sinal
-                        pips_multiplier = 0.01 if "JPY" in symbol else 0.0001
-                        current_open = current['open']
-                        distance_to_support = (current_open - support) / pips_multiplier
-                        distance_to_resistance = (resistance - current_open) / pips_multiplier
-                        distance_to_support = max(0, distance_to_support)
-                        distance_to_resistance = max(0, distance_to_resistance)
-
-                        now_str = datetime.now().strftime("%H:%M:%S")
-                        print(f"{now_str} - Waiting for best entry. {symbol} - Sup: {support:.5f}, Resist: {resistance:.5f}, DS: {distance_to_support:.2f}, DR: {distance_to_resistance:.2f}")
-                
-                # Aguarda início da nova vela M5 para validar sinais
-                while True:
-                    current_time = time.localtime()
-                    if current_time.tm_sec == 0 and current_time.tm_min % 5 == 0:
-                        # Reseta os dados de retração para nova análise
-                        for symbol in symbols:
-                            retracement_data[symbol]['has_retraced'] = False
-                            retracement_data[symbol]['body_size'] = 0
-                        break
-                    time.sleep(1)
-
-                # Avalia os resultados dos sinais emitidos
-                for symbol, data in list(signals.items()):
-                    final = get_rates(symbol, 5, 0, 1)  # Coleta a vela recém-fechada
-                    if not final:
-                        continue
-                    final_price = final[-1]['close']
-
-                    # Formata o preço de saída
-                    price_fmt = "{:.3f}" if "JPY" in symbol else "{:.5f}"
-                    formatted_price = price_fmt.format(final_price)
-
-                    # Verifica se o movimento foi na direção esperada
-                    success = check_signal_success(data['signal'], final_price, data['entry_price'])
-                    if success:
-                        success_signals += 1
-                        result = "NEW Successful ✅"
-                    else:
-                        failed_signals += 1
-                        result = "NEW Failed ❌"
-
-                    # Monta mensagem com resultado e histórico
-                    result_msg = (
-                        f"<b>NEW Symbol:</b> <code>{symbol} 📊</code>\n"
-                        f"<b>Price:</b> <code>{formatted_price} 💰</code>\n"
-                        f"<b>Resultado:</b> <code>{result}</code>\n\n"
-                        f"<b>Histórico:</b>\n"
-                        f"<b>Total:</b> <code>{total_signals}</code>\n"
-                        f"<b>Successful:</b> <code>{success_signals} ✅</code>\n"
-                        f"<b>Failure:</b> <code>{failed_signals} ❌</code>"
-                    )
-                    print(result_msg)
-                    send_telegram_message(bot_token, chat_id, result_msg)
-                    del signals[symbol]  # Remove o sinal já avaliado
+                        if symbol not in signals:
+                            with metrics.timer("notify", symbol):
+                                entry_price = float(current['close'])
+                                now_str = datetime.now().strftime("%H:%M:%S")
+                                reporter.signal(symbol, signal, entry_price, int(current['time']), now_str)
+                                signals[symbol] = {
+                                    'signal': signal,
+                                    'entry_price': entry_price,
+                                    'timestamp': now_str,
+                                    'bar_time': int(current['time'])
+                                }
+                                resolver.add(symbol, signal, entry_price, int(current['time']))
+                    reporter.flush()  # Um fsync por passada com sinais novos
+
+                metrics.inc("analysis_windows_total")
+                metrics.set_gauge("window_cycles", window_cycles)
+                if coordinated:
+                    # No modo supervisor, as estatísticas da janela vão para o coordenador, que imprime e exporta o consolidado
+                    reporter.window(window_snapshot(symbols, window_cycles, scheduler, feed, resolver))
+                else:
+                    # Tráfego com o MT5 na janela: velas buscadas vs. velas entregues pelos buffers
+                    buffer_stats = get_buffer_stats()
+                    source_stats = get_source_stats()
+                    scheduler_stats = scheduler.stats()
+                    print(f"Velas buscadas no MT5: {buffer_stats['bars_fetched']} | Velas servidas do buffer: {buffer_stats['bars_served']}")
+                    print(f"Chamadas à fonte de dados: {source_stats['calls']} | Ticks recebidos: {source_stats['ticks']} | Tempo esperando a fonte: {source_stats['wait_seconds']:.2f}s")
+                    print(f"Ticks perdidos: {scheduler_stats['missed_ticks']} | Velas perdidas: {scheduler_stats['missed_bars']}")
+                    trigger_stats = triggers.stats()
+                    print(f"Gatilhos: {trigger_stats['checks']} conferências | {trigger_stats['touches']} toques | {trigger_stats['arms']} armações")
+                    print(f"Filtros (rejeitados/avaliados): {filter_chain.describe()}")
+                    if len(expiracoes) > 1:
+                        comparacao = []
+                        for bars in expiracoes:
+                            stats = reporter.journal.win_rate(expiry=bars)
+                            rate = f"{stats['win_rate'] * 100:.0f}%" if stats['win_rate'] is not None else "-"
+                            comparacao.append(f"{bars} vela{'s' if bars > 1 else ''} {stats['success']}/{stats['resolved']} ({rate})")
+                        print(f"Expirações (acertos/avaliados): {' | '.join(comparacao)}")
+                    telegram_stats = get_telegram_stats()
+                    print(f"Telegram: fila {telegram_stats['queue_depth']} | enviadas {telegram_stats['sent']} | falhas {telegram_stats['failed']} | latência p50 {telegram_stats['latency_p50']:.2f}s (máx {telegram_stats['latency_max']:.2f}s)")
+
+                    # Latência por etapa (percentis das últimas execuções) e exportação das métricas
+                    etapas = " | ".join(f"{stage} {p50:.2f}/{p99:.2f}" for stage, (p50, p99) in sorted(metrics.summary().items()))
+                    print(f"Passadas na janela: {window_cycles} | Latência p50/p99 (ms): {etapas}")
+                    if metricas_arquivo:
+                        await scheduler.run_blocking(metrics.write, metricas_arquivo)
+
+                # Aguarda início da nova vela M5 (os resultados são resolvidos na primeira passada da
+                # próxima janela, com a vela de saída já no buffer)
+                await scheduler.wait_for_bar_open()
+
+                # Reseta os dados de retração para nova análise
+                for symbol in symbols:
+                    retracement_data[symbol]['has_retraced'] = False
+                    retracement_data[symbol]['body_size'] = 0
+
+                reporter.flush()
+                if snapshot_path:
+                    await scheduler.run_blocking(save_state)
+                    last_snapshot = time.monotonic()
 
             else:
                 # Fora do horário de operação, aguarda 5 minutos antes de checar novamente
                 print("Fora do horário de operação. Aguardando próxima janela...")
-                time.sleep(300)
+                scheduler.reset()
+                # Sem passadas de análise: atualiza os buffers dos sinais pendentes para resolvê-los
+                for symbol in resolver.symbols():
+                    await scheduler.run_blocking(get_buffered_rates, symbol, 5, 100)
+                resolve_outcomes()
+                await asyncio.sleep(300)
 
     finally:
         # Encerra conexão com MetaTrader 5 ao sair do loop
-        shutdown_mt5()
+        if snapshot_path:
+            await scheduler.run_blocking(save_state)
+        reporter.close()
+        calendario.parar()
+        await scheduler.run_blocking(shutdown_mt5)
+        if store is not None:
+            await scheduler.run_blocking(store.close)
+        # Dá um tempo para o worker do Telegram entregar as mensagens pendentes
+        flush_telegram_queue(timeout=10)
+        scheduler.close()
+
+def main():
+    try:
+        if workers > 1:
+            # Modo supervisor: os símbolos são divididos entre processos (ver supervisor.py)
+            from supervisor import run_supervisor
+            run_supervisor(workers)
+        else:
+            asyncio.run(run())
+    except KeyboardInterrupt:
+        print("Robô encerrado.")
 
 # Executa o robô
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,176 @@
+# === metrics.py ===
+# Instrumentação leve das etapas do loop de análise, com exportação no formato texto do Prometheus.
+#
+# Cada etapa (coleta, suporte/resistência, lateralização, entrada, pavios, timeframes maiores,
+# notificação, resultado...) é medida com perf_counter e acumulada em um histograma de buckets
+# fixos, por etapa e, quando faz sentido, por símbolo. Além dos contadores acumulados (o que o
+# Prometheus espera), cada histograma guarda as últimas amostras para os percentis "rolantes"
+# impressos no console. O custo por medição é de poucos microssegundos, então pode ficar ligado.
+#
+# A exportação pode ser feita em arquivo (escrita atômica, ex: para o textfile collector do
+# node_exporter) e/ou em um endpoint HTTP local (/metrics).
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites superiores (em segundos) dos buckets dos histogramas: 50 µs a 10 s
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Prefixo dos nomes das métricas exportadas
+PREFIX = "binarybot"
+
+
+class Histogram:
+    """Histograma de buckets fixos com as últimas `window` amostras para percentis rolantes."""
+
+    def __init__(self, window=512):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Último = acima do maior bucket (+Inf)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def percentile(self, q):
+        """Percentil (0 a 100) das amostras recentes, em segundos."""
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+class Metrics:
+    """Registro de histogramas por etapa/símbolo, contadores, medidores e coletores."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}  # etapa -> Histogram
+        self.symbol_stages = {}  # (etapa, símbolo) -> Histogram
+        self.counters = {}  # nome -> valor
+        self.gauges = {}  # nome -> valor
+        self.collectors = {}  # prefixo -> função que devolve um dicionário de valores numéricos
+
+    def observe(self, stage, seconds, symbol=None):
+        """Registra a duração de uma etapa (do lote inteiro ou de um símbolo)."""
+        with self.lock:
+            if symbol is None:
+                histogram = self.stages.get(stage)
+                if histogram is None:
+                    histogram = self.stages[stage] = Histogram()
+            else:
+                histogram = self.symbol_stages.get((stage, symbol))
+                if histogram is None:
+                    histogram = self.symbol_stages[(stage, symbol)] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage, symbol=None):
+        """Mede o bloco `with` como uma execução da etapa."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, symbol)
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def register_collector(self, prefix, func):
+        """Exporta como medidores os valores devolvidos por func() (ex: get_buffer_stats)."""
+        self.collectors[prefix] = func
+
+    def summary(self, q=(50, 99)):
+        """Percentis rolantes (em ms) por etapa, para impressão no console."""
+        with self.lock:
+            return {stage: tuple(h.percentile(p) * 1000 for p in q) for stage, h in self.stages.items()}
+
+    def render(self):
+        """Métricas no formato texto do Prometheus (versão 0.0.4)."""
+        lines = []
+
+        def histogram_lines(name, items, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in items:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{label_text}}} {histogram.sum:.9f}")
+                lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+
+        with self.lock:
+            histogram_lines(f"{PREFIX}_stage_seconds",
+                            [((("stage", stage),), h) for stage, h in sorted(self.stages.items())],
+                            "Duração de cada etapa do loop de análise.")
+            histogram_lines(f"{PREFIX}_symbol_stage_seconds",
+                            [((("stage", stage), ("symbol", symbol)), h)
+                             for (stage, symbol), h in sorted(self.symbol_stages.items())],
+                            "Duração das etapas medidas por símbolo.")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {PREFIX}_{name} counter")
+                lines.append(f"{PREFIX}_{name} {value}")
+            gauges = dict(self.gauges)
+
+        for prefix, func in self.collectors.items():
+            try:
+                values = func()
+            except Exception:
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges[f"{prefix}_{key}"] = value
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE {PREFIX}_{name} gauge")
+            lines.append(f"{PREFIX}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Grava as métricas em arquivo (escrita atômica: arquivo temporário + os.replace)."""
+        temporary = path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(temporary, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve as métricas em http://host:port/metrics em uma thread em segundo plano."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Sem log de cada requisição no console
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+
+# Registro global usado pelos módulos do robô
+metrics = Metrics()
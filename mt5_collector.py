@@ -1,18 +1,95 @@
 # Contém as funções de inicialização, finalização e coleta de dados do MetaTrader 5
+# (ou da fonte de dados configurada, ver data_sources.py)
 
-import MetaTrader5 as mt5
-# Inicializa a conexão com o MetaTrader 5
+import numpy as np
+
+from data_sources import MT5DataSource
+from symbol_registry import PRICE_FIELDS, get_symbol_info, set_symbol_source, clear_symbol_registry, points_dtype
+
+# Capacidade padrão (em velas) do buffer mantido por (símbolo, timeframe)
+BUFFER_CAPACITY = 500
+
+# Fonte de dados ativa (padrão: terminal MetaTrader 5)
+_source = MT5DataSource()
+set_symbol_source(_source)
+
+# Histórico local de velas (candle_store.CandleStore), ou None se desativado
+_store = None
+
+# Troca a fonte de dados usada por todas as funções deste módulo (ex: ReplayDataSource)
+# :param source: Instância de data_sources.DataSource
+def set_data_source(source):
+    global _source
+    _source = source
+    _buffers.clear()  # Os buffers pertencem à fonte anterior
+    set_symbol_source(source)
+
+# Ativa o histórico local: as velas fechadas buscadas passam a ser gravadas nele e os buffers
+# vazios começam pelas velas gravadas, buscando no MT5 só as que faltam
+# :param store: Instância de candle_store.CandleStore (None desativa)
+def set_candle_store(store):
+    global _store
+    _store = store
+
+# Grava no histórico local as velas fechadas recém-buscadas; se elas não emendarem com a última
+# vela gravada (ex: o robô ficou parado), preenche a lacuna pela fonte de dados
+# :param rates: Velas retornadas pela fonte a partir da posição 0 (a última está em formação)
+def _persist(symbol, timeframe, rates):
+    if _store is None or rates is None or len(rates) < 2:
+        return
+    closed = rates[:-1]
+    last = _store.last_time(symbol, timeframe)
+    if last is not None and int(closed['time'][-1]) <= last:
+        return
+    if last is not None and int(closed['time'][0]) > last + timeframe_seconds(timeframe):
+        fill_gaps(symbol, timeframe)
+    else:
+        _store.append(symbol, timeframe, closed)
+
+# Preenche o histórico local de uma série com as velas fechadas que faltam desde a última gravada
+# :param symbol: Par de moedas (ex: EURUSD)
+# :param timeframe: Timeframe da série
+# :param seed_bars: Velas buscadas quando a série ainda está vazia
+# :param max_bars: Limite de velas buscadas para cobrir uma lacuna
+# :return: Quantidade de velas acrescentadas
+def fill_gaps(symbol, timeframe, seed_bars=BUFFER_CAPACITY, max_bars=50000):
+    if _store is None:
+        return 0
+    last = _store.last_time(symbol, timeframe)
+    count = seed_bars
+    if last is not None:
+        # Estimativa pelo relógio (limite superior; fins de semana só reduzem a contagem)
+        current = _source.copy_rates_from_pos(symbol, timeframe, 0, 1)
+        if current is None or not len(current):
+            return 0
+        count = min((int(current['time'][-1]) - last) // timeframe_seconds(timeframe), max_bars)
+        if count <= 0:
+            return 0
+    rates = _source.copy_rates_from_pos(symbol, timeframe, 1, count)  # start_pos=1 ignora a vela em formação
+    if rates is None or not len(rates):
+        return 0
+    if last is not None and int(rates['time'][0]) > last + timeframe_seconds(timeframe):
+        # Só acréscimo: as velas que a fonte não devolveu ficam como lacuna no histórico
+        print(f"{symbol} M{timeframe}: a fonte não tem as velas entre a última gravada e {int(rates['time'][0])}; "
+              f"o histórico local fica com uma lacuna.")
+    return _store.append(symbol, timeframe, rates)
+
+# Estatísticas da fonte de dados ativa: chamadas, velas retornadas e tempo de espera
+# :return: Dicionário com 'calls', 'bars' e 'wait_seconds'
+def get_source_stats():
+    return _source.stats()
+
+# Inicializa a conexão com o MetaTrader 5 (ou com a fonte de dados configurada)
 # :return: True se a conexão for bem-sucedida, False caso contrário
 def initialize_mt5():
-    if not mt5.initialize():
-        print("❌ Erro ao inicializar MetaTrader 5:", mt5.last_error())
+    if not _source.initialize():
         return False
-    print("✅ Conectado ao MetaTrader 5 com sucesso.")
+    clear_symbol_registry()  # Metadados consultados antes da conexão usaram a regra pelo nome
     return True
 
 # Finaliza/desconecta a instância ativa do MetaTrader 5
 def shutdown_mt5():
-    mt5.shutdown()  # Encerra a conexão com o MT5 corretamente
+    _source.shutdown()
 
 # Coleta os candles históricos a partir de uma posição específica
 # :param symbol: Par de moedas (ex: EURUSD)
@@ -21,4 +98,269 @@ def shutdown_mt5():
 # :param count: Quantidade de velas desejadas
 # :return: Lista de dicionários com OHLC, time, tick_volume, etc
 def get_rates(symbol, timeframe, start_pos, count):
-    return mt5.copy_rates_from_pos(symbol, timeframe, start_pos, count)  # Solicita os dados ao MetaTrader
\ No newline at end of file
+    return _source.copy_rates_from_pos(symbol, timeframe, start_pos, count)  # Solicita os dados ao MetaTrader
+
+# Coleta os ticks (mudanças de bid/ask) de um símbolo a partir de um horário
+# :param symbol: Par de moedas (ex: EURUSD)
+# :param date_from: Horário inicial (epoch, em segundos, no horário do servidor como as velas)
+# :param count: Quantidade máxima de ticks
+# :return: Array estruturado com time, bid, ask, time_msc, etc (ver data_sources.TICK_DTYPE)
+def get_ticks(symbol, date_from, count):
+    return _source.copy_ticks_from(symbol, date_from, count)
+
+# Converte a constante de timeframe do MT5 para a duração da vela em segundos
+# :param timeframe: Constante do MT5 (minutos até M30; bit 0x4000 = horas, 0x8000 = semanas, 0xC000 = meses)
+# :return: Duração de uma vela em segundos
+def timeframe_seconds(timeframe):
+    if timeframe & 0xC000 == 0xC000:
+        return (timeframe & 0x3FFF) * 30 * 86400
+    if timeframe & 0x8000:
+        return (timeframe & 0x3FFF) * 7 * 86400
+    if timeframe & 0x4000:
+        return (timeframe & 0x3FFF) * 3600
+    return timeframe * 60
+
+
+class CandleBuffer:
+    """
+    Buffer pré-alocado com as velas mais recentes de um (símbolo, timeframe).
+
+    As velas ficam contíguas em um array estruturado com o dobro da capacidade, de modo que
+    as leituras são sempre fatias (views) sem cópia. A cada sincronização só são buscadas no
+    MT5 as velas mais novas que a última armazenada, e a vela em formação é sobrescrita no lugar.
+    Quando o fim do array é atingido, as últimas `capacity` velas são movidas para o início.
+
+    Além das colunas do MT5, o array guarda open/high/low/close em pontos inteiros
+    (open_points, ...; ver symbol_registry), convertidos uma única vez quando as velas entram.
+    """
+
+    def __init__(self, symbol, timeframe, capacity=BUFFER_CAPACITY):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.capacity = capacity
+        self.data = None  # Alocado na primeira carga, com o dtype retornado pelo MT5 + colunas em pontos
+        self.point = None  # Point do símbolo, lido do registro na primeira carga
+        self.start = 0
+        self.end = 0
+        self.bars_fetched = 0
+        self.bars_served = 0
+        self.bars_from_store = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def last_time(self):
+        return int(self.data[self.end - 1]['time']) if len(self) else None
+
+    def view(self, count):
+        """Retorna uma view (sem cópia) das últimas `count` velas do buffer."""
+        first = max(self.start, self.end - count)
+        self.bars_served += self.end - first
+        return self.data[first:self.end]
+
+    def _allocate(self, dtype):
+        if self.data is None:
+            self.data = np.zeros(2 * self.capacity, dtype=points_dtype(dtype))
+            self.point = get_symbol_info(self.symbol).point
+
+    def _write(self, first, rates):
+        # Copia as velas a partir da posição `first`, convertendo os preços para pontos
+        target = self.data[first:first + len(rates)]
+        for name in rates.dtype.names:
+            target[name] = rates[name]
+        for name in PRICE_FIELDS:
+            target[f"{name}_points"] = np.rint(rates[name] / self.point)
+
+    def _seed(self):
+        # Começa pelas velas fechadas do histórico local (a sincronização busca só as que faltam)
+        if _store is None:
+            return False
+        rates = _store.read_rates(self.symbol, self.timeframe, count=self.capacity)
+        if not len(rates):
+            return False
+        self._allocate(rates.dtype)
+        self._write(0, rates)
+        self.start, self.end = 0, len(rates)
+        self.bars_from_store += len(rates)
+        return True
+
+    def _load(self, count):
+        # Carga inicial (ou recarga após falha): parte do histórico local, se houver, e senão
+        # busca o histórico completo
+        if self._seed():
+            if self._sync(count, reload=False):
+                return True
+            self.start = self.end = 0
+        rates = _source.copy_rates_from_pos(self.symbol, self.timeframe, 0, max(count, self.capacity))
+        if rates is None or len(rates) == 0:
+            return False
+        self.bars_fetched += len(rates)
+        _persist(self.symbol, self.timeframe, rates)
+        rates = rates[-self.capacity:]
+        self._allocate(rates.dtype)
+        self._write(0, rates)
+        self.start, self.end = 0, len(rates)
+        return True
+
+    def _append(self, candle):
+        if self.end == len(self.data):
+            # Fim do array: mantém as últimas capacity - 1 velas e abre espaço para a nova
+            keep = self.capacity - 1
+            self.data[:keep] = self.data[self.end - keep:self.end]
+            self.start, self.end = 0, keep
+        self._write(self.end, candle.reshape(1))
+        self.end += 1
+        if self.end - self.start > self.capacity:
+            self.start += 1
+
+    def set_forming(self, bar_time, open_, high, low, close, tick_volume):
+        """
+        Grava a vela em formação montada a partir de ticks.
+
+        Se `bar_time` for mais novo que a última vela do buffer, acrescenta a vela (a anterior
+        fica como está até a próxima sincronização com o MT5).
+
+        :return: True se a vela foi gravada, False se o buffer estiver vazio ou a vela for antiga
+        """
+        if not len(self):
+            return False
+        last_time = self.last_time()
+        if bar_time < last_time:
+            return False
+        if bar_time > last_time:
+            candle = self.data[self.end - 1].copy()
+            candle['time'] = bar_time
+            self._append(candle)
+        i = self.end - 1
+        for name, price in zip(PRICE_FIELDS, (open_, high, low, close)):
+            self.data[name][i] = price
+            self.data[f"{name}_points"][i] = round(price / self.point)
+        self.data['tick_volume'][i] = tick_volume
+        return True
+
+    def sync(self, count):
+        """
+        Atualiza o buffer com as velas novas do MT5.
+
+        :param count: Quantidade de velas que o chamador pretende ler
+        :return: True se o buffer estiver pronto para leitura, False em caso de falha
+        """
+        if not len(self):
+            return self._load(count)
+        return self._sync(count)
+
+    def _sync(self, count, reload=True):
+        # Busca as velas novas desde a última do buffer; se faltarem mais velas que a capacidade,
+        # recarrega tudo (ou, com reload=False, devolve False para o chamador recarregar)
+        last_time = self.last_time()
+
+        # Caso comum: a vela em formação e a anterior (que pode ter acabado de fechar)
+        rates = _source.copy_rates_from_pos(self.symbol, self.timeframe, 0, 2)
+        if rates is None or len(rates) == 0:
+            return False
+        self.bars_fetched += len(rates)
+        if rates[-1]['time'] < last_time:
+            # A fonte está antes da última vela do buffer (ex: replay reiniciado): recarrega tudo
+            return self._load(count) if reload else False
+
+        if rates[0]['time'] > last_time:
+            # Mais de uma vela nova desde a última sincronização: busca o intervalo que falta.
+            # A estimativa pelo relógio é um limite superior (fins de semana só reduzem a contagem).
+            missing = (int(rates[-1]['time']) - last_time) // timeframe_seconds(self.timeframe) + 1
+            if missing > self.capacity:
+                return self._load(count) if reload else False
+            rates = _source.copy_rates_from_pos(self.symbol, self.timeframe, 0, missing)
+            if rates is None or len(rates) == 0:
+                return False
+            self.bars_fetched += len(rates)
+        _persist(self.symbol, self.timeframe, rates)
+
+        for candle in rates:
+            candle_time = candle['time']
+            if candle_time == last_time:
+                self._write(self.end - 1, candle.reshape(1))  # Sobrescreve a vela em formação no lugar
+            elif candle_time > last_time:
+                self._append(candle)
+                last_time = candle_time
+        return True
+
+
+# Buffers de velas por (símbolo, timeframe)
+_buffers = {}
+
+# Coleta as velas mais recentes usando o buffer incremental do símbolo
+# :param symbol: Par de moedas (ex: EURUSD)
+# :param timeframe: Timeframe do candle (ex: mt5.TIMEFRAME_M5)
+# :param count: Quantidade de velas desejadas (a última é a vela em formação)
+# :param sync: Se False, não consulta o MT5 quando o buffer já tem velas (a vela em formação é
+#              mantida pelos ticks, ver tick_feed.py)
+# :return: View (sem cópia) das últimas velas, ou None se o MT5 não retornar dados.
+#          A view aponta para o buffer: só é válida até a próxima chamada para o mesmo símbolo/timeframe.
+def get_buffered_rates(symbol, timeframe, count, sync=True):
+    key = (symbol, timeframe)
+    buffer = _buffers.get(key)
+    if buffer is None:
+        buffer = _buffers[key] = CandleBuffer(symbol, timeframe, max(BUFFER_CAPACITY, count))
+    if (sync or not len(buffer)) and not buffer.sync(count):
+        return None
+    return buffer.view(count)
+
+# Grava no buffer a vela em formação montada a partir de ticks
+# :param symbol: Par de moedas (ex: EURUSD)
+# :param timeframe: Timeframe do buffer
+# :param bar_time: Abertura (epoch) da vela
+# :return: True se a vela foi gravada (o buffer precisa já ter sido carregado)
+def update_forming_bar(symbol, timeframe, bar_time, open_, high, low, close, tick_volume):
+    buffer = _buffers.get((symbol, timeframe))
+    return buffer is not None and buffer.set_forming(bar_time, open_, high, low, close, tick_volume)
+
+# Fechamento de uma vela já armazenada no buffer (busca binária, sem consultar o MT5)
+# :param symbol: Par de moedas (ex: EURUSD)
+# :param timeframe: Timeframe do buffer
+# :param bar_time: Abertura (epoch) da vela
+# :return: Tupla (fechamento da vela ou None se ela não estiver no buffer, abertura da última vela do buffer ou None)
+def get_buffered_close(symbol, timeframe, bar_time):
+    buffer = _buffers.get((symbol, timeframe))
+    if buffer is None or not len(buffer):
+        return None, None
+    times = buffer.data['time'][buffer.start:buffer.end]
+    i = int(np.searchsorted(times, bar_time))
+    close = float(buffer.data['close'][buffer.start + i]) if i < len(times) and times[i] == bar_time else None
+    return close, int(times[-1])
+
+# Abertura (epoch, horário do servidor) da vela mais recente entre os buffers de um timeframe
+# :return: Horário da vela ou None se nenhum buffer tiver velas
+def get_latest_bar_time(timeframe):
+    times = [buffer.last_time() for (_, tf), buffer in _buffers.items() if tf == timeframe and len(buffer)]
+    return max(times) if times else None
+
+# Estado dos buffers para o snapshot de reinício a quente (ver state_snapshot.py)
+# :return: Dicionário (símbolo, timeframe) -> {'rates', 'bars_fetched', 'bars_served'}, com cópia só das velas armazenadas
+def export_buffers():
+    return {
+        key: {'rates': buffer.data[buffer.start:buffer.end].copy(),
+              'bars_fetched': buffer.bars_fetched, 'bars_served': buffer.bars_served}
+        for key, buffer in _buffers.items() if len(buffer)
+    }
+
+# Restaura os buffers do snapshot; a próxima sincronização só busca no MT5 as velas que faltam
+# :param state: Dicionário retornado por export_buffers()
+def restore_buffers(state):
+    for (symbol, timeframe), saved in state.items():
+        rates = saved['rates']
+        buffer = CandleBuffer(symbol, timeframe, max(BUFFER_CAPACITY, len(rates)))
+        buffer._allocate(rates.dtype)
+        buffer._write(0, rates)
+        buffer.start, buffer.end = 0, len(rates)
+        buffer.bars_fetched = saved['bars_fetched']
+        buffer.bars_served = saved['bars_served']
+        _buffers[(symbol, timeframe)] = buffer
+
+# Estatísticas de tráfego com o MT5: velas buscadas vs. velas entregues pelos buffers
+# :return: Dicionário com 'bars_fetched', 'bars_served' e 'bars_from_store' (velas lidas do histórico local)
+def get_buffer_stats():
+    return {
+        'bars_fetched': sum(b.bars_fetched for b in _buffers.values()),
+        'bars_served': sum(b.bars_served for b in _buffers.values()),
+        'bars_from_store': sum(b.bars_from_store for b in _buffers.values()),
+    }
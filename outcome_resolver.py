@@ -0,0 +1,115 @@
+# === outcome_resolver.py ===
+# Resultado dos sinais por expiração, a partir das velas já coletadas.
+#
+# Cada sinal entra com uma expiração por quantidade de velas configurada (ex: 1, 3 e 5): a de
+# N velas vence no fechamento da vela bar_time + (N - 1) × período, ou seja, quando aparece a
+# vela que abre em bar_time + N × período. As expirações ficam em um heap mínimo pelo horário de
+# vencimento; a cada passada só o topo do heap é conferido e as vencidas são resolvidas em lote
+# com o fechamento da vela de saída lido do buffer (sem consultar o MT5), em microssegundos.
+#
+# A primeira expiração da lista é a oficial (mensagem de resultado, totais do Telegram); as
+# demais servem para comparar expirações e são registradas só no diário.
+
+import heapq
+import itertools
+
+from signals import check_signal_success
+
+
+class OutcomeResolver:
+    """
+    Fila de expirações dos sinais emitidos.
+
+    :param expiries: Expirações em velas (ex: (1, 3, 5)); a primeira é a oficial
+    :param period: Duração de uma vela (s)
+    :param max_delay: Velas de espera por um buffer atrasado antes de dar a expiração como perdida
+    """
+
+    def __init__(self, expiries=(1,), period=300, max_delay=10):
+        self.expiries = tuple(int(bars) for bars in expiries)
+        self.official = self.expiries[0]
+        self.period = period
+        self.max_delay = max_delay
+        self.heap = []  # (vencimento, sequência, símbolo, vela do sinal, velas)
+        self.signals = {}  # (símbolo, vela do sinal) -> {'signal', 'entry_price', 'remaining'}
+        self.sequence = itertools.count()
+        self.resolved = 0
+        self.expired = 0
+        self.deferred = 0
+        self.outcomes = {bars: [0, 0] for bars in self.expiries}  # velas -> [acertos, erros]
+
+    def __len__(self):
+        return len(self.heap)
+
+    def add(self, symbol, signal, entry_price, bar_time, restored=False):
+        """
+        Acrescenta as expirações de um sinal.
+
+        :param bar_time: Abertura (epoch, horário do servidor) da vela do sinal
+        :param restored: Sinal pendente restaurado do diário: só entram as expirações que vencem
+                         junto ou depois da oficial (as anteriores já podem ter sido registradas)
+        """
+        bar_time = int(bar_time)
+        expiries = [bars for bars in self.expiries if not restored or bars >= self.official]
+        self.signals[(symbol, bar_time)] = {'signal': signal, 'entry_price': entry_price,
+                                            'remaining': len(expiries)}
+        for bars in expiries:
+            heapq.heappush(self.heap, (bar_time + bars * self.period, next(self.sequence), symbol, bar_time, bars))
+
+    def next_due(self):
+        """Vencimento mais próximo (epoch) ou None se não houver expirações pendentes."""
+        return self.heap[0][0] if self.heap else None
+
+    def symbols(self):
+        """Símbolos com expirações pendentes."""
+        return {symbol for symbol, _ in self.signals}
+
+    def resolve(self, now, lookup):
+        """
+        Resolve as expirações vencidas até `now`.
+
+        :param now: Horário (epoch, do servidor) da vela mais recente já coletada
+        :param lookup: lookup(symbol, bar_time) -> (fechamento da vela ou None se ela não estiver no
+                       buffer, abertura da última vela do buffer ou None), ex: mt5_collector.get_buffered_close
+        :return: Lista de tuplas (símbolo, vela do sinal, velas, oficial, sinal, entrada, saída, sucesso);
+                 saída e sucesso são None quando a vela de saída não está disponível (expirado)
+        """
+        results = []
+        waiting = []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            due, _, symbol, bar_time, bars = entry
+            close, last_time = lookup(symbol, due - self.period)
+            if last_time is None or last_time < due:
+                # O buffer do símbolo ainda não tem a vela seguinte: a de saída pode não ter fechado
+                if now - due < self.max_delay * self.period:
+                    waiting.append(entry)
+                    continue
+                close = None
+
+            data = self.signals[(symbol, bar_time)]
+            data['remaining'] -= 1
+            if not data['remaining']:
+                del self.signals[(symbol, bar_time)]
+            if close is None:
+                self.expired += 1
+                success = None
+            else:
+                self.resolved += 1
+                success = check_signal_success(data['signal'], close, data['entry_price'])
+                self.outcomes[bars][0 if success else 1] += 1
+            results.append((symbol, bar_time, bars, bars == self.official, data['signal'],
+                            data['entry_price'], close, success))
+
+        for entry in waiting:
+            heapq.heappush(self.heap, entry)
+        self.deferred += len(waiting)
+        return results
+
+    def stats(self):
+        stats = {'pending': len(self.heap), 'resolved': self.resolved, 'expired': self.expired,
+                 'deferred': self.deferred}
+        for bars, (success, failed) in self.outcomes.items():
+            stats[f"expiry{bars}_success"] = success
+            stats[f"expiry{bars}_failed"] = failed
+        return stats
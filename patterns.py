@@ -1,5 +1,7 @@
 # Contém funções para analisar retrações e pavios de velas
 
+import numpy as np
+
 def check_retracement(candle, min_percent=0.2):
     """
     Verifica se o candle atual apresentou retração suficiente antes de tocar suporte ou resistência.
@@ -57,4 +59,78 @@ def is_candle_stretched(candle):
     total_range = candle['high'] - candle['low']
     if total_range == 0:
         return False
-    return body / total_range >= 0.7
\ No newline at end of file
+    return body / total_range >= 0.7
+
+def _wick_masks(open_, high, low, close):
+    # Pavios válidos para compra e para venda de cada vela (mesma regra de wick_valid)
+    body = np.abs(close - open_)
+    upper_wick = high - np.maximum(open_, close)
+    lower_wick = np.minimum(open_, close) - low
+    buy_ok = (body != 0) & (lower_wick >= 0.20 * body) & (upper_wick <= 0.40 * body)
+    sell_ok = (body != 0) & (upper_wick >= 0.20 * body) & (lower_wick <= 0.40 * body)
+    return buy_ok, sell_ok
+
+def check_previous_wicks_batch(rates, directions):
+    """
+    Versão em lote de check_previous_wicks: valida os pavios das duas velas anteriores de todos os símbolos.
+
+    :param rates: Array estruturado 2D (símbolos x velas), com pelo menos 3 velas
+    :param directions: Array de direções por símbolo (1 = compra, -1 = venda, 0 = sem sinal)
+    :return: Array booleano com True onde as duas velas anteriores têm pavios consistentes com a direção
+    """
+    previous = rates[:, -3:-1]
+    buy_ok, sell_ok = _wick_masks(previous['open'], previous['high'], previous['low'], previous['close'])
+
+    directions = np.asarray(directions)
+    return np.where(directions == 1, buy_ok.all(axis=1), (directions == -1) & sell_ok.all(axis=1))
+
+
+# Versões vetorizadas sobre uma série inteira de velas: recebem as colunas OHLC (arrays 1D, em
+# ordem cronológica) e devolvem uma máscara booleana com o resultado da função original em cada vela.
+
+def retracement_mask(open_, high, low, close, min_percent=0.2):
+    """
+    Versão vetorizada de check_retracement: retração de cada vela da série.
+
+    :param min_percent: Valor mínimo proporcional para considerar como retração (ex: 0.2 = 20%)
+    :return: Máscara booleana com check_retracement de cada vela
+    """
+    body = np.abs(close - open_)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        retracement_up = (high - close) / body
+        retracement_down = (close - low) / body
+    return (body != 0) & ((retracement_up >= min_percent) | (retracement_down >= min_percent))
+
+def previous_wicks_mask(open_, high, low, close, direction):
+    """
+    Versão vetorizada de check_previous_wicks: para cada vela, se as duas velas anteriores têm
+    pavios consistentes com a direção (como se a vela fosse a última de `rates`).
+
+    :param direction: 'buy' ou 'sell' para a série inteira, ou array com a direção de cada vela
+                      (1 = compra, -1 = venda, 0 = sem sinal)
+    :return: Máscara booleana; as duas primeiras velas (sem duas anteriores) ficam False
+    """
+    buy_ok, sell_ok = _wick_masks(open_, high, low, close)
+    n = len(buy_ok)
+    # Vela i: pavios das velas i-1 e i-2
+    buy_ok = np.r_[False, False, buy_ok[1:-1] & buy_ok[:-2]][:n]
+    sell_ok = np.r_[False, False, sell_ok[1:-1] & sell_ok[:-2]][:n]
+    if isinstance(direction, str):
+        if direction == "buy":
+            return buy_ok
+        if direction == "sell":
+            return sell_ok
+        return np.zeros(n, bool)
+    direction = np.asarray(direction)
+    return np.where(direction == 1, buy_ok, (direction == -1) & sell_ok)
+
+def stretched_mask(open_, high, low, close):
+    """
+    Versão vetorizada de is_candle_stretched: se cada vela da série está esticada.
+
+    :return: Máscara booleana com is_candle_stretched de cada vela
+    """
+    body = np.abs(close - open_)
+    total_range = high - low
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (total_range != 0) & (body / total_range >= 0.7)
@@ -0,0 +1,258 @@
+# === resampling.py ===
+# Velas de timeframes maiores (M15, M30, H1) montadas a partir das velas M5 já coletadas.
+#
+# O filtro de vela esticada precisa da última vela fechada de M15/M30/H1 justamente quando um
+# sinal aparece; em vez de pedir essas velas ao MT5 nesse momento, cada símbolo mantém uma
+# visão multi-timeframe que é atualizada de forma incremental a cada passada, dobrando só as
+# velas M5 que fecharam desde a passada anterior.
+#
+# Uma vela agregada tem: time = início do período, open da primeira M5, high/low extremos,
+# close da última M5, volumes somados e o menor spread. Os períodos são alinhados no horário
+# do servidor (o mesmo das velas do MT5), como nas velas nativas do terminal.
+
+from collections import deque
+
+import numpy as np
+
+from mt5_collector import get_rates, timeframe_seconds
+
+# Constantes de timeframe do MT5 (ver mt5_collector.timeframe_seconds)
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 0x4000 | 1
+
+# Timeframes mantidos por padrão pela visão de cada símbolo
+HIGHER_TIMEFRAMES = (TIMEFRAME_M15, TIMEFRAME_M30, TIMEFRAME_H1)
+
+
+def resample_rates(rates, timeframe):
+    """
+    Agrega velas M5 (array estruturado em ordem cronológica) no timeframe informado.
+
+    :param rates: Array estruturado de velas do MT5
+    :param timeframe: Constante de timeframe do MT5 (ex: 15, 30, TIMEFRAME_H1)
+    :return: Array estruturado (mesmo dtype) com uma vela por período; a última pode estar incompleta
+    """
+    if len(rates) == 0:
+        return rates[:0].copy()
+    seconds = timeframe_seconds(timeframe)
+    buckets = rates['time'] // seconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(rates)] - 1
+
+    out = np.zeros(len(starts), dtype=rates.dtype)
+    out['time'] = buckets[starts] * seconds
+    out['open'] = rates['open'][starts]
+    out['high'] = np.maximum.reduceat(rates['high'], starts)
+    out['low'] = np.minimum.reduceat(rates['low'], starts)
+    out['close'] = rates['close'][ends]
+    if 'open_points' in rates.dtype.names:
+        # Colunas em pontos dos buffers do mt5_collector
+        out['open_points'] = rates['open_points'][starts]
+        out['high_points'] = np.maximum.reduceat(rates['high_points'], starts)
+        out['low_points'] = np.minimum.reduceat(rates['low_points'], starts)
+        out['close_points'] = rates['close_points'][ends]
+    for field in ('tick_volume', 'real_volume'):
+        if field in rates.dtype.names:
+            out[field] = np.add.reduceat(rates[field], starts)
+    if 'spread' in rates.dtype.names:
+        out['spread'] = np.minimum.reduceat(rates['spread'], starts)
+    return out
+
+
+def _fold(bar, candle):
+    # Acrescenta uma vela M5 à vela agregada (no lugar)
+    bar['high'] = max(bar['high'], candle['high'])
+    bar['low'] = min(bar['low'], candle['low'])
+    bar['close'] = candle['close']
+    if 'open_points' in bar.dtype.names:
+        bar['high_points'] = max(bar['high_points'], candle['high_points'])
+        bar['low_points'] = min(bar['low_points'], candle['low_points'])
+        bar['close_points'] = candle['close_points']
+    for field in ('tick_volume', 'real_volume'):
+        if field in bar.dtype.names:
+            bar[field] += candle[field]
+    if 'spread' in bar.dtype.names:
+        bar['spread'] = min(bar['spread'], candle['spread'])
+
+
+class MultiTimeframeView:
+    """
+    Visão multi-timeframe de um símbolo, mantida a partir das velas M5.
+
+    Para cada timeframe guarda as últimas `history` velas fechadas e a vela em montagem
+    (só com velas M5 fechadas). A vela M5 em formação nunca é dobrada no acumulador: ela só
+    entra na vela corrente devolvida por current(). O primeiro período após uma (re)montagem,
+    se começar no meio, é descartado por não ter todas as velas M5.
+
+    :param symbol: Par de moedas (ex: EURUSD)
+    :param timeframes: Constantes de timeframe do MT5 a manter
+    :param history: Quantidade de velas fechadas guardadas por timeframe
+    """
+
+    def __init__(self, symbol, timeframes=HIGHER_TIMEFRAMES, history=50):
+        self.symbol = symbol
+        self.timeframes = tuple(timeframes)
+        self.seconds = {tf: timeframe_seconds(tf) for tf in self.timeframes}
+        self.history = history
+        self.closed = {tf: deque(maxlen=history) for tf in self.timeframes}
+        self.building = {tf: None for tf in self.timeframes}  # Vela agregada em montagem
+        self.incomplete = {tf: None for tf in self.timeframes}  # Período inicial sem todas as velas M5
+        self.last_closed_time = None  # Horário da última vela M5 fechada já dobrada
+        self.forming = None  # Vela M5 em formação
+        self.rebuilds = 0
+
+    def _reset(self):
+        for tf in self.timeframes:
+            self.closed[tf].clear()
+            self.building[tf] = None
+            self.incomplete[tf] = None
+        self.last_closed_time = None
+        self.rebuilds += 1
+
+    def _add_closed(self, candle):
+        for tf in self.timeframes:
+            seconds = self.seconds[tf]
+            bucket = int(candle['time']) // seconds * seconds
+            bar = self.building[tf]
+            if bar is not None and bar['time'] == bucket:
+                _fold(bar, candle)
+                continue
+            if bar is not None:
+                if bar['time'] != self.incomplete[tf]:
+                    self.closed[tf].append(bar)
+            elif int(candle['time']) != bucket:
+                # Primeira vela após (re)montagem no meio do período: as velas M5 anteriores não vieram
+                self.incomplete[tf] = bucket
+            bar = candle.copy()
+            bar['time'] = bucket
+            self.building[tf] = bar
+        self.last_closed_time = int(candle['time'])
+
+    def update(self, rates):
+        """
+        Atualiza a visão com as velas M5 mais recentes (ex: view do CandleBuffer).
+
+        :param rates: Array estruturado de velas M5; a última é a vela em formação
+        """
+        if rates is None or len(rates) == 0:
+            return
+        closed = rates[:-1]
+        if self.last_closed_time is not None and len(closed) and int(closed[0]['time']) > self.last_closed_time:
+            # Lacuna maior que a janela recebida: as velas intermediárias se perderam, remonta tudo
+            self._reset()
+        if self.last_closed_time is None:
+            new = closed
+        else:
+            new = closed[closed['time'] > self.last_closed_time]
+        for candle in new:
+            self._add_closed(candle)
+        self.forming = rates[-1].copy()
+
+    def previous(self, timeframe):
+        """
+        Última vela fechada do timeframe (equivalente a get_rates(symbol, timeframe, 1, 1)[0]).
+
+        :return: Vela (registro do array estruturado) ou None se ainda não houver histórico suficiente
+        """
+        if self.forming is None:
+            return None
+        seconds = self.seconds[timeframe]
+        current_bucket = int(self.forming['time']) // seconds * seconds
+        bar = self.building[timeframe]
+        if bar is not None and bar['time'] < current_bucket:
+            return bar if bar['time'] != self.incomplete[timeframe] else None
+        closed = self.closed[timeframe]
+        return closed[-1] if closed else None
+
+    def current(self, timeframe):
+        """Vela do timeframe em formação, incluindo a vela M5 em formação."""
+        if self.forming is None:
+            return None
+        seconds = self.seconds[timeframe]
+        current_bucket = int(self.forming['time']) // seconds * seconds
+        bar = self.building[timeframe]
+        if bar is not None and bar['time'] == current_bucket:
+            bar = bar.copy()
+            _fold(bar, self.forming)
+            return bar
+        bar = self.forming.copy()
+        bar['time'] = current_bucket
+        return bar
+
+    def bars(self, timeframe, count):
+        """Últimas `count` velas fechadas do timeframe, em ordem cronológica (array estruturado)."""
+        bars = list(self.closed[timeframe])
+        previous = self.previous(timeframe)
+        if previous is not None and (not bars or bars[-1]['time'] != previous['time']):
+            bars.append(previous)
+        if not bars:
+            return None
+        return np.array(bars[-count:], dtype=bars[0].dtype)
+
+
+# Visões multi-timeframe por símbolo
+_views = {}
+
+# Atualiza e retorna a visão multi-timeframe de um símbolo
+# :param symbol: Par de moedas (ex: EURUSD)
+# :param rates: Velas M5 mais recentes (a última em formação), ex: get_buffered_rates(symbol, 5, 100)
+# :return: MultiTimeframeView do símbolo
+def update_timeframe_view(symbol, rates):
+    view = _views.get(symbol)
+    if view is None:
+        view = _views[symbol] = MultiTimeframeView(symbol)
+    view.update(rates)
+    return view
+
+# Retorna a visão multi-timeframe de um símbolo (ou None se ainda não foi atualizada)
+def get_timeframe_view(symbol):
+    return _views.get(symbol)
+
+# Compara as velas agregadas com as velas nativas do MT5 no mesmo timeframe
+# :param view: MultiTimeframeView já atualizada
+# :param count: Quantidade de velas fechadas comparadas por timeframe
+# :return: Dicionário timeframe -> {'compared', 'mismatches', 'max_diff'}
+def check_consistency(view, count=10):
+    report = {}
+    for tf in view.timeframes:
+        ours = view.bars(tf, count)
+        native = get_rates(view.symbol, tf, 1, count)
+        compared = mismatches = 0
+        max_diff = 0.0
+        if ours is not None and native is not None and len(native):
+            native_by_time = {int(bar['time']): bar for bar in native}
+            for bar in ours:
+                other = native_by_time.get(int(bar['time']))
+                if other is None:
+                    continue
+                compared += 1
+                diff = max(abs(float(bar[f]) - float(other[f])) for f in ('open', 'high', 'low', 'close'))
+                max_diff = max(max_diff, diff)
+                if diff > 1e-9:
+                    mismatches += 1
+        report[tf] = {'compared': compared, 'mismatches': mismatches, 'max_diff': max_diff}
+    return report
+
+
+if __name__ == "__main__":
+    import os
+    import yaml
+
+    from mt5_collector import initialize_mt5, shutdown_mt5, get_buffered_rates
+
+    with open(os.path.join(os.path.dirname(__file__), "config.yaml"), "r", encoding="utf-8") as f:
+        symbols = yaml.safe_load(f)["symbols"]
+
+    if initialize_mt5():
+        try:
+            names = {TIMEFRAME_M15: "M15", TIMEFRAME_M30: "M30", TIMEFRAME_H1: "H1"}
+            for symbol in symbols:
+                view = update_timeframe_view(symbol, get_buffered_rates(symbol, TIMEFRAME_M5, 500))
+                for tf, result in check_consistency(view, count=20).items():
+                    status = "OK" if result['compared'] and not result['mismatches'] else "DIVERGENTE"
+                    print(f"{symbol} {names.get(tf, tf)}: {result['compared']} velas comparadas, "
+                          f"{result['mismatches']} divergentes (máx {result['max_diff']:.5f}) {status}")
+        finally:
+            shutdown_mt5()
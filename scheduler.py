@@ -0,0 +1,133 @@
+# === scheduler.py ===
+# Agendador assíncrono do robô: acorda na abertura de cada vela e na cadência de avaliação
+# da janela de análise, sem espera ativa.
+#
+# - Os prazos são calculados no relógio monotônico (imune a ajustes do relógio do sistema);
+#   o relógio de parede só define o alvo (a próxima abertura de vela).
+# - Chamadas bloqueantes (MT5, scraping) rodam em um executor de uma única thread, o que
+#   mantém o event loop livre e serializa o acesso ao terminal.
+# - Atrasos são tratados explicitamente: ticks de avaliação perdidos são pulados (sem rajada
+#   de recuperação) e velas perdidas são contadas e informadas.
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BarScheduler:
+    """
+    Agendador de aberturas de vela e de ticks de avaliação.
+
+    :param period: Duração da vela em segundos (300 = M5)
+    :param late_tolerance: Atraso (s) a partir do qual um despertar é informado como atrasado
+    """
+
+    def __init__(self, period=300, late_tolerance=1.0):
+        self.period = period
+        self.late_tolerance = late_tolerance
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mt5")
+        self.missed_bars = 0
+        self.missed_ticks = 0
+        self.late_wakeups = 0
+        self.last_bar = None  # Abertura (epoch) da última vela aguardada
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    async def run_blocking(self, func, *args):
+        """Executa uma função bloqueante no executor e aguarda o resultado."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def seconds_into_bar(self, wall=None):
+        """Segundos decorridos desde a abertura da vela atual."""
+        wall = time.time() if wall is None else wall
+        return wall % self.period
+
+    async def sleep_until(self, target):
+        """
+        Dorme até o horário de parede `target` (epoch), usando um prazo monotônico.
+
+        Se o relógio de parede for ajustado durante a espera e o alvo ainda não tiver chegado,
+        o restante é recalculado. Retorna o atraso em segundos em relação ao alvo.
+        """
+        deadline = time.monotonic() + (target - time.time())
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+                continue
+            lateness = time.time() - target
+            if lateness < -0.001:
+                # Relógio de parede atrasou durante a espera: aguarda o que falta
+                deadline = time.monotonic() - lateness
+                continue
+            return lateness
+
+    async def wait_for_bar_open(self):
+        """
+        Aguarda a abertura da próxima vela.
+
+        Se a vela seguinte à última aguardada já abriu (processamento mais longo que a vela ou
+        processo suspenso), retorna imediatamente com a vela atual em vez de pular para a
+        próxima, e contabiliza o atraso e as velas que ficaram sem tratamento.
+
+        :return: Horário (epoch) da abertura da vela
+        """
+        now = time.time()
+        current_bar = now // self.period * self.period
+
+        if self.last_bar is not None and current_bar > self.last_bar:
+            target = current_bar
+            lateness = now - (self.last_bar + self.period)
+            missed = int((current_bar - self.last_bar) // self.period) - 1
+        else:
+            target = current_bar + self.period
+            lateness = await self.sleep_until(target)
+            missed = int(lateness // self.period)
+            target += missed * self.period
+
+        if missed:
+            self.missed_bars += missed
+            print(f"⚠️ Agendador atrasado {lateness:.1f}s: {missed} vela(s) perdida(s).")
+        elif lateness >= self.late_tolerance:
+            self.late_wakeups += 1
+            print(f"⚠️ Agendador acordou {lateness:.1f}s após a abertura da vela.")
+
+        self.last_bar = target
+        return target
+
+    def reset(self):
+        """Esquece a última vela aguardada (ex: ao sair do horário de operação)."""
+        self.last_bar = None
+
+    async def ticks(self, duration, cadence):
+        """
+        Gera ticks de avaliação a cada `cadence` segundos durante `duration` segundos.
+
+        Se o processamento de um tick ultrapassar a cadência, os ticks perdidos são pulados
+        (contados em missed_ticks) e o próximo tick segue a grade original, sem acumular deriva.
+        """
+        start = time.monotonic()
+        end = start + duration
+        next_tick = start
+        while True:
+            now = time.monotonic()
+            if now >= end:
+                return
+            if now >= next_tick + cadence:
+                missed = int((now - next_tick) // cadence)
+                self.missed_ticks += missed
+                next_tick += missed * cadence
+            if now < next_tick:
+                await asyncio.sleep(min(next_tick, end) - now)
+                if time.monotonic() >= end:
+                    return
+            yield
+            next_tick += cadence
+
+    def stats(self):
+        return {
+            'missed_bars': self.missed_bars,
+            'missed_ticks': self.missed_ticks,
+            'late_wakeups': self.late_wakeups,
+        }
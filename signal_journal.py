@@ -0,0 +1,344 @@
+# === signal_journal.py ===
+# Diário (journal) dos sinais emitidos e dos resultados, só de acréscimo e seguro contra quedas.
+#
+# Cada evento é uma linha JSON acrescentada ao arquivo:
+#   {"t": "signal", "id": 7, "symbol": "EURUSD", "signal": "buy ⬆️", "entry_price": 1.1, "time": ..., "bar_time": ...,
+#    "timestamp": "10:01:05", "date": "2025-06-02", "hour": 10}
+#   {"t": "result", "id": 7, "exit_price": 1.2, "success": true, "time": ...}
+#   {"t": "expired", "id": 7, "time": ...}   (sinal pendente que não pôde mais ser avaliado)
+#   {"t": "expiry", "symbol": "EURUSD", "bar_time": ..., "bars": 3, "exit_price": 1.2, "success": true, "time": ...}
+#     (resultado do sinal em cada expiração comparada, em velas; success null = vela de saída indisponível)
+#
+# As escritas são agrupadas e o fsync é feito em lote (por quantidade ou por tempo, ou quando
+# o robô chama flush()). Na inicialização o arquivo é relido uma vez para reconstruir os sinais
+# pendentes, os totais e os índices; uma última linha incompleta (queda no meio da escrita) é
+# descartada e o arquivo é truncado na última linha válida.
+#
+# Os totais de acertos/erros são mantidos por símbolo, por hora do dia, por símbolo e hora e por
+# data, de modo que as consultas de taxa de acerto não percorrem o diário. As posições das linhas
+# de cada (símbolo, data) também são indexadas para ler só os registros daquele dia.
+#
+# Ao fechar (e a cada `checkpoint_every` registros), o estado reconstruído é gravado em um
+# checkpoint (<diário>.idx, escrita atômica) junto com o tamanho do diário naquele momento e o
+# hash da última linha antes desse tamanho; na inicialização seguinte só as linhas acrescentadas
+# depois do checkpoint são relidas. Se o diário não for o mesmo do checkpoint (apagado, trocado
+# ou menor) o checkpoint é descartado e o diário é relido inteiro, sem truncar nada.
+
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+
+# Arquivo padrão do diário
+JOURNAL_FILE = os.path.join(os.path.dirname(__file__), "signals_journal.jsonl")
+
+
+class SignalJournal:
+    """
+    Diário de sinais e resultados.
+
+    :param path: Arquivo do diário
+    :param fsync_batch: Quantidade de registros que força um fsync
+    :param fsync_interval: Tempo máximo (s) entre a escrita de um registro e o fsync
+    :param checkpoint_every: Registros entre checkpoints (limita o que é relido após uma queda)
+    """
+
+    def __init__(self, path=JOURNAL_FILE, fsync_batch=16, fsync_interval=1.0, checkpoint_every=1000):
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.checkpoint_every = checkpoint_every
+        self.since_checkpoint = 0
+
+        self.next_id = 1
+        self.pending = {}  # id -> registro do sinal ainda sem resultado
+        self.totals = {'total': 0, 'success': 0, 'failed': 0}
+        self.outcomes = defaultdict(lambda: [0, 0])  # chave -> [acertos, erros]
+        self.offsets = defaultdict(list)  # (símbolo, data) -> posições das linhas dos sinais
+        self.result_offsets = {}  # id -> posição da linha do resultado
+        self.signal_info = {}  # id -> (símbolo, data, hora) dos pendentes, para indexar o resultado
+        self.last_offset = 0  # Posição da última linha do diário (identifica o arquivo no checkpoint)
+
+        self.unsynced = 0
+        self.first_unsynced_at = None
+        self.replay_seconds = 0.0
+
+        self.replay()
+        self.file = open(self.path, "ab")
+
+    # ---- Leitura -----------------------------------------------------------------------
+
+    def _line_hash(self, f, start, end):
+        # Hash da linha entre as posições start e end do diário (None se não for uma linha inteira)
+        if start > 0:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                return None
+        f.seek(start)
+        line = f.read(end - start)
+        if end > start and not line.endswith(b"\n"):
+            return None
+        return hashlib.blake2b(line, digest_size=16).hexdigest()
+
+    def _load_checkpoint(self):
+        # Restaura o estado do checkpoint, se ele corresponder ao início do diário atual
+        index_path = self.path + ".idx"
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            size, last_offset = state["size"], state["last_offset"]
+            with open(self.path, "rb") as f:
+                valid = (0 <= last_offset <= size <= os.path.getsize(self.path)
+                         and self._line_hash(f, last_offset, size) == state["last_hash"])
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError, KeyError, TypeError):
+            valid = False
+        if not valid:
+            # Checkpoint de outro diário (ou corrompido): relê o diário inteiro
+            print("⚠️ Checkpoint do diário de sinais não corresponde ao diário atual; relendo o diário inteiro.")
+            try:
+                os.remove(index_path)
+            except OSError:
+                pass
+            return 0
+        self.next_id = state["next_id"]
+        self.totals = state["totals"]
+        self.pending = {int(rid): record for rid, record in state["pending"].items()}
+        self.signal_info = {int(rid): tuple(info) for rid, info in state["signal_info"].items()}
+        for key, counts in state["outcomes"]:
+            self.outcomes[tuple(key)] = counts
+        for symbol, date, offsets in state["offsets"]:
+            self.offsets[(symbol, date)] = offsets
+        self.result_offsets = {int(rid): offset for rid, offset in state["result_offsets"].items()}
+        self.last_offset = last_offset
+        return size
+
+    def _save_checkpoint(self):
+        size = self.file.tell()
+        with open(self.path, "rb") as f:
+            last_hash = self._line_hash(f, self.last_offset, size)
+        state = {
+            "size": size,
+            "last_offset": self.last_offset,
+            "last_hash": last_hash,
+            "next_id": self.next_id,
+            "totals": self.totals,
+            "pending": self.pending,
+            "signal_info": self.signal_info,
+            "outcomes": [[list(key), counts] for key, counts in self.outcomes.items()],
+            "offsets": [[symbol, date, offsets] for (symbol, date), offsets in self.offsets.items()],
+            "result_offsets": self.result_offsets,
+        }
+        temporary = self.path + ".idx.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temporary, self.path + ".idx")
+        self.since_checkpoint = 0
+
+    def replay(self):
+        """Relê o diário (a partir do checkpoint, se houver) e reconstrói pendentes, totais e índices."""
+        started = time.perf_counter()
+        if not os.path.exists(self.path):
+            # Sem diário, um checkpoint que tenha sobrado não vale mais
+            if os.path.exists(self.path + ".idx"):
+                os.remove(self.path + ".idx")
+            return
+        offset = valid_end = self._load_checkpoint()
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Última linha incompleta: escrita interrompida
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._apply(record, offset)
+                offset += len(line)
+                valid_end = offset
+        if valid_end != os.path.getsize(self.path):
+            print(f"⚠️ Diário de sinais com final incompleto; truncado em {valid_end} bytes.")
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_end)
+        self.replay_seconds = time.perf_counter() - started
+
+    def _apply(self, record, offset):
+        self.last_offset = offset
+        kind = record.get("t")
+        rid = record.get("id")
+        if kind == "signal":
+            date, hour = record["date"], record["hour"]
+            self.pending[rid] = record
+            self.totals['total'] += 1
+            self.offsets[(record["symbol"], date)].append(offset)
+            self.signal_info[rid] = (record["symbol"], date, hour)
+            self.next_id = max(self.next_id, rid + 1)
+        elif kind == "result":
+            self.pending.pop(rid, None)
+            self.result_offsets[rid] = offset
+            column = 0 if record["success"] else 1
+            self.totals['success' if record["success"] else 'failed'] += 1
+            symbol, date, hour = self.signal_info.pop(rid, (None, None, None))
+            for key in (("symbol", symbol), ("hour", hour), ("symbol_hour", symbol, hour), ("date", date), ("all",)):
+                self.outcomes[key][column] += 1
+        elif kind == "expired":
+            self.pending.pop(rid, None)
+            self.signal_info.pop(rid, None)
+        elif kind == "expiry" and record["success"] is not None:
+            self.outcomes[("expiry", record["bars"])][0 if record["success"] else 1] += 1
+
+    # ---- Escrita -----------------------------------------------------------------------
+
+    def _append(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        offset = self.file.seek(0, os.SEEK_END)
+        self.file.write(line)
+        self._apply(record, offset)
+        self.unsynced += 1
+        if self.first_unsynced_at is None:
+            self.first_unsynced_at = time.monotonic()
+        if (self.unsynced >= self.fsync_batch
+                or time.monotonic() - self.first_unsynced_at >= self.fsync_interval):
+            self.flush()
+
+    def record_signal(self, symbol, signal, entry_price, bar_time, timestamp):
+        """
+        Registra um sinal emitido.
+
+        :param bar_time: Abertura (epoch) da vela do sinal
+        :param timestamp: Horário exibido na mensagem (ex: "10:01:05")
+        :return: Id do sinal no diário
+        """
+        rid = self.next_id
+        now = time.time()
+        moment = datetime.fromtimestamp(now)
+        self._append({
+            "t": "signal", "id": rid, "symbol": symbol, "signal": signal,
+            "entry_price": float(entry_price), "time": now, "bar_time": int(bar_time),
+            "timestamp": timestamp, "date": moment.strftime("%Y-%m-%d"), "hour": moment.hour,
+        })
+        return rid
+
+    def record_result(self, rid, exit_price, success):
+        """Registra o resultado de um sinal pendente."""
+        self._append({"t": "result", "id": rid, "exit_price": float(exit_price),
+                      "success": bool(success), "time": time.time()})
+
+    def record_expired(self, rid):
+        """Marca um sinal pendente como expirado (sem resultado possível, ex: após longa parada)."""
+        self._append({"t": "expired", "id": rid, "time": time.time()})
+
+    def record_expiry(self, symbol, bar_time, bars, exit_price, success):
+        """
+        Registra o resultado de um sinal em uma das expirações comparadas.
+
+        :param bars: Expiração em velas
+        :param success: None se a vela de saída não estava disponível
+        """
+        self._append({"t": "expiry", "symbol": symbol, "bar_time": int(bar_time), "bars": int(bars),
+                      "exit_price": None if exit_price is None else float(exit_price),
+                      "success": None if success is None else bool(success), "time": time.time()})
+
+    def flush(self):
+        """Grava os registros pendentes no disco (flush + fsync)."""
+        if not self.unsynced:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.since_checkpoint += self.unsynced
+        self.unsynced = 0
+        self.first_unsynced_at = None
+        if self.since_checkpoint >= self.checkpoint_every:
+            self._save_checkpoint()
+
+    def close(self):
+        self.flush()
+        self._save_checkpoint()
+        self.file.close()
+
+    # ---- Consultas ---------------------------------------------------------------------
+
+    def pending_by_symbol(self):
+        """Sinais pendentes por símbolo (o mais recente de cada símbolo)."""
+        return {record["symbol"]: record for record in sorted(self.pending.values(), key=lambda r: r["id"])}
+
+    def win_rate(self, symbol=None, hour=None, date=None, expiry=None):
+        """
+        Taxa de acerto dos sinais já avaliados, sem percorrer o diário.
+
+        :param symbol: Filtra por símbolo (opcional)
+        :param hour: Filtra pela hora do dia do sinal, 0 a 23 (opcional; combinável com symbol)
+        :param date: Filtra pela data do sinal, "AAAA-MM-DD" (opcional; não combinável)
+        :param expiry: Taxa de uma das expirações comparadas, em velas (opcional; não combinável)
+        :return: Dicionário com 'resolved', 'success', 'failed' e 'win_rate' (None se não houver)
+        """
+        if expiry is not None:
+            key = ("expiry", expiry)
+        elif date is not None:
+            key = ("date", date)
+        elif symbol is not None and hour is not None:
+            key = ("symbol_hour", symbol, hour)
+        elif symbol is not None:
+            key = ("symbol", symbol)
+        elif hour is not None:
+            key = ("hour", hour)
+        else:
+            key = ("all",)
+        success, failed = self.outcomes.get(key, (0, 0))
+        resolved = success + failed
+        return {'resolved': resolved, 'success': success, 'failed': failed,
+                'win_rate': success / resolved if resolved else None}
+
+    def records(self, symbol, date):
+        """
+        Sinais de um símbolo em uma data, com o resultado de cada um (lidos pelas posições indexadas).
+
+        :return: Lista de registros de sinal; os avaliados trazem 'exit_price' e 'success'
+        """
+        self.file.flush()
+        out = []
+        with open(self.path, "rb") as f:
+            for offset in self.offsets.get((symbol, date), []):
+                f.seek(offset)
+                record = json.loads(f.readline())
+                result_offset = self.result_offsets.get(record["id"])
+                if result_offset is not None:
+                    f.seek(result_offset)
+                    result = json.loads(f.readline())
+                    record["exit_price"] = result["exit_price"]
+                    record["success"] = result["success"]
+                out.append(record)
+        return out
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Taxa de acerto dos sinais registrados no diário.")
+    parser.add_argument("--path", default=JOURNAL_FILE)
+    parser.add_argument("--symbol", default=None, help="Mostra só um símbolo")
+    args = parser.parse_args()
+
+    journal = SignalJournal(args.path)
+    print(f"Diário relido em {journal.replay_seconds * 1000:.1f} ms: {journal.totals['total']} sinais, "
+          f"{len(journal.pending)} pendentes.")
+
+    def line(label, stats):
+        rate = f"{stats['win_rate'] * 100:.1f}%" if stats['win_rate'] is not None else "-"
+        print(f"{label:<12} {stats['resolved']:>6} {stats['success']:>6} {stats['failed']:>6} {rate:>7}")
+
+    print(f"{'':<12} {'Aval.':>6} {'✅':>6} {'❌':>6} {'Taxa':>7}")
+    symbols = [args.symbol] if args.symbol else sorted({key[1] for key in journal.outcomes if key[0] == "symbol"})
+    for symbol in symbols:
+        line(symbol, journal.win_rate(symbol=symbol))
+    for hour in range(24):
+        stats = journal.win_rate(symbol=args.symbol, hour=hour)
+        if stats['resolved']:
+            line(f"{hour:02d}h", stats)
+    line("Total", journal.win_rate(symbol=args.symbol))
+    for bars in sorted(key[1] for key in journal.outcomes if key[0] == "expiry"):
+        line(f"Exp. {bars} vela{'s' if bars > 1 else ''}", journal.win_rate(expiry=bars))
+    journal.close()
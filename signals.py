@@ -1,5 +1,12 @@
 # Contém a lógica para avaliar entrada de sinais e verificar se foram bem-sucedidos
 
+import numpy as np
+
+from symbol_registry import get_symbol_info, symbol_arrays, price_points
+
+# Sinais correspondentes às direções usadas nas versões em lote (1 = compra, -1 = venda)
+SIGNAL_BY_DIRECTION = {1: "buy ⬆️", -1: "sell ⬇️"}
+
 def evaluate_entry(rates, support, resistance, symbol, min_distance_pips, retracement_data):
     # Verifica se o par está presente no dicionário de retração. Se não estiver, inicializa.
     if symbol not in retracement_data:
@@ -8,18 +15,21 @@ def evaluate_entry(rates, support, resistance, symbol, min_distance_pips, retrac
     # Recupera se houve retração previamente registrada
     has_retraced = retracement_data[symbol]['has_retraced']
 
-    # Obtém os dados da última vela
-    current = rates[-1]  # Última vela M5
-    open_price = current['open']  # Preço de abertura da vela atual
-    close_price = current['close']  # Preço de fechamento da vela atual
-    time_pos = current['time'] % 300  # Calcula em que segundo da vela M5 estamos (0 a 299)
+    # Níveis ausentes (None ou NaN) nunca geram sinal
+    if support is None or resistance is None or np.isnan(support) or np.isnan(resistance):
+        return None
 
-    # Define o multiplicador de pips com base no par (JPY ou não)
-    pips_multiplier = 0.01 if "JPY" in symbol else 0.0001
+    # Obtém os dados da última vela, com os preços em pontos inteiros (comparações exatas)
+    info = get_symbol_info(symbol)
+    current = rates[-1:]  # Última vela M5
+    open_price = int(price_points(current, 'open', info.point)[0])  # Abertura da vela atual
+    close_price = int(price_points(current, 'close', info.point)[0])  # Fechamento da vela atual
+    time_pos = current['time'][0] % 300  # Calcula em que segundo da vela M5 estamos (0 a 299)
+    support, resistance = int(info.to_points(support)), int(info.to_points(resistance))
 
     # Calcula a distância entre o preço de abertura e o suporte/resistência em pips
-    dist_support = abs(open_price - support) / pips_multiplier
-    dist_resist = abs(resistance - open_price) / pips_multiplier
+    dist_support = abs(open_price - support) / info.pip_points
+    dist_resist = abs(resistance - open_price) / info.pip_points
 
     # Verifica se o preço está entre suporte e resistência E ainda dentro dos primeiros 2 minutos da vela M5
     if support < open_price < resistance and time_pos < 120:
@@ -33,6 +43,39 @@ def evaluate_entry(rates, support, resistance, symbol, min_distance_pips, retrac
     # Caso nenhuma condição seja satisfeita, não retorna sinal
     return None
 
+def evaluate_entry_batch(rates, supports, resistances, symbols, min_distance_pips, has_retraced):
+    """
+    Versão em lote de evaluate_entry: avalia a vela atual de todos os símbolos de uma vez.
+
+    :param rates: Array estruturado 2D (símbolos x velas); a última coluna é a vela atual
+    :param supports: Array de suportes por símbolo (NaN onde não há nível)
+    :param resistances: Array de resistências por símbolo (NaN onde não há nível)
+    :param symbols: Lista de símbolos, na mesma ordem das linhas de rates
+    :param min_distance_pips: Distância mínima em pips da abertura até o suporte/resistência
+    :param has_retraced: Array booleano com o estado de retração de cada símbolo
+    :return: Array int8 de direções (1 = compra, -1 = venda, 0 = sem sinal)
+    """
+    current = rates[:, -1]
+    points, pip_points, _ = symbol_arrays(symbols)
+    open_price = price_points(current, 'open', points)
+    close_price = price_points(current, 'close', points)
+    time_pos = current['time'] % 300
+
+    # Níveis em pontos inteiros; símbolos sem nível (NaN) nunca geram sinal
+    supports = np.asarray(supports, dtype=np.float64)
+    resistances = np.asarray(resistances, dtype=np.float64)
+    has_levels = ~(np.isnan(supports) | np.isnan(resistances))
+    supports = np.rint(np.where(has_levels, supports, 0) / points).astype(np.int64)
+    resistances = np.rint(np.where(has_levels, resistances, 0) / points).astype(np.int64)
+
+    # Distância mínima da abertura até o nível, em pontos
+    min_distance = min_distance_pips * pip_points
+
+    window = has_levels & (supports < open_price) & (open_price < resistances) & (time_pos < 120) & has_retraced
+    buy = window & (close_price == supports) & (np.abs(open_price - supports) >= min_distance)
+    sell = window & ~buy & (close_price == resistances) & (np.abs(resistances - open_price) >= min_distance)
+    return buy.astype(np.int8) - sell.astype(np.int8)
+
 def check_signal_success(signal, current_price, previous_price):
     """
     Verifica se o sinal de compra ou venda foi bem-sucedido.
@@ -0,0 +1,101 @@
+# === state_snapshot.py ===
+# Snapshot do estado em execução, para reiniciar o robô no meio da sessão sem perder a janela
+# de entrada da vela atual.
+#
+# Periodicamente o robô grava em um arquivo binário (pickle, escrita atômica: arquivo
+# temporário + os.replace) o que se perderia ou custaria caro ao reiniciar: as velas dos
+# buffers, os níveis de suporte/resistência armados, o índice de notícias, a retração de cada
+# símbolo e a vela em formação montada pelos ticks, além dos contadores. Na inicialização, se o
+# snapshot for recente o bastante, ele é restaurado: os buffers só buscam no MT5 as velas que
+# faltam e as notícias não são raspadas de novo.
+#
+# O estado que pertence a uma vela (retração, vela dos ticks) só é restaurado se o snapshot for
+# da mesma vela; faixas armadas em uma vela anterior são rearmadas normalmente. Os sinais pendentes e os totais não entram no snapshot:
+# eles já são restaurados pelo diário de sinais (signal_journal.py), que é a fonte oficial.
+
+import os
+import pickle
+import time
+
+from mt5_collector import export_buffers, restore_buffers
+from metrics import metrics
+
+# Versão do formato (snapshots de outra versão são ignorados)
+SNAPSHOT_VERSION = 2
+
+
+# Monta o snapshot do estado atual
+# :param bar_time: Abertura (epoch, relógio local) da vela atual
+# :param triggers: TriggerIndex do robô
+# :param retracement_data: Controle de retração por símbolo
+# :param calendario: CalendarioNoticias
+# :param feed: TickFeed (ou None)
+# :return: Dicionário com o estado
+def capture_state(bar_time, triggers, retracement_data, calendario, feed=None):
+    return {
+        'version': SNAPSHOT_VERSION,
+        'saved_at': time.time(),
+        'bar_time': bar_time,
+        'buffers': export_buffers(),
+        'triggers': triggers.export(),
+        'retracement': retracement_data,
+        'news': (calendario.indice.eventos, calendario.atualizado_em),
+        'tick_feed': feed.state if feed is not None else {},
+        'counters': dict(metrics.counters),
+    }
+
+# Grava o snapshot (escrita atômica)
+# :param path: Arquivo do snapshot
+# :param state: Dicionário retornado por capture_state()
+# :return: Tamanho do arquivo em bytes
+def save_snapshot(path, state):
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = f.tell()
+    os.replace(temporary, path)
+    return size
+
+# Lê o snapshot, se existir, for da versão atual e tiver no máximo `max_age` segundos
+# :return: Dicionário com o estado ou None
+def load_snapshot(path, max_age):
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Snapshot de estado ignorado (arquivo inválido): {e}")
+        return None
+    if not isinstance(state, dict) or state.get('version') != SNAPSHOT_VERSION:
+        return None
+    age = time.time() - state['saved_at']
+    if age > max_age:
+        print(f"Snapshot de estado ignorado: gravado há {age:.0f}s (máximo {max_age}s).")
+        return None
+    return state
+
+# Restaura o estado do snapshot nos componentes do robô
+# :param state: Dicionário retornado por load_snapshot()
+# :param bar_time: Abertura (epoch, relógio local) da vela atual; as velas do MT5 usam o horário do
+#                  servidor, então a comparação é feita só com o bar_time gravado no snapshot
+# :param retracement_data: Controle de retração por símbolo (atualizado no lugar, só se for a mesma vela)
+# :return: Dicionário com o que foi restaurado ('buffers', 'levels', 'news', 'same_bar')
+def restore_state(state, bar_time, triggers, retracement_data, calendario, feed=None):
+    restore_buffers(state['buffers'])
+    same_bar = state['bar_time'] == bar_time
+    triggers.restore(state['triggers'])
+    news = calendario.restaurar(*state['news'])
+    for name, value in state['counters'].items():
+        metrics.inc(name, value)
+    if same_bar:
+        for symbol, saved in state['retracement'].items():
+            if symbol in retracement_data:
+                retracement_data[symbol].update(saved)
+        if feed is not None:
+            feed.state.update(state['tick_feed'])
+    return {
+        'buffers': len(state['buffers']),
+        'levels': len(state['triggers']['levels']),
+        'news': len(state['news'][0]) if news else 0,
+        'same_bar': same_bar,
+    }
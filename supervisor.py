@@ -0,0 +1,260 @@
+# === supervisor.py ===
+# Modo supervisor: divide os símbolos do config.yaml entre vários processos (workers).
+#
+# Cada worker roda o mesmo loop de main.run() só com a sua parte dos símbolos, com a própria
+# conexão com o MT5 (ou o próprio replay), buffers, agendador e índice de gatilhos; um símbolo
+# lento só atrasa os outros símbolos do mesmo worker, e a janela de análise é percorrida em
+# paralelo pelos workers.
+#
+# Os workers não falam com o Telegram nem gravam o diário: sinais, resultados e estatísticas de
+# cada janela vão por uma fila para o coordenador (este processo), que é o único dono do
+# diário, das mensagens, do scraping de notícias (os workers releem o cache a cada vela) e das
+# métricas consolidadas. Se um worker terminar, o coordenador o reinicia com os mesmos
+# símbolos e os sinais pendentes deles.
+
+import asyncio
+import multiprocessing
+import queue
+import signal
+import time
+
+from main import (Reporter, run, symbols, margem_noticias, atualizacao_noticias, dias_noticias, metricas_arquivo,
+                  metricas_porta, reinicio_workers, snapshot_arquivo)
+from signal_journal import SignalJournal
+from investing_news import CalendarioNoticias, get_news_stats
+from metrics import metrics
+from telegram_notifier import flush_telegram_queue, get_telegram_stats
+
+
+# Divide os símbolos entre os workers (intercalados, para equilibrar a quantidade por processo)
+# :param symbols: Lista de símbolos do config.yaml
+# :param workers: Quantidade de processos
+# :return: Lista com os símbolos de cada worker (sem workers vazios)
+def shard_symbols(symbols, workers):
+    shards = [list(symbols[i::workers]) for i in range(max(1, workers))]
+    return [shard for shard in shards if shard]
+
+
+class QueueReporter:
+    """
+    Reporter dos workers: repassa sinais, resultados e estatísticas ao coordenador pela fila
+    (mesma interface de main.Reporter).
+
+    :param index: Número do worker
+    :param events: Fila de eventos do coordenador
+    :param pending: Sinais pendentes dos símbolos do worker, restaurados pelo coordenador
+    """
+
+    def __init__(self, index, events, pending):
+        self.index = index
+        self.events = events
+        self.pending = pending
+
+    def _send(self, kind, *args):
+        self.events.put((kind, self.index, args))
+
+    def restore(self, symbols):
+        return {symbol: dict(self.pending[symbol]) for symbol in symbols if symbol in self.pending}
+
+    def signal(self, symbol, signal, entry_price, bar_time, timestamp):
+        self._send("signal", symbol, signal, entry_price, bar_time, timestamp)
+
+    def result(self, symbol, final_price, success):
+        self._send("result", symbol, final_price, bool(success))
+
+    def expiry(self, symbol, bar_time, bars, final_price, success):
+        self._send("expiry", symbol, bar_time, bars, final_price, None if success is None else bool(success))
+
+    def expired(self, symbol):
+        self._send("expired", symbol)
+
+    def window(self, snapshot):
+        self._send("window", snapshot)
+
+    def flush(self):
+        pass  # O diário é gravado pelo coordenador
+
+    def close(self):
+        pass
+
+
+async def _run_worker(symbols, reporter, stop):
+    # Roda o loop do robô até o coordenador pedir o encerramento (cada worker tem o seu snapshot)
+    snapshot_path = f"{snapshot_arquivo}.worker{reporter.index}" if snapshot_arquivo else ""
+    task = asyncio.ensure_future(run(symbols, reporter, snapshot_path))
+    while not task.done() and not stop.is_set():
+        await asyncio.sleep(0.5)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+def _worker_main(index, symbols, pending, events, stop):
+    # Ctrl+C é tratado pelo coordenador, que pede o encerramento pelo evento `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    print(f"Worker {index} iniciado com {len(symbols)} símbolos: {', '.join(symbols)}")
+    asyncio.run(_run_worker(symbols, QueueReporter(index, events, pending), stop))
+
+
+class Supervisor:
+    """
+    Coordenador dos workers.
+
+    :param symbols: Símbolos do config.yaml
+    :param workers: Quantidade de processos
+    :param restart_delay: Espera (s) antes de reiniciar um worker que terminou
+    """
+
+    def __init__(self, symbols, workers, restart_delay=10):
+        self.symbols = symbols
+        self.shards = shard_symbols(symbols, workers)
+        self.restart_delay = restart_delay
+        self.context = multiprocessing.get_context("spawn")
+        self.events = self.context.Queue()
+        self.stop = self.context.Event()
+        self.processes = {}  # worker -> processo
+        self.died_at = {}  # worker -> momento (monotônico) em que o processo terminou
+        self.stats = {}  # worker -> estatísticas da última janela
+        self.restarts = 0
+        self.reporter = None
+
+    def _start(self, index):
+        shard = self.shards[index]
+        process = self.context.Process(
+            target=_worker_main, name=f"worker-{index}", daemon=True,
+            args=(index, shard, self.reporter.restore(shard), self.events, self.stop))
+        process.start()
+        self.processes[index] = process
+
+    def _check_workers(self):
+        # Reinicia (após restart_delay) os workers que terminaram
+        now = time.monotonic()
+        for index, process in self.processes.items():
+            if process.is_alive():
+                continue
+            if index not in self.died_at:
+                self.died_at[index] = now
+                print(f"⚠️ Worker {index} terminou (código {process.exitcode}); reiniciando em {self.restart_delay}s.")
+            elif now - self.died_at[index] >= self.restart_delay:
+                del self.died_at[index]
+                self.restarts += 1
+                self._start(index)
+
+    def _handle(self, kind, index, args):
+        if kind == "window":
+            self._window(index, *args)
+        else:
+            getattr(self.reporter, kind)(*args)
+
+    def totals(self):
+        """Estatísticas somadas dos workers (latências: o pior worker)."""
+        totals = {}
+        for snapshot in self.stats.values():
+            for key, value in snapshot.items():
+                if key == 'bar_time':
+                    continue
+                if key.endswith("_ms"):
+                    totals[key] = max(totals.get(key, 0.0), value)
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def _window(self, index, snapshot):
+        self.stats[index] = snapshot
+        print(f"Worker {index} ({snapshot['symbols']} símbolos): {snapshot['cycles']} passadas | "
+              f"análise p50/p99 {snapshot.get('analysis_pass_p50_ms', 0):.2f}/{snapshot.get('analysis_pass_p99_ms', 0):.2f} ms | "
+              f"ticks perdidos {snapshot['scheduler_missed_ticks']} | velas perdidas {snapshot['scheduler_missed_bars']}")
+
+        # Consolidado quando todos os workers em execução já informaram a mesma janela
+        running = [i for i, process in self.processes.items() if process.is_alive()]
+        if any(self.stats.get(i, {}).get('bar_time') != snapshot['bar_time'] for i in running):
+            return
+        totals = self.totals()
+        print(f"Total ({len(self.stats)} workers, {totals['symbols']} símbolos): {totals['cycles']} passadas | "
+              f"velas buscadas {totals['buffer_bars_fetched']} | servidas do buffer {totals['buffer_bars_served']} | "
+              f"toques {totals['triggers_touches']} | análise p99 (pior worker) {totals.get('analysis_pass_p99_ms', 0):.2f} ms")
+        telegram_stats = get_telegram_stats()
+        print(f"Telegram: fila {telegram_stats['queue_depth']} | enviadas {telegram_stats['sent']} | falhas {telegram_stats['failed']} | latência p50 {telegram_stats['latency_p50']:.2f}s (máx {telegram_stats['latency_max']:.2f}s)")
+        if metricas_arquivo:
+            metrics.write(metricas_arquivo)
+
+    def run(self):
+        # Diário de sinais: o coordenador é o único processo que grava e envia ao Telegram
+        journal = SignalJournal()
+        self.reporter = Reporter(journal)
+        print(f"Diário de sinais relido em {journal.replay_seconds * 1000:.1f} ms: "
+              f"{journal.totals['total']} sinais, {len(self.reporter.pending)} pendentes.")
+
+        # Notícias: o scraping é feito só aqui; os workers releem o cache gravado
+        calendario = CalendarioNoticias(margem_noticias, atualizacao_noticias, dias=dias_noticias)
+        if not calendario.atualizado_em:
+            calendario.atualizar()
+        calendario.iniciar()
+
+        # Métricas consolidadas: totais, cada worker, Telegram e diário
+        metrics.register_collector("workers", self.totals)
+        for index in range(len(self.shards)):
+            metrics.register_collector(f"worker{index}", lambda index=index: self.stats.get(index, {}))
+        metrics.register_collector("supervisor", lambda: {
+            'workers_running': sum(process.is_alive() for process in self.processes.values()),
+            'restarts': self.restarts})
+        metrics.register_collector("telegram", get_telegram_stats)
+        metrics.register_collector("journal", lambda: journal.totals)
+        metrics.register_collector("news", get_news_stats)
+        if metricas_porta:
+            metrics.serve(metricas_porta)
+            print(f"Métricas em http://127.0.0.1:{metricas_porta}/metrics")
+
+        for index in range(len(self.shards)):
+            self._start(index)
+        print(f"Supervisor iniciado: {len(self.symbols)} símbolos em {len(self.shards)} workers.")
+
+        try:
+            last_check = time.monotonic()
+            while True:
+                # Confere os workers a cada segundo, mesmo com a fila sempre cheia de eventos
+                if time.monotonic() - last_check >= 1.0:
+                    self._check_workers()
+                    last_check = time.monotonic()
+                try:
+                    kind, index, args = self.events.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                self._handle(kind, index, args)
+                if self.events.empty():
+                    self.reporter.flush()  # Um fsync por rajada de eventos
+        finally:
+            # Pede o encerramento e continua recebendo os eventos enquanto os workers saem
+            self.stop.set()
+            deadline = time.monotonic() + 30
+            while any(process.is_alive() for process in self.processes.values()) and time.monotonic() < deadline:
+                try:
+                    self._handle(*self.events.get(timeout=0.5))
+                except queue.Empty:
+                    pass
+            for process in self.processes.values():
+                if process.is_alive():
+                    process.terminate()
+            self.reporter.close()
+            calendario.parar()
+            # Dá um tempo para o worker do Telegram entregar as mensagens pendentes
+            flush_telegram_queue(timeout=10)
+
+
+# Executa o robô em modo supervisor
+# :param workers: Quantidade de processos entre os quais os símbolos são divididos
+def run_supervisor(workers):
+    Supervisor(symbols, workers, reinicio_workers).run()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Executa o robô dividindo os símbolos entre vários processos.")
+    parser.add_argument("--workers", type=int, default=max(2, multiprocessing.cpu_count()))
+    args = parser.parse_args()
+    try:
+        run_supervisor(args.workers)
+    except KeyboardInterrupt:
+        print("Robô encerrado.")
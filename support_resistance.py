@@ -4,6 +4,18 @@
 # - Distância mínima entre os toques (min_distance_between_touches)
 # - Agrupamento por faixa de preço (tolerance_pips)
 # - Validação de que os toques estão em regiões temporais diferentes (min_region_separation)
+#
+# O agrupamento e a validação rodam vetorizados em NumPy sobre as colunas low/high em pontos
+# inteiros (ver symbol_registry): a faixa de tolerância também é um número inteiro de pontos, então
+# o bin de cada preço não depende de arredondamento de float.
+# LevelIndex mantém o mesmo cálculo de forma incremental por símbolo, vela a vela.
+
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+import numpy as np
+
+from symbol_registry import get_symbol_info, symbol_arrays, price_points
 
 def calculate_support_resistance(rates, symbol, min_touches=2, min_distance_between_touches=5, tolerance_pips=2, min_region_separation=10):
     """
@@ -25,69 +37,396 @@ def calculate_support_resistance(rates, symbol, min_touches=2, min_distance_betw
     # Ignora as 6 velas mais recentes (para não pegar níveis influenciados pela ação atual)
     relevant_rates = rates[:-6]
 
-    # Define o multiplicador para conversão de pips para preço real
-    pips_multiplier = 0.01 if "JPY" in symbol else 0.0001
-
-    # Converte tolerância de pips para valor real de preço
-    tolerance = tolerance_pips * pips_multiplier
-
-    # Função auxiliar para agrupar os índices dos candles por faixa de preço
-    def agrupar_por_toques(precos):
-        bins = {}
-        for idx, price in enumerate(precos):
-            # Arredonda o preço para o bin usando a tolerância
-            bin_key = round(price / tolerance) * tolerance
-            if bin_key not in bins:
-                bins[bin_key] = []
-            bins[bin_key].append(idx)  # Salva o índice do candle
-        return bins
-
-    # Função auxiliar que valida se os toques ocorreram em regiões separadas
-    def validar_nivel(indices):
-        """
-        Retorna True se os índices contêm pelo menos dois grupos de toques
-        com separação mínima de min_region_separation velas entre eles.
-        """
-        if len(indices) < min_touches:
-            return False
-
-        # Agrupa os índices com base em distância mínima entre toques
-        grupos = [[indices[0]]]
-        for idx in indices[1:]:
-            if idx - grupos[-1][-1] >= min_distance_between_touches:
-                grupos.append([idx])
-            else:
-                grupos[-1].append(idx)
-
-        # Verifica se há pelo menos dois grupos separados suficientemente
-        if len(grupos) >= 2:
-            for i in range(len(grupos)):
-                for j in range(i + 1, len(grupos)):
-                    if abs(grupos[j][0] - grupos[i][-1]) >= min_region_separation:
-                        return True
-        return False
+    # Converte tolerância de pips para pontos inteiros do símbolo
+    info = get_symbol_info(symbol)
+    tolerance = tolerance_pips * info.pip_points
 
     # === SUPORTE ===
-    lows = [candle['low'] for candle in relevant_rates]
-    low_bins = agrupar_por_toques(lows)
-
-    valid_supports = [
-        price for price, idxs in low_bins.items()
-        if validar_nivel(sorted(idxs))
-    ]
+    valid_supports = _niveis_validos(
+        _pontos(relevant_rates, 'low', info), tolerance,
+        min_touches, min_distance_between_touches, min_region_separation
+    )
 
     # === RESISTÊNCIA ===
-    highs = [candle['high'] for candle in relevant_rates]
-    high_bins = agrupar_por_toques(highs)
-
-    valid_resistances = [
-        price for price, idxs in high_bins.items()
-        if validar_nivel(sorted(idxs))
-    ]
+    valid_resistances = _niveis_validos(
+        _pontos(relevant_rates, 'high', info), tolerance,
+        min_touches, min_distance_between_touches, min_region_separation
+    )
 
     # Se nenhum nível válido foi encontrado
-    if not valid_supports or not valid_resistances:
+    if len(valid_supports) == 0 or len(valid_resistances) == 0:
         return None, None
 
     # Retorna o menor suporte e maior resistência válidos
-    return min(valid_supports), max(valid_resistances)
+    # (o preço do bin é crescente na chave, então basta comparar as chaves inteiras)
+    return (float(info.to_price(round(int(valid_supports.min()) * tolerance))),
+            float(info.to_price(round(int(valid_resistances.max()) * tolerance))))
+
+
+def _pontos(rates, campo, info):
+    """Extrai uma coluna de preços em pontos inteiros (a coluna do buffer, se já convertida)."""
+    if isinstance(rates, np.ndarray):
+        return price_points(rates, campo, info.point)
+    return info.to_points([candle[campo] for candle in rates])
+
+
+def _niveis_validos(precos, tolerance, min_touches, min_distance_between_touches, min_region_separation):
+    """
+    Agrupa os preços por faixa (bin) e retorna as chaves inteiras dos bins validados.
+
+    O preço de um bin é `chave * tolerance`, com `chave = round(preco / tolerance)`.
+
+    :return: Array int64 com as chaves dos bins válidos, em ordem crescente
+    """
+    if len(precos) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    return _bins_validos(price_keys(precos, tolerance), min_touches, min_distance_between_touches, min_region_separation)
+
+
+def _bins_validos(chaves, min_touches, min_distance_between_touches, min_region_separation):
+    """
+    Valida os bins de um vetor de chaves inteiras, onde a posição de cada chave é o índice do candle.
+
+    Dentro de cada bin os índices dos candles são separados em grupos sempre que a distância
+    entre toques consecutivos é >= min_distance_between_touches. O bin é válido se tiver pelo
+    menos min_touches toques e se o primeiro índice do último grupo estiver a pelo menos
+    min_region_separation velas do último índice do primeiro grupo (o par de grupos mais
+    distante entre si).
+
+    :return: Array int64 com as chaves dos bins válidos, em ordem crescente
+    """
+    # Ordenação estável: dentro de cada bin os índices ficam em ordem crescente
+    ordem = np.argsort(chaves, kind="stable")
+    return _validar_bins_ordenados(
+        chaves[ordem], ordem, min_touches, min_distance_between_touches, min_region_separation
+    )
+
+
+def _validar_bins_ordenados(chaves_ordenadas, ordem, min_touches, min_distance_between_touches, min_region_separation):
+    """
+    Núcleo de _bins_validos: recebe as chaves já ordenadas (ordenação estável) e os índices
+    dos candles correspondentes (`ordem`).
+    """
+    # Início de cada bin no vetor ordenado
+    novo_bin = np.empty(len(chaves_ordenadas), dtype=bool)
+    novo_bin[0] = True
+    np.not_equal(chaves_ordenadas[1:], chaves_ordenadas[:-1], out=novo_bin[1:])
+    inicios = np.flatnonzero(novo_bin)
+    toques = np.diff(np.append(inicios, len(chaves_ordenadas)))
+    bin_de = np.cumsum(novo_bin) - 1
+
+    # Quebras de grupo: toques consecutivos do mesmo bin distantes >= min_distance_between_touches
+    quebras = np.flatnonzero(~novo_bin[1:] & (np.diff(ordem) >= min_distance_between_touches))
+    if len(quebras) == 0:
+        return np.empty(0, dtype=np.int64)
+    bin_quebra = bin_de[quebras]
+
+    # Primeira e última quebra de cada bin (as quebras já estão ordenadas por bin)
+    primeira = np.ones(len(quebras), dtype=bool)
+    primeira[1:] = bin_quebra[1:] != bin_quebra[:-1]
+    ultima = np.ones(len(quebras), dtype=bool)
+    ultima[:-1] = primeira[1:]
+
+    bins = bin_quebra[primeira]
+    fim_primeiro_grupo = ordem[quebras[primeira]]
+    inicio_ultimo_grupo = ordem[quebras[ultima] + 1]
+
+    validos = (
+        (toques[bins] >= min_touches)
+        & (inicio_ultimo_grupo - fim_primeiro_grupo >= min_region_separation)
+    )
+    return chaves_ordenadas[inicios[bins[validos]]]
+
+
+def calculate_support_resistance_batch(rates, symbols, min_touches=2, min_distance_between_touches=5, tolerance_pips=2, min_region_separation=10):
+    """
+    Versão em lote de calculate_support_resistance: calcula os níveis de todos os símbolos de uma vez.
+
+    :param rates: Array estruturado 2D (símbolos x velas) com as colunas low/high
+    :param symbols: Lista de símbolos, na mesma ordem das linhas de rates
+    :return: Tupla (suportes, resistências) de arrays float64, com NaN onde não há nível válido
+    """
+    n_symbols = len(symbols)
+    supports = np.full(n_symbols, np.nan)
+    resistances = np.full(n_symbols, np.nan)
+
+    # Proteção contra dados insuficientes
+    if n_symbols == 0 or rates.shape[1] < 73:
+        return supports, resistances
+
+    # Ignora as 6 velas mais recentes (para não pegar níveis influenciados pela ação atual)
+    relevant_rates = rates[:, :-6]
+
+    # Tolerância em pontos por símbolo
+    points, pip_points, scales = symbol_arrays(symbols)
+    tolerance = tolerance_pips * pip_points
+
+    support_keys, resistance_keys, valid = calculate_support_resistance_keys(
+        price_keys(price_points(relevant_rates, 'low', points), tolerance[:, None]),
+        price_keys(price_points(relevant_rates, 'high', points), tolerance[:, None]),
+        min_touches=min_touches,
+        min_distance_between_touches=min_distance_between_touches,
+        min_region_separation=min_region_separation
+    )
+    # Mesma conversão de SymbolInfo.to_price: round(pontos * point, dígitos)
+    for levels, keys in ((supports, support_keys), (resistances, resistance_keys)):
+        level_points = np.rint(keys[valid] * tolerance[valid])
+        levels[valid] = np.rint(level_points * points[valid] * scales[valid]) / scales[valid]
+    return supports, resistances
+
+
+def price_keys(prices, tolerance):
+    """
+    Converte preços em chaves inteiras de bin: `round(preco / tolerance)`.
+
+    Os preços e a tolerância chegam em pontos inteiros (ver symbol_registry), então a divisão é
+    exata e os empates (preço no meio de dois bins) são decididos sempre da mesma forma: np.rint
+    arredonda meio para o par, igual ao round() do Python. O nível do bin é `chave * tolerance`
+    pontos. Como a chave depende só do preço, o histórico pode ser convertido uma única vez e
+    reaproveitado por todas as janelas.
+    """
+    return np.rint(np.asarray(prices, dtype=np.float64) / tolerance).astype(np.int64)
+
+
+def calculate_support_resistance_keys(low_keys, high_keys, min_touches=2, min_distance_between_touches=5, min_region_separation=10):
+    """
+    Núcleo em lote sobre chaves de bin já calculadas (ver price_keys).
+
+    Cada linha é uma janela de velas relevantes (já sem as 6 mais recentes). As linhas são
+    ordenadas separadamente (argsort por linha é bem mais barato que um argsort global) e
+    recebem um deslocamento por linha, formando chaves compostas (linha, bin) que são
+    validadas de uma só vez.
+
+    :param low_keys: Array int64 2D (linhas x velas) com as chaves das mínimas
+    :param high_keys: Array int64 2D (linhas x velas) com as chaves das máximas
+    :return: Tupla (chave do menor suporte, chave da maior resistência, válido) por linha;
+             as chaves só têm significado onde válido é True
+    """
+    n_rows, n_bars = low_keys.shape
+    linha_de = np.arange(n_rows, dtype=np.int64)[:, None]
+
+    def niveis_por_linha(chaves):
+        ordem = np.argsort(chaves, axis=1, kind="stable")
+        chaves_ordenadas = np.take_along_axis(chaves, ordem, axis=1)
+
+        # Chaves compostas: a faixa de cada linha é deslocada para não se misturar com as outras
+        base = chaves_ordenadas[:, :1]
+        largura = int((chaves_ordenadas[:, -1:] - base).max()) + 1
+        compostas = (chaves_ordenadas - base) + linha_de * largura
+        validas = _validar_bins_ordenados(
+            compostas.ravel(), (ordem + linha_de * n_bars).ravel(),
+            min_touches, min_distance_between_touches, min_region_separation
+        )
+        linhas = validas // largura
+        return linhas, validas % largura + base[linhas, 0]
+
+    support_keys = np.zeros(n_rows, dtype=np.int64)
+    resistance_keys = np.zeros(n_rows, dtype=np.int64)
+    has_support = np.zeros(n_rows, dtype=bool)
+    has_resistance = np.zeros(n_rows, dtype=bool)
+    if n_rows == 0 or n_bars == 0:
+        return support_keys, resistance_keys, has_support
+
+    # Menor suporte válido por linha (as chaves válidas vêm em ordem crescente de linha e de bin)
+    linhas, chaves = niveis_por_linha(low_keys)
+    primeira = np.ones(len(linhas), dtype=bool)
+    primeira[1:] = linhas[1:] != linhas[:-1]
+    support_keys[linhas[primeira]] = chaves[primeira]
+    has_support[linhas] = True
+
+    # Maior resistência válida por linha
+    linhas, chaves = niveis_por_linha(high_keys)
+    ultima = np.ones(len(linhas), dtype=bool)
+    ultima[:-1] = linhas[1:] != linhas[:-1]
+    resistance_keys[linhas[ultima]] = chaves[ultima]
+    has_resistance[linhas] = True
+
+    # Assim como na versão individual, só há nível quando suporte e resistência existem
+    return support_keys, resistance_keys, has_support & has_resistance
+
+
+class _LevelSide:
+    # Um lado do índice (mínimas -> suportes, máximas -> resistências): posições dos toques por bin
+    # e as chaves dos bins válidos em ordem crescente
+
+    def __init__(self):
+        self.touches = {}  # chave do bin -> deque com as posições (crescentes) das velas que tocaram o bin
+        self.valid = []  # chaves dos bins válidos, ordenadas
+
+    def clear(self):
+        self.touches.clear()
+        self.valid.clear()
+
+    def add(self, key, position):
+        touches = self.touches.get(key)
+        if touches is None:
+            touches = self.touches[key] = deque()
+        touches.append(position)
+
+    def expire(self, key):
+        touches = self.touches[key]
+        touches.popleft()  # A vela mais antiga da janela é sempre o primeiro toque do seu bin
+        if not touches:
+            del self.touches[key]
+
+    def revalidate(self, key, min_touches, min_distance_between_touches, min_region_separation):
+        # Mesma regra de _validar_bins_ordenados, aplicada só a este bin
+        touches = self.touches.get(key, ())
+        valid = False
+        if len(touches) >= min_touches:
+            positions = list(touches)
+            first = next((j for j in range(1, len(positions))
+                          if positions[j] - positions[j - 1] >= min_distance_between_touches), None)
+            if first is not None:
+                last = next(j for j in range(len(positions) - 1, 0, -1)
+                            if positions[j] - positions[j - 1] >= min_distance_between_touches)
+                valid = positions[last] - positions[first - 1] >= min_region_separation
+        i = bisect_left(self.valid, key)
+        listed = i < len(self.valid) and self.valid[i] == key
+        if valid and not listed:
+            self.valid.insert(i, key)
+        elif listed and not valid:
+            del self.valid[i]
+
+
+class LevelIndex:
+    """
+    Índice incremental dos níveis de suporte/resistência de um símbolo.
+
+    Dá o mesmo resultado de calculate_support_resistance sobre as mesmas velas, mas em vez de
+    reagrupar a janela inteira a cada chamada, guarda os toques de cada bin: quando uma vela
+    entra na janela relevante (as 6 mais recentes continuam ignoradas) e a mais antiga sai, só
+    os bins dessas velas são revalidados. O resultado fica memorizado pelo horário da última
+    vela relevante e pelos parâmetros, então chamadas dentro da mesma vela não custam nada, e
+    janelas de milhares de velas custam o mesmo por vela nova que janelas de 100.
+
+    :param symbol: Par de moedas (ex: EURUSD)
+    """
+
+    def __init__(self, symbol, min_touches=2, min_distance_between_touches=5, tolerance_pips=2, min_region_separation=10):
+        self.symbol = symbol
+        self.params = (min_touches, min_distance_between_touches, tolerance_pips, min_region_separation)
+        self.info = get_symbol_info(symbol)
+        self.tolerance = tolerance_pips * self.info.pip_points  # Em pontos
+        self.bars = deque()  # (time, posição, chave da mínima, chave da máxima) das velas da janela
+        self.supports = _LevelSide()
+        self.resistances = _LevelSide()
+        self.window = 0
+        self.next_position = 0
+        self.last_time = None  # Horário da última vela relevante já incluída
+        self.levels = (np.nan, np.nan)
+        self.rebuilds = 0
+        self.bars_added = 0
+        self.memo_hits = 0
+
+    def _clear(self):
+        self.bars.clear()
+        self.supports.clear()
+        self.resistances.clear()
+        self.last_time = None
+
+    def _add(self, times, low_keys, high_keys, dirty):
+        for bar_time, low_key, high_key in zip(times.tolist(), low_keys.tolist(), high_keys.tolist()):
+            self.bars.append((bar_time, self.next_position, low_key, high_key))
+            self.supports.add(low_key, self.next_position)
+            self.resistances.add(high_key, self.next_position)
+            dirty[0].add(low_key)
+            dirty[1].add(high_key)
+            self.next_position += 1
+        self.bars_added += len(times)
+
+    def update(self, rates):
+        """
+        Atualiza o índice com as velas mais recentes (ex: view do CandleBuffer).
+
+        :param rates: Array estruturado de velas em ordem cronológica; as 6 últimas são ignoradas
+        :return: Tupla (menor suporte, maior resistência) válidos, com NaN se não houver os dois
+        """
+        if len(rates) < 73:
+            self._clear()
+            self.levels = (np.nan, np.nan)
+            return self.levels
+        relevant = rates[:-6]
+        times = relevant['time']
+        last_time = int(times[-1])
+        if last_time == self.last_time and len(relevant) == self.window:
+            self.memo_hits += 1
+            return self.levels
+
+        dirty = (set(), set())
+        new = np.flatnonzero(times > self.last_time) if self.last_time is not None else ()
+        if (self.last_time is None or len(relevant) != self.window or not len(new)
+                or len(new) >= len(relevant) or new[0] != len(relevant) - len(new)):
+            # Primeira carga, janela de outro tamanho ou lacuna maior que a janela: remonta tudo
+            self._clear()
+            self.rebuilds += 1
+            self.window = len(relevant)
+            new = np.arange(len(relevant))
+        else:
+            # As velas que saíram da janela deixam de contar como toques
+            for _ in range(len(new)):
+                _, _, low_key, high_key = self.bars.popleft()
+                self.supports.expire(low_key)
+                self.resistances.expire(high_key)
+                dirty[0].add(low_key)
+                dirty[1].add(high_key)
+
+        added = relevant[new]
+        self._add(added['time'], price_keys(price_points(added, 'low', self.info.point), self.tolerance),
+                  price_keys(price_points(added, 'high', self.info.point), self.tolerance), dirty)
+        self.last_time = last_time
+
+        min_touches, min_distance_between_touches, _, min_region_separation = self.params
+        for side, keys in ((self.supports, dirty[0]), (self.resistances, dirty[1])):
+            for key in keys:
+                side.revalidate(key, min_touches, min_distance_between_touches, min_region_separation)
+
+        if self.supports.valid and self.resistances.valid:
+            self.levels = (self._price(self.supports.valid[0]), self._price(self.resistances.valid[-1]))
+        else:
+            self.levels = (np.nan, np.nan)
+        return self.levels
+
+    def _price(self, key):
+        # Preço do nível de um bin (chave * tolerância, em pontos)
+        return float(self.info.to_price(round(key * self.tolerance)))
+
+    def nearest_support(self, price):
+        """Suporte válido mais próximo abaixo (ou no) preço, em O(log n); None se não houver."""
+        valid = self.supports.valid
+        i = bisect_right(valid, int(self.info.to_points(price)) / self.tolerance) - 1
+        return self._price(valid[i]) if i >= 0 else None
+
+    def nearest_resistance(self, price):
+        """Resistência válida mais próxima acima (ou no) preço, em O(log n); None se não houver."""
+        valid = self.resistances.valid
+        i = bisect_left(valid, int(self.info.to_points(price)) / self.tolerance)
+        return self._price(valid[i]) if i < len(valid) else None
+
+    def stats(self):
+        return {'rebuilds': self.rebuilds, 'bars_added': self.bars_added, 'memo_hits': self.memo_hits}
+
+
+# Índices de níveis por símbolo
+_level_indexes = {}
+
+# Atualiza e retorna o índice de níveis de um símbolo (recriado se os parâmetros mudarem)
+# :param symbol: Par de moedas (ex: EURUSD)
+# :param rates: Velas mais recentes do símbolo (a última em formação), ex: get_buffered_rates(symbol, 5, 100)
+# :return: LevelIndex atualizado; os níveis ficam em .levels (suporte, resistência), com NaN se não houver
+def update_level_index(symbol, rates, min_touches=2, min_distance_between_touches=5, tolerance_pips=2, min_region_separation=10):
+    params = (min_touches, min_distance_between_touches, tolerance_pips, min_region_separation)
+    index = _level_indexes.get(symbol)
+    if index is None or index.params != params:
+        index = _level_indexes[symbol] = LevelIndex(symbol, *params)
+    index.update(rates)
+    return index
+
+# Estatísticas somadas dos índices de níveis: remontagens, velas acrescentadas e chamadas memorizadas
+def get_level_index_stats():
+    totals = {'rebuilds': 0, 'bars_added': 0, 'memo_hits': 0}
+    for index in _level_indexes.values():
+        for key, value in index.stats().items():
+            totals[key] += value
+    return totals
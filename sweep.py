@@ -0,0 +1,228 @@
+# === sweep.py ===
+# Busca de parâmetros da estratégia (grade ou aleatória) sobre o histórico M5.
+#
+# Cada combinação de parâmetros é avaliada com o backtest vetorizado (backtest.py) em um pool
+# de processos. As velas são publicadas uma única vez em memória compartilhada e os workers
+# criam views sobre ela, em vez de receber uma cópia serializada a cada tarefa. Os resultados
+# ficam em cache no disco, com chave = versão das regras + hash dos dados + parâmetros, de modo
+# que uma nova execução só avalia as combinações que ainda não foram calculadas. O histórico
+# vem da mesma fonte configurada do backtest (MT5 ou replay, com o histórico local), e os
+# metadados dos símbolos (dígitos e point) são lidos no processo principal e repassados aos workers.
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtest import RULES_VERSION, run_backtest
+from symbol_registry import get_symbol_info, register_symbol_info
+
+# Valores avaliados para cada parâmetro (mesmos nomes do config.yaml)
+DEFAULT_GRID = {
+    'min_touches': [2, 3, 4],
+    'min_distance_between_touches': [3, 5, 8],
+    'tolerance_pips': [1, 2, 3],
+    'min_region_separation': [5, 10, 20],
+    'min_distance_pips': [2, 3, 5],
+    'min_retracement_percent': [0.1, 0.2, 0.3],
+}
+
+# Rótulos curtos das colunas do ranking
+LABELS = {
+    'min_touches': 'toques',
+    'min_distance_between_touches': 'dist_toques',
+    'tolerance_pips': 'tolerancia',
+    'min_region_separation': 'separacao',
+    'min_distance_pips': 'dist_pips',
+    'min_retracement_percent': 'retracao',
+}
+
+# Diretório padrão do cache de resultados
+CACHE_DIR = os.path.join(os.path.dirname(__file__), ".sweep_cache")
+
+# Velas compartilhadas no processo worker: {símbolo: array} (views sobre a memória compartilhada)
+_worker_history = {}
+_worker_segments = []
+
+
+def grid_combinations(grid):
+    """Todas as combinações da grade, como dicionários de parâmetros."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_combinations(grid, samples, seed=None):
+    """Amostra `samples` combinações distintas da grade (ou todas, se a grade for menor)."""
+    combinations = grid_combinations(grid)
+    if samples >= len(combinations):
+        return combinations
+    return random.Random(seed).sample(combinations, samples)
+
+
+def history_hash(history):
+    """Hash SHA-256 do histórico (símbolos, dtype e bytes das velas), usado na chave do cache."""
+    digest = hashlib.sha256()
+    for symbol in sorted(history):
+        rates = np.ascontiguousarray(history[symbol])
+        digest.update(symbol.encode())
+        digest.update(str(rates.dtype.descr).encode())
+        digest.update(memoryview(rates).cast('B'))
+    return digest.hexdigest()
+
+
+def _cache_path(cache_dir, data_hash, params):
+    key = hashlib.sha256(f"{RULES_VERSION}:{data_hash}{json.dumps(params, sort_keys=True)}".encode()).hexdigest()
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def _load_cached(cache_dir, data_hash, params):
+    try:
+        with open(_cache_path(cache_dir, data_hash, params), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _store_cached(cache_dir, data_hash, result):
+    path = _cache_path(cache_dir, data_hash, result['params'])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)  # Escrita atômica: um cache corrompido nunca é lido pela metade
+
+
+def _share_history(history):
+    """
+    Copia o histórico para blocos de memória compartilhada.
+
+    :return: Tupla (lista de SharedMemory, descritores {símbolo: (nome, tamanho, dtype)})
+    """
+    segments, descriptors = [], {}
+    for symbol, rates in history.items():
+        segment = shared_memory.SharedMemory(create=True, size=max(rates.nbytes, 1))
+        np.ndarray(rates.shape, dtype=rates.dtype, buffer=segment.buf)[:] = rates
+        segments.append(segment)
+        descriptors[symbol] = (segment.name, len(rates), rates.dtype)
+    return segments, descriptors
+
+
+def _init_worker(descriptors, symbol_infos):
+    # Metadados dos símbolos lidos no processo principal (o worker não tem a fonte de dados)
+    for info in symbol_infos:
+        register_symbol_info(info)
+    # Anexa os blocos compartilhados e mantém as referências vivas enquanto o worker existir
+    for symbol, (name, length, dtype) in descriptors.items():
+        segment = shared_memory.SharedMemory(name=name)
+        _worker_segments.append(segment)
+        _worker_history[symbol] = np.ndarray((length,), dtype=dtype, buffer=segment.buf)
+
+
+def evaluate_params(params, history=None):
+    """
+    Executa o backtest de todos os símbolos com um conjunto de parâmetros.
+
+    :param params: Dicionário com os parâmetros de DEFAULT_GRID
+    :param history: Histórico a usar; no worker, o histórico compartilhado
+    :return: Dicionário com 'params', 'signals', 'success' e 'hit_rate'
+    """
+    results = run_backtest(
+        _worker_history if history is None else history,
+        params['min_distance_pips'],
+        params['min_retracement_percent'],
+        min_touches=params['min_touches'],
+        min_distance_between_touches=params['min_distance_between_touches'],
+        tolerance_pips=params['tolerance_pips'],
+        min_region_separation=params['min_region_separation']
+    )
+    signals = sum(len(r['success']) for r in results.values())
+    success = sum(int(r['success'].sum()) for r in results.values())
+    return {
+        'params': params,
+        'signals': signals,
+        'success': success,
+        'hit_rate': success / signals if signals else 0.0,
+    }
+
+
+def run_sweep(history, combinations, workers=None, cache_dir=CACHE_DIR):
+    """
+    Avalia as combinações de parâmetros em paralelo, reaproveitando o cache em disco.
+
+    :param history: Dicionário {símbolo: array de velas M5}
+    :param combinations: Lista de dicionários de parâmetros
+    :param workers: Quantidade de processos (padrão: os.cpu_count())
+    :param cache_dir: Diretório do cache de resultados
+    :return: Lista de resultados ordenada por taxa de acerto e quantidade de sinais
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    data_hash = history_hash(history)
+
+    results, pending = [], []
+    for params in combinations:
+        cached = _load_cached(cache_dir, data_hash, params)
+        if cached is not None:
+            results.append(cached)
+        else:
+            pending.append(params)
+    print(f"{len(results)} combinações no cache, {len(pending)} a avaliar.")
+
+    if pending:
+        segments, descriptors = _share_history(history)
+        symbol_infos = [get_symbol_info(symbol) for symbol in history]
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(descriptors, symbol_infos)) as pool:
+                for result in pool.map(evaluate_params, pending):
+                    _store_cached(cache_dir, data_hash, result)
+                    results.append(result)
+        finally:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+
+    return sorted(results, key=lambda r: (r['hit_rate'], r['signals']), reverse=True)
+
+
+# Imprime a tabela de resultados ordenada
+# :param results: Resultado de run_sweep
+# :param top: Quantidade de linhas exibidas
+# :param min_signals: Ignora combinações com menos sinais que isso
+def print_ranking(results, top=20, min_signals=1):
+    names = list(LABELS)
+    print(" ".join(f"{LABELS[name]:>12}" for name in names) + f"{'Sinais':>9}{'Taxa':>8}")
+    shown = [r for r in results if r['signals'] >= min_signals][:top]
+    for result in shown:
+        values = " ".join(f"{result['params'][name]:>12}" for name in names)
+        print(f"{values}{result['signals']:>9}{result['hit_rate']:>8.1%}")
+
+
+if __name__ == "__main__":
+    from backtest import load_configured_history
+
+    parser = argparse.ArgumentParser(description="Busca de parâmetros da estratégia sobre o histórico M5.")
+    parser.add_argument("--bars", type=int, default=75000, help="Velas M5 por símbolo (padrão: ~1 ano)")
+    parser.add_argument("--random", type=int, default=0, help="Amostra N combinações em vez da grade completa")
+    parser.add_argument("--seed", type=int, default=None, help="Semente da busca aleatória")
+    parser.add_argument("--workers", type=int, default=None, help="Processos do pool (padrão: núcleos da CPU)")
+    parser.add_argument("--top", type=int, default=20, help="Linhas exibidas no ranking")
+    parser.add_argument("--min-signals", type=int, default=30, help="Mínimo de sinais para entrar no ranking")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Diretório do cache de resultados")
+    args = parser.parse_args()
+
+    history = load_configured_history(args.bars)
+    if history is None:
+        raise SystemExit(1)
+
+    if args.random:
+        combinations = random_combinations(DEFAULT_GRID, args.random, args.seed)
+    else:
+        combinations = grid_combinations(DEFAULT_GRID)
+
+    results = run_sweep(history, combinations, workers=args.workers, cache_dir=args.cache_dir)
+    print_ranking(results, top=args.top, min_signals=args.min_signals)
@@ -0,0 +1,170 @@
+# === symbol_registry.py ===
+# Metadados dos símbolos (dígitos, point e tick size) e preços em pontos inteiros.
+#
+# Os metadados vêm uma vez por símbolo da fonte de dados (symbol_info do MT5; no replay, os
+# dígitos são deduzidos das velas gravadas) e os do terminal ficam em cache no disco, então um
+# reinício não consulta o MT5 de novo. Sem a fonte, vale a regra antiga: 3 dígitos nos pares
+# com JPY e 5 nos demais.
+#
+# Um preço em pontos é round(preço / point), um inteiro: os buffers do mt5_collector guardam as
+# colunas open/high/low/close também em pontos (open_points, ...), convertidas uma vez quando as
+# velas entram, e os agrupamentos de suporte/resistência, os toques e as distâncias em pips são
+# calculados sobre esses inteiros, sem o ruído de comparar floats.
+
+import json
+import os
+
+import numpy as np
+
+# Arquivo de cache dos metadados obtidos da fonte de dados
+SYMBOLS_FILE = os.path.join(os.path.dirname(__file__), ".symbols_cache.json")
+
+# Colunas de preço e as colunas correspondentes em pontos nos buffers de velas
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+POINT_FIELDS = tuple(f"{field}_points" for field in PRICE_FIELDS)
+
+
+class SymbolInfo:
+    """
+    Metadados de um símbolo.
+
+    :param digits: Casas decimais da cotação (ex: 5 no EURUSD, 3 no USDJPY)
+    :param point: Menor variação da cotação (ex: 0.00001)
+    :param tick_size: Menor variação negociável (normalmente igual ao point)
+    """
+
+    def __init__(self, symbol, digits, point=None, tick_size=None):
+        self.symbol = symbol
+        self.digits = int(digits)
+        self.point = float(point) if point else 10.0 ** -self.digits
+        self.tick_size = float(tick_size) if tick_size else self.point
+        # Cotações de 5 e 3 dígitos têm um dígito fracionário: 1 pip = 10 pontos
+        self.pip_points = 10 if self.digits in (3, 5) else 1
+        self.pip = round(self.point * self.pip_points, self.digits)
+
+    def to_points(self, prices):
+        """Preço(s) em pontos inteiros (int64)."""
+        return np.rint(np.asarray(prices, dtype=np.float64) / self.point).astype(np.int64)
+
+    def to_price(self, points):
+        """Pontos de volta em preço (points * point, arredondado em `digits` casas)."""
+        return np.round(np.asarray(points) * self.point, self.digits)
+
+    def as_dict(self):
+        return {'digits': self.digits, 'point': self.point, 'tick_size': self.tick_size}
+
+
+# Fonte de dados consultada (ver set_symbol_source), metadados já carregados e cache em disco
+_source = None
+_registry = {}
+_disk = None
+
+
+# Troca a fonte de dados consultada e descarta os metadados já carregados
+# :param source: Instância de data_sources.DataSource (ou None)
+def set_symbol_source(source):
+    global _source
+    _source = source
+    _registry.clear()
+
+# Descarta os metadados carregados (ex: o terminal acabou de conectar e pode responder agora)
+def clear_symbol_registry():
+    _registry.clear()
+
+def _disk_cache(path=SYMBOLS_FILE):
+    global _disk
+    if _disk is None:
+        try:
+            with open(path, encoding="utf-8") as f:
+                _disk = json.load(f)
+        except (OSError, ValueError):
+            _disk = {}
+    return _disk
+
+def _save_disk_cache(path=SYMBOLS_FILE):
+    temporary = path + ".tmp"
+    try:
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(_disk, f, indent=1)
+        os.replace(temporary, path)
+    except OSError as e:
+        print(f"Não foi possível gravar o cache de símbolos: {e}")
+
+def _load(symbol):
+    kind = type(_source).__name__ if _source is not None else None
+    cached = _disk_cache().get(kind, {}).get(symbol) if kind else None
+    if cached is not None:
+        return SymbolInfo(symbol, **cached)
+
+    data = None
+    if _source is not None:
+        try:
+            data = _source.symbol_info(symbol)
+        except Exception as e:
+            print(f"Não foi possível consultar os dados de {symbol}: {e}")
+    if data is None:
+        # Regra antiga, pelo nome do par (não vai para o cache em disco)
+        return SymbolInfo(symbol, 3 if "JPY" in symbol else 5)
+
+    info = SymbolInfo(symbol, **data)
+    if getattr(_source, "persist_symbol_info", False):
+        _disk.setdefault(kind, {})[symbol] = info.as_dict()
+        _save_disk_cache()
+    return info
+
+# Registra metadados já conhecidos (ex: lidos no processo principal e repassados a um worker)
+# :param info: SymbolInfo
+def register_symbol_info(info):
+    _registry[info.symbol] = info
+
+# Metadados de um símbolo (consulta a fonte só na primeira vez)
+# :param symbol: Par de moedas (ex: EURUSD)
+# :return: SymbolInfo
+def get_symbol_info(symbol):
+    info = _registry.get(symbol)
+    if info is None:
+        info = _registry[symbol] = _load(symbol)
+    return info
+
+# Point, pontos por pip e escala (10 ** dígitos) de vários símbolos, como arrays alinhados (versões em lote)
+# :param symbols: Lista de símbolos
+# :return: Tupla (points float64, pip_points int64, escalas float64); preço = round(pontos * point, dígitos),
+#          ou seja, rint(pontos * point * escala) / escala (ver SymbolInfo.to_price)
+def symbol_arrays(symbols):
+    infos = [get_symbol_info(symbol) for symbol in symbols]
+    return (np.array([info.point for info in infos], dtype=np.float64),
+            np.array([info.pip_points for info in infos], dtype=np.int64),
+            np.array([10.0 ** info.digits for info in infos], dtype=np.float64))
+
+# Dígitos de uma série de preços: a menor quantidade de casas decimais que representa todos
+# :param prices: Array de preços (ex: fechamentos gravados)
+# :return: Dígitos (0 a 8) ou None se a série estiver vazia
+def infer_digits(prices):
+    prices = np.asarray(prices, dtype=np.float64)[-1000:]
+    if not len(prices):
+        return None
+    for digits in range(9):
+        scaled = prices * 10.0 ** digits
+        if np.all(np.abs(scaled - np.rint(scaled)) < 1e-3):
+            return digits
+    return 8
+
+# Coluna de preços em pontos: usa a coluna já convertida do buffer, se houver, e senão converte
+# :param rates: Array estruturado de velas (1D ou 2D)
+# :param field: 'open', 'high', 'low' ou 'close'
+# :param point: Point do símbolo (escalar) ou, em 2D, array com o point de cada linha
+# :return: Array int64
+def price_points(rates, field, point):
+    if f"{field}_points" in rates.dtype.names:
+        return rates[f"{field}_points"]
+    point = np.asarray(point, dtype=np.float64)
+    if point.ndim and np.ndim(rates) == 2:
+        point = point[:, None]
+    return np.rint(np.asarray(rates[field], dtype=np.float64) / point).astype(np.int64)
+
+# Dtype dos buffers: o das velas do MT5 mais as colunas de preço em pontos
+# :param dtype: Dtype do array de velas
+def points_dtype(dtype):
+    if POINT_FIELDS[0] in dtype.names:
+        return dtype
+    return np.dtype(dtype.descr + [(name, '<i8') for name in POINT_FIELDS])
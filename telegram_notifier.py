@@ -1,26 +1,222 @@
 # Contém a função responsável por enviar mensagens formatadas ao Telegram
+#
+# O envio é feito por uma fila com um worker em segundo plano: send_telegram_message só
+# enfileira a mensagem (O(1)) e retorna. O worker usa uma sessão HTTP persistente, respeita
+# os limites de envio do Telegram por chat, agrupa rajadas (ex: vários resultados no
+# fechamento da mesma vela) em uma única mensagem e refaz o envio com backoff em caso de falha.
+# Se o Telegram recusar uma mensagem agrupada (erro 4xx, ex: HTML inválido em uma delas), as
+# mensagens são reenviadas uma a uma, para que só a inválida se perca.
+
+import queue
+import threading
+import time
+from collections import deque
+
+# Limite de caracteres de uma mensagem do Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TelegramQueue:
+    """
+    Fila de entrega de mensagens do Telegram com worker em segundo plano.
+
+    :param min_interval: Intervalo mínimo (s) entre mensagens para o mesmo chat (Telegram: ~1/s)
+    :param per_minute: Máximo de mensagens por minuto para o mesmo chat (Telegram: 20/min em grupos)
+    :param coalesce_seconds: Tempo (s) de espera para juntar mensagens que chegam em rajada
+    :param max_retries: Tentativas extras em caso de falha temporária
+    :param backoff: Espera inicial (s) entre tentativas, dobrada a cada nova falha
+    :param timeout: Timeout (s) de cada requisição HTTP
+    """
+
+    def __init__(self, min_interval=1.0, per_minute=20, coalesce_seconds=0.5, max_retries=3, backoff=1.0, timeout=10):
+        self.min_interval = min_interval
+        self.per_minute = per_minute
+        self.coalesce_seconds = coalesce_seconds
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        import requests  # Importado só no primeiro envio: não pesa na inicialização do robô
+
+        self.queue = queue.Queue()
+        self.session = requests.Session()
+        self.history = {}  # Horários (monotônicos) dos últimos envios por chat
+        self.latencies = deque(maxlen=1000)  # Latência de entrega (enfileiramento -> envio) por mensagem
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+
+        self.worker = threading.Thread(target=self._run, name="telegram", daemon=True)
+        self.worker.start()
+
+    def put(self, bot_token, chat_id, message):
+        """Enfileira uma mensagem para envio (não bloqueia)."""
+        self.queue.put((bot_token, chat_id, message, time.monotonic()))
+
+    def flush(self, timeout=None):
+        """Aguarda a entrega das mensagens enfileiradas (ex: antes de encerrar o robô)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            'queue_depth': self.queue.qsize(),
+            'sent': self.sent,
+            'failed': self.failed,
+            'coalesced': self.coalesced,
+            'latency_p50': latencies[len(latencies) // 2] if latencies else 0.0,
+            'latency_max': latencies[-1] if latencies else 0.0,
+        }
+
+    def _wait_for_slot(self, chat):
+        # Respeita o intervalo mínimo e o limite por minuto do chat
+        sent_at = self.history.setdefault(chat, deque(maxlen=self.per_minute))
+        now = time.monotonic()
+        wait = 0.0
+        if sent_at:
+            wait = sent_at[-1] + self.min_interval - now
+        if len(sent_at) == self.per_minute:
+            wait = max(wait, sent_at[0] + 60 - now)
+        return max(wait, 0.0)
+
+    def _run(self):
+        pending = deque()
+        while True:
+            batch = []
+            try:
+                if not pending:
+                    pending.append(self.queue.get())
+
+                bot_token, chat_id, _, _ = pending[0]
+                chat = (bot_token, chat_id)
+
+                # Espera a janela de agrupamento e a vaga no limite do chat; o que chegar nesse
+                # intervalo para o mesmo chat vai junto na mesma mensagem
+                time.sleep(max(self.coalesce_seconds, self._wait_for_slot(chat)))
+                while True:
+                    try:
+                        pending.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                length = 0
+                for item in list(pending):
+                    if (item[0], item[1]) != chat:
+                        continue
+                    extra = len(item[2]) + (2 if batch else 0)
+                    if batch and length + extra > MAX_MESSAGE_LENGTH:
+                        break
+                    batch.append(item)
+                    length += extra
+                    pending.remove(item)
+
+                self._deliver(bot_token, chat_id, batch)
+            except Exception as e:
+                # Um erro inesperado não pode derrubar o worker (a fila ficaria parada para sempre)
+                print(f"Erro inesperado no envio ao Telegram: {e}")
+                self.failed += len(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _deliver(self, bot_token, chat_id, batch):
+        chat = (bot_token, chat_id)
+        text = "\n\n".join(item[2] for item in batch)
+        status = self._post(bot_token, chat_id, text)
+        self.history[chat].append(time.monotonic())
+        if status == 200:
+            self.sent += 1
+            self.coalesced += len(batch) - 1
+            now = time.monotonic()
+            self.latencies.extend(now - item[3] for item in batch)
+        elif status is not None and len(batch) > 1:
+            # Mensagem agrupada recusada: reenvia uma a uma, para perder só a que foi recusada
+            for item in batch:
+                time.sleep(self._wait_for_slot(chat))
+                self._deliver(bot_token, chat_id, [item])
+        else:
+            self.failed += len(batch)
+
+    def _post(self, bot_token, chat_id, message):
+        """
+        Envia uma mensagem, com novas tentativas nas falhas temporárias.
+
+        :return: 200 se foi entregue, o código do erro se o Telegram recusou a mensagem (4xx) ou
+                 None se as tentativas acabaram (rede, 5xx ou limite de envio)
+        """
+        import requests  # Já carregado pelo __init__
+
+        # Monta a URL da API de envio de mensagem do Telegram
+        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+
+        # Cria o payload com os dados da mensagem
+        payload = {
+            "chat_id": chat_id,         # ID do destino da mensagem
+            "text": message,           # Conteúdo da mensagem
+            "parse_mode": "HTML"      # Formatação do conteúdo (HTML permite tags como <b>, <code>, etc)
+        }
+
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                # Envia a requisição POST para a API do Telegram
+                response = self.session.post(url, data=payload, timeout=self.timeout)
+                if response.status_code == 200:
+                    return 200
+                if response.status_code == 429:
+                    # Limite excedido: o Telegram informa quanto tempo esperar
+                    try:
+                        retry_after = float(response.json().get("parameters", {}).get("retry_after", delay))
+                    except (ValueError, TypeError, AttributeError):
+                        retry_after = delay
+                    time.sleep(max(retry_after, 0.0))
+                    continue
+                if response.status_code < 500:
+                    # Erro permanente (token, chat ou HTML inválido): não adianta repetir
+                    print(f"Falha ao enviar mensagem: {response.text}")
+                    return response.status_code
+                print(f"Falha temporária ao enviar mensagem ({response.status_code}), tentativa {attempt + 1}.")
+            except requests.RequestException as e:
+                # Captura e imprime qualquer erro de rede durante a tentativa de envio
+                print(f"Erro ao enviar mensagem para o Telegram (tentativa {attempt + 1}): {e}")
+            time.sleep(delay)
+            delay *= 2
+        return None
+
+
+# Fila global, criada no primeiro envio
+_queue = None
+_queue_lock = threading.Lock()
+
+def _get_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = TelegramQueue()
+        return _queue
 
-import requests
 # Envia uma mensagem de texto para um chat do Telegram usando o token do bot
+# (enfileira e retorna imediatamente; a entrega é feita pelo worker da fila)
 # :param bot_token: Token do bot fornecido pelo BotFather
 # :param chat_id: ID do chat (grupo ou privado) onde a mensagem será enviada
 # :param message: Texto formatado da mensagem (em HTML)
 def send_telegram_message(bot_token, chat_id, message):
-    # Monta a URL da API de envio de mensagem do Telegram
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-
-    # Cria o payload com os dados da mensagem
-    payload = {
-        "chat_id": chat_id,         # ID do destino da mensagem
-        "text": message,           # Conteúdo da mensagem
-        "parse_mode": "HTML"      # Formatação do conteúdo (HTML permite tags como <b>, <code>, etc)
-    }
-    try:
-        # Envia a requisição POST para a API do Telegram
-        response = requests.post(url, data=payload)
-        # Se o status da resposta não for 200 (OK), imprime erro
-        if response.status_code != 200:
-            print(f"Falha ao enviar mensagem: {response.text}")
-    except Exception as e:
-        # Captura e imprime qualquer exceção durante a tentativa de envio
-        print(f"Erro ao enviar mensagem para o Telegram: {e}")
\ No newline at end of file
+    _get_queue().put(bot_token, chat_id, message)
+
+# Aguarda a entrega das mensagens pendentes
+# :param timeout: Tempo máximo de espera em segundos (None = sem limite)
+# :return: True se a fila foi esvaziada
+def flush_telegram_queue(timeout=None):
+    return _queue.flush(timeout) if _queue is not None else True
+
+# Estatísticas da fila: profundidade, mensagens enviadas/falhas/agrupadas e latência de entrega
+# :return: Dicionário com as estatísticas (zerado se nada foi enviado ainda)
+def get_telegram_stats():
+    if _queue is None:
+        return {'queue_depth': 0, 'sent': 0, 'failed': 0, 'coalesced': 0, 'latency_p50': 0.0, 'latency_max': 0.0}
+    return _queue.stats()
@@ -0,0 +1,116 @@
+# Histórico local de velas: acréscimo interrompido, fatias por horário e preenchimento de lacunas
+
+import os
+
+import numpy as np
+import pytest
+
+import mt5_collector
+from benchmark import synthetic_rates
+from candle_store import COLUMNS, CandleStore
+from data_sources import DataSource, MT5DataSource
+
+
+class _Fonte(DataSource):
+    # Fonte com as velas em memória; a última de `rates[:now]` é a vela em formação
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self.now = len(rates)
+
+    def _copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        end = self.now - start_pos
+        return self.rates[max(0, end - count):end]
+
+    def _copy_ticks_from(self, symbol, date_from, count):
+        return None
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CandleStore(str(tmp_path), durable=False)
+    yield store
+    store.close()
+
+
+def _iguais(rates, expected):
+    for name, _ in COLUMNS:
+        np.testing.assert_array_equal(rates[name], expected[name])
+
+
+def test_bytes_alem_do_confirmado_sao_ignorados_e_descartados(tmp_path, store):
+    rates = synthetic_rates(300, "EURUSD", 1)
+    assert store.append("EURUSD", 5, rates[:200]) == 200
+    store.close()
+
+    # Queda no meio de um acréscimo: colunas com bytes a mais, meta.json ainda com 200 velas
+    directory = os.path.join(str(tmp_path), "EURUSD_5")
+    for name, dtype in COLUMNS:
+        with open(os.path.join(directory, f"{name}.bin"), "ab") as f:
+            f.write(np.ascontiguousarray(rates[200:237][name], dtype=dtype).tobytes()[:-3])
+
+    reopened = CandleStore(str(tmp_path), durable=False)
+    assert reopened.length("EURUSD", 5) == 200
+    assert reopened.last_time("EURUSD", 5) == int(rates['time'][199])
+    _iguais(reopened.read_rates("EURUSD", 5), rates[:200])
+    assert len(reopened.columns("EURUSD", 5)['close']) == 200
+
+    # O próximo acréscimo trunca os bytes não confirmados antes de gravar
+    assert reopened.append("EURUSD", 5, rates[150:260]) == 60
+    for name, dtype in COLUMNS:
+        assert os.path.getsize(os.path.join(directory, f"{name}.bin")) == 260 * np.dtype(dtype).itemsize
+    _iguais(reopened.read_rates("EURUSD", 5), rates[:260])
+    reopened.close()
+
+
+def test_colunas_por_intervalo_de_horario(store):
+    rates = synthetic_rates(500, "EURUSD", 2)
+    store.append("EURUSD", 5, rates)
+    times = rates['time']
+
+    cases = [(None, None, 0, 500), (int(times[100]), None, 100, 500), (None, int(times[400]), 0, 400),
+             (int(times[100]), int(times[400]), 100, 400),
+             (int(times[100]) + 1, int(times[400]) - 1, 101, 400),  # Entre velas
+             (int(times[0]) - 10_000, int(times[-1]) + 10_000, 0, 500),
+             (int(times[300]), int(times[300]), 300, 300), (int(times[-1]) + 300, None, 500, 500)]
+    for start, end, first, last in cases:
+        columns = store.columns("EURUSD", 5, start, end)
+        for name, _ in COLUMNS:
+            np.testing.assert_array_equal(columns[name], rates[name][first:last])
+    assert isinstance(store.columns("EURUSD", 5)['close'], np.memmap)  # View do arquivo, sem cópia
+
+    _iguais(store.read_rates("EURUSD", 5, int(times[100]), int(times[400]), count=50), rates[350:400])
+    assert len(store.columns("GBPUSD", 5)['time']) == 0  # Série vazia
+
+
+@pytest.fixture
+def coletor(store):
+    mt5_collector.set_candle_store(store)
+    yield store
+    mt5_collector.set_candle_store(None)
+    mt5_collector.set_data_source(MT5DataSource())
+
+
+def test_preenche_lacunas_pela_fonte(coletor, capsys):
+    rates = synthetic_rates(400, "EURUSD", 3)
+    source = _Fonte(rates)
+    mt5_collector.set_data_source(source)
+
+    # Série vazia: busca seed_bars velas fechadas (a vela em formação não entra)
+    source.now = 101
+    assert mt5_collector.fill_gaps("EURUSD", 5, seed_bars=60) == 60
+    _iguais(coletor.read_rates("EURUSD", 5), rates[40:100])
+
+    # Robô parado 20 velas: busca exatamente as que faltam
+    source.now = 121
+    assert mt5_collector.fill_gaps("EURUSD", 5) == 20
+    assert mt5_collector.fill_gaps("EURUSD", 5) == 0
+    _iguais(coletor.read_rates("EURUSD", 5), rates[40:120])
+
+    # Lacuna maior que max_bars: grava as mais recentes e avisa da lacuna que fica no histórico
+    capsys.readouterr()
+    source.now = 301
+    assert mt5_collector.fill_gaps("EURUSD", 5, max_bars=50) == 50
+    assert "lacuna" in capsys.readouterr().out
+    stored = coletor.read_rates("EURUSD", 5)
+    _iguais(stored, np.concatenate([rates[40:120], rates[250:300]]))
@@ -0,0 +1,316 @@
+# Equivalência entre os caminhos que calculam as mesmas regras: referência em loop, versão
+# vetorizada, versão em lote (vários símbolos), índice incremental, estado de lateralização
+# vela a vela, máscaras sobre a série inteira e backtest. Se um deles mudar sozinho, estes
+# testes quebram. As velas vêm de benchmark.synthetic_rates (determinísticas pela semente).
+
+import numpy as np
+import pytest
+
+from benchmark import synthetic_rates
+from backtest import LOOKBACK, backtest_symbol
+from batch_evaluation import update_retracement_batch
+from lateralization import RollingLateralization, is_lateralization, is_lateralization_batch
+from patterns import (check_previous_wicks, check_retracement, is_candle_stretched, previous_wicks_mask,
+                      retracement_mask, stretched_mask)
+from resampling import TIMEFRAME_H1, TIMEFRAME_M15, TIMEFRAME_M30, MultiTimeframeView
+from signals import check_signal_success, evaluate_entry, evaluate_entry_batch
+from support_resistance import LevelIndex, calculate_support_resistance, calculate_support_resistance_batch
+from symbol_registry import get_symbol_info, set_symbol_source
+
+SYMBOLS = ["EURUSD", "USDJPY"]
+
+
+@pytest.fixture(autouse=True)
+def _sem_fonte_de_dados():
+    # Metadados pela regra padrão (5 dígitos, 3 nos pares com JPY), como nas velas sintéticas
+    set_symbol_source(None)
+    yield
+    set_symbol_source(None)
+
+
+def _parametros_aleatorios(rng):
+    # Faixas largas o bastante para cobrir janelas com e sem nível válido
+    return dict(min_touches=int(rng.integers(1, 8)), min_distance_between_touches=int(rng.integers(1, 7)),
+                tolerance_pips=int(rng.choice([1, 2, 3])), min_region_separation=int(rng.integers(0, 60)))
+
+
+def _sr_referencia(rates, symbol, min_touches=2, min_distance_between_touches=5, tolerance_pips=2, min_region_separation=10):
+    # Algoritmo original (dicionário de bins e laço O(g²) entre os grupos), com os preços em pontos
+    if len(rates) < 73:
+        return None, None
+    info = get_symbol_info(symbol)
+    tolerance = tolerance_pips * info.pip_points
+
+    def agrupar_por_toques(precos):
+        bins = {}
+        for idx, price in enumerate(precos):
+            bins.setdefault(round(int(price) / tolerance), []).append(idx)
+        return bins
+
+    def validar_nivel(indices):
+        if len(indices) < min_touches:
+            return False
+        grupos = [[indices[0]]]
+        for idx in indices[1:]:
+            if idx - grupos[-1][-1] >= min_distance_between_touches:
+                grupos.append([idx])
+            else:
+                grupos[-1].append(idx)
+        return any(abs(grupos[j][0] - grupos[i][-1]) >= min_region_separation
+                   for i in range(len(grupos)) for j in range(i + 1, len(grupos)))
+
+    relevant = rates[:-6]
+    supports = [key for key, idxs in agrupar_por_toques(info.to_points(relevant['low'])).items() if validar_nivel(idxs)]
+    resistances = [key for key, idxs in agrupar_por_toques(info.to_points(relevant['high'])).items() if validar_nivel(idxs)]
+    if not supports or not resistances:
+        return None, None
+    return (float(info.to_price(round(min(supports) * tolerance))),
+            float(info.to_price(round(max(resistances) * tolerance))))
+
+
+def _sr_original(rates, symbol, min_touches=2, min_distance_between_touches=5, tolerance_pips=2, min_region_separation=10):
+    # Cópia da versão original em float (chave do bin = round(preço / tolerância) × tolerância)
+    if len(rates) < 73:
+        return None, None
+    relevant_rates = rates[:-6]
+    pips_multiplier = 0.01 if "JPY" in symbol else 0.0001
+    tolerance = tolerance_pips * pips_multiplier
+
+    def agrupar_por_toques(precos):
+        bins = {}
+        for idx, price in enumerate(precos):
+            bin_key = round(price / tolerance) * tolerance
+            if bin_key not in bins:
+                bins[bin_key] = []
+            bins[bin_key].append(idx)
+        return bins
+
+    def validar_nivel(indices):
+        if len(indices) < min_touches:
+            return False
+        grupos = [[indices[0]]]
+        for idx in indices[1:]:
+            if idx - grupos[-1][-1] >= min_distance_between_touches:
+                grupos.append([idx])
+            else:
+                grupos[-1].append(idx)
+        if len(grupos) >= 2:
+            for i in range(len(grupos)):
+                for j in range(i + 1, len(grupos)):
+                    if abs(grupos[j][0] - grupos[i][-1]) >= min_region_separation:
+                        return True
+        return False
+
+    lows = [candle['low'] for candle in relevant_rates]
+    valid_supports = [price for price, idxs in agrupar_por_toques(lows).items() if validar_nivel(sorted(idxs))]
+    highs = [candle['high'] for candle in relevant_rates]
+    valid_resistances = [price for price, idxs in agrupar_por_toques(highs).items() if validar_nivel(sorted(idxs))]
+    if not valid_supports or not valid_resistances:
+        return None, None
+    return min(valid_supports), max(valid_resistances)
+
+
+def _sem_empates(rates, symbol, tolerance_pips):
+    # Move 1 ponto os preços exatamente na metade da tolerância: só nesses empates a versão em
+    # pontos (meio para o par, exato) e a original em float (erro de arredondamento) podem divergir
+    info = get_symbol_info(symbol)
+    tolerance = tolerance_pips * info.pip_points
+    rates = rates.copy()
+    for field in ('low', 'high'):
+        points = info.to_points(rates[field])
+        tie = 2 * (points % tolerance) == tolerance
+        rates[field] = info.to_price(points + tie)
+    return rates
+
+
+@pytest.mark.parametrize("symbol", SYMBOLS)
+def test_suporte_resistencia_igual_a_versao_original(symbol):
+    rng = np.random.default_rng(12)
+    rates = synthetic_rates(3000, symbol, 13)
+    digits = get_symbol_info(symbol).digits
+    found = 0
+    for _ in range(400):
+        end = int(rng.integers(100, len(rates)))
+        params = _parametros_aleatorios(rng)
+        window = _sem_empates(rates[end - int(rng.integers(73, 100)):end], symbol, params['tolerance_pips'])
+        expected = _sr_original(window, symbol, **params)
+        if expected[0] is not None:
+            expected = tuple(round(float(level), digits) for level in expected)
+            found += 1
+        assert calculate_support_resistance(window, symbol, **params) == expected
+    assert found
+
+
+@pytest.mark.parametrize("symbol", SYMBOLS)
+def test_suporte_resistencia_igual_a_referencia(symbol):
+    rng = np.random.default_rng(2)
+    rates = synthetic_rates(3000, symbol, 11)
+    for _ in range(400):
+        end = int(rng.integers(100, len(rates)))
+        window = rates[end - int(rng.integers(73, 100)):end]
+        params = _parametros_aleatorios(rng)
+        assert calculate_support_resistance(window, symbol, **params) == _sr_referencia(window, symbol, **params)
+
+
+def test_suporte_resistencia_em_lote_igual_ao_escalar():
+    rng = np.random.default_rng(3)
+    symbols = [SYMBOLS[i % 2] for i in range(30)]
+    for trial in range(10):
+        stacked = np.stack([synthetic_rates(100, symbol, trial * 100 + i) for i, symbol in enumerate(symbols)])
+        params = _parametros_aleatorios(rng)
+        supports, resistances = calculate_support_resistance_batch(stacked, symbols, **params)
+        for i, symbol in enumerate(symbols):
+            support, resistance = calculate_support_resistance(stacked[i], symbol, **params)
+            if support is None:
+                assert np.isnan(supports[i]) and np.isnan(resistances[i])
+            else:
+                assert (support, resistance) == (supports[i], resistances[i])
+
+
+@pytest.mark.parametrize("symbol", SYMBOLS)
+@pytest.mark.parametrize("params", [(2, 5, 2, 10), (3, 4, 1, 20), (2, 3, 3, 5)])
+def test_indice_de_niveis_igual_ao_calculo_completo(symbol, params):
+    # Avança vela a vela, com saltos (lacunas), e repete chamadas na mesma vela (memo)
+    rng = np.random.default_rng(4)
+    rates = synthetic_rates(2500, symbol, 5)
+    index = LevelIndex(symbol, *params)
+    end = 100
+    while end <= len(rates):
+        window = rates[end - 100:end]
+        levels = index.update(window)
+        assert index.update(window) == levels
+        support, resistance = calculate_support_resistance(window, symbol, *params)
+        expected = (np.nan, np.nan) if support is None else (support, resistance)
+        np.testing.assert_array_equal(levels, expected)
+        end += 1 if rng.random() < 0.9 else int(rng.integers(2, 150))
+
+
+@pytest.mark.parametrize("symbol", SYMBOLS)
+def test_lateralizacao_incremental_igual_a_funcao(symbol):
+    rng = np.random.default_rng(5)
+    rates = synthetic_rates(2000, symbol, 6)
+    pip = get_symbol_info(symbol).pip
+    state = RollingLateralization()
+    end = 1
+    while end <= len(rates):
+        window = rates[max(0, end - 100):end].copy()
+        for _ in range(2):  # Vela em formação mudando entre as chamadas
+            window[-1]['close'] = window[-1]['open'] + rng.normal() * pip
+            state.update(window)
+            if len(window) < 36:
+                assert not state.is_lateral()
+            else:
+                assert state.is_lateral() == is_lateralization(window)
+                assert state.is_lateral() == bool(is_lateralization_batch(window[None])[0])
+        end += 1 if rng.random() < 0.9 else int(rng.integers(2, 80))
+
+
+@pytest.mark.parametrize("symbol", SYMBOLS)
+def test_mascaras_iguais_as_funcoes_por_vela(symbol):
+    rng = np.random.default_rng(6)
+    rates = synthetic_rates(1500, symbol, 7)
+    # Velas sem corpo e sem amplitude
+    k = rng.choice(len(rates), len(rates) // 10)
+    rates['close'][k] = rates['open'][k]
+    k = rng.choice(len(rates), len(rates) // 20)
+    rates['high'][k] = rates['low'][k] = rates['open'][k] = rates['close'][k]
+    o, h, l, c = rates['open'], rates['high'], rates['low'], rates['close']
+
+    for min_percent in (0.2, 0.5):
+        mask = retracement_mask(o, h, l, c, min_percent)
+        assert [bool(m) for m in mask] == [check_retracement(candle, min_percent) for candle in rates]
+    assert [bool(m) for m in stretched_mask(o, h, l, c)] == [is_candle_stretched(candle) for candle in rates]
+
+    for direction in ('buy', 'sell'):
+        mask = previous_wicks_mask(o, h, l, c, direction)
+        assert not mask[:2].any()
+        assert [bool(m) for m in mask[2:]] == [check_previous_wicks(rates[:i + 1], direction) for i in range(2, len(rates))]
+    directions = rng.integers(-1, 2, len(rates))
+    mask = previous_wicks_mask(o, h, l, c, directions)
+    names = {1: 'buy', -1: 'sell', 0: None}
+    assert [bool(m) for m in mask[2:]] == [check_previous_wicks(rates[:i + 1], names[directions[i]])
+                                           for i in range(2, len(rates))]
+
+
+def test_entrada_em_lote_igual_a_escalar():
+    rng = np.random.default_rng(8)
+    symbols = [SYMBOLS[i % 2] for i in range(40)]
+    stacked = np.stack([synthetic_rates(100, symbol, 200 + i) for i, symbol in enumerate(symbols)])
+    supports, resistances = calculate_support_resistance_batch(stacked, symbols)
+    has_retraced = rng.random(len(symbols)) < 0.8
+
+    # Força toques no suporte/resistência (e aberturas dentro da faixa) em parte dos símbolos
+    current = stacked[:, -1]
+    current['time'] -= current['time'] % 300 - rng.integers(0, 300, len(symbols))
+    for i in np.flatnonzero(~np.isnan(supports)):
+        choice = rng.integers(0, 3)
+        if choice == 0:
+            current['close'][i] = supports[i]
+        elif choice == 1:
+            current['close'][i] = resistances[i]
+
+    for min_distance_pips in (0, 3, 10):
+        directions = evaluate_entry_batch(stacked, supports, resistances, symbols, min_distance_pips, has_retraced)
+        for i, symbol in enumerate(symbols):
+            retracement = {symbol: {'has_retraced': bool(has_retraced[i]), 'body_size': 0}}
+            support = None if np.isnan(supports[i]) else supports[i]
+            resistance = None if np.isnan(resistances[i]) else resistances[i]
+            expected = evaluate_entry(stacked[i], support, resistance, symbol, min_distance_pips, retracement)
+            assert {1: "buy ⬆️", -1: "sell ⬇️", 0: None}[int(directions[i])] == expected
+
+
+def _backtest_referencia(rates, symbol, min_distance_pips, min_retr_pct, expiry):
+    # O backtest vela a vela com as funções do robô ao vivo: a cada vela, os níveis, a
+    # lateralização e a retração saem da janela; o toque é o fechamento da vela atual no nível
+    # (quando o nível está entre a mínima e a máxima), avaliado por evaluate_entry
+    view = MultiTimeframeView(symbol)
+    out = []
+    for t in range(LOOKBACK - 1, len(rates) - (expiry - 1)):
+        window = rates[t - LOOKBACK + 1:t + 1]
+        view.update(window)
+        current = window[-1]
+        support, resistance = calculate_support_resistance(window, symbol)
+        if support is None or not is_lateralization(window[-36:]):
+            continue
+        has_retraced, body_size = update_retracement_batch(window[None], np.zeros(1, bool), min_retr_pct)
+        retracement = {symbol: {'has_retraced': bool(has_retraced[0]), 'body_size': body_size[0]}}
+
+        signal = None
+        for level in (support, resistance):
+            if current['low'] <= level <= current['high']:
+                touched = window.copy()
+                touched[-1]['close'] = level
+                signal = evaluate_entry(touched, support, resistance, symbol, min_distance_pips, retracement)
+                if signal is not None:
+                    break
+        if signal is None or not check_previous_wicks(window, 'buy' if signal == "buy ⬆️" else 'sell'):
+            continue
+
+        # Velas esticadas no M15/M30/H1 conforme o minuto da vela (mesmas faixas de main.py)
+        minute = (int(current['time']) // 60) % 60
+        stretched = True
+        for timeframe, active in ((TIMEFRAME_M15, minute % 15 >= 10), (TIMEFRAME_M30, minute % 30 >= 20),
+                                  (TIMEFRAME_H1, minute >= 40)):
+            candle = view.previous(timeframe)
+            if active and (candle is None or not is_candle_stretched(candle)):
+                stretched = False
+                break
+        if not stretched:
+            continue
+
+        entry = support if signal == "buy ⬆️" else resistance
+        exit_price = float(rates['close'][t + expiry - 1])
+        out.append((int(current['time']), 1 if signal == "buy ⬆️" else -1, entry, exit_price,
+                    check_signal_success(signal, exit_price, entry)))
+    return out
+
+
+@pytest.mark.parametrize("symbol, seed", [("EURUSD", 1), ("USDJPY", 2)])
+@pytest.mark.parametrize("expiry", [1, 3])
+def test_backtest_igual_ao_loop_por_vela(symbol, seed, expiry):
+    rates = synthetic_rates(4000, symbol, seed)
+    result = backtest_symbol(rates, symbol, 0, 0.2, expiry_bars=expiry)
+    signals = list(zip(result['time'].tolist(), result['direction'].tolist(), result['entry_price'].tolist(),
+                       result['exit_price'].tolist(), result['success'].tolist()))
+    assert signals
+    assert signals == _backtest_referencia(rates, symbol, 0, 0.2, expiry)
@@ -0,0 +1,91 @@
+# Índice de notícias por moeda contra a varredura linear original sobre os mesmos eventos
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from investing_news import IndiceNoticias
+
+INICIO = datetime(2026, 10, 19, 0, 0)
+MOEDAS = ["EUR", "USD", "GBP", "JPY"]
+SIMBOLOS = [None, "EURUSD", "EURGBP", "USDJPY", "GBPJPY", "AUDCAD"]
+
+
+def _varredura(horario_atual, eventos, margem_minutos=15, symbol=None):
+    # Laço original (dentro_de_janela_de_noticia), restrito às moedas do par quando há símbolo
+    if symbol:
+        eventos = [e for e in eventos if e['moeda'] in (symbol[:3], symbol[3:6])]
+    for evento in eventos:
+        janela_inicio = evento['horario'] - timedelta(minutes=margem_minutos)
+        janela_fim = evento['horario'] + timedelta(minutes=margem_minutos)
+        if janela_inicio <= horario_atual <= janela_fim:
+            return True
+    return False
+
+
+def _evento(moeda, horario, descricao="evento"):
+    return {'horario': horario, 'moeda': moeda, 'descricao': descricao, 'impacto': 3}
+
+
+def _confere(indice, horario, eventos, margem, symbol):
+    evento = indice.bloqueio(horario, symbol)
+    assert (evento is not None) == _varredura(horario, eventos, margem, symbol), (horario, symbol)
+    if evento is not None:
+        # O evento devolvido é de uma moeda do par e a janela dele contém o horário
+        assert symbol is None or evento['moeda'] in (symbol[:3], symbol[3:6])
+        assert abs(evento['horario'] - horario) <= timedelta(minutes=margem)
+
+
+@pytest.mark.parametrize("margem", [0, 15, 30])
+def test_bloqueio_igual_a_varredura_linear(margem):
+    rng = np.random.default_rng(31)
+    eventos = []
+    for _ in range(40):
+        horario = INICIO + timedelta(minutes=int(rng.integers(0, 24 * 60)))
+        moeda = str(rng.choice(MOEDAS))
+        eventos.append(_evento(moeda, horario))
+        if rng.random() < 0.3:
+            # Eventos sobrepostos na mesma moeda (ex: vários indicadores no mesmo horário ou em seguida)
+            eventos.append(_evento(moeda, horario + timedelta(minutes=int(rng.integers(0, 2 * margem + 2)))))
+    indice = IndiceNoticias(eventos, margem)
+
+    # Horários aleatórios e as bordas exatas de cada janela (e um segundo além delas)
+    horarios = [INICIO + timedelta(seconds=int(s)) for s in rng.integers(-3600, 25 * 3600, 500)]
+    for evento in eventos:
+        for minutos in (-margem, margem):
+            borda = evento['horario'] + timedelta(minutes=minutos)
+            horarios += [borda, borda - timedelta(seconds=1), borda + timedelta(seconds=1)]
+    for horario in horarios:
+        for symbol in SIMBOLOS:
+            _confere(indice, horario, eventos, margem, symbol)
+
+
+def test_bordas_da_janela_incluidas():
+    evento = _evento("USD", INICIO + timedelta(hours=10))
+    indice = IndiceNoticias([evento], 15)
+    for minutos, bloqueado in ((-15, True), (15, True), (0, True)):
+        assert (indice.bloqueio(evento['horario'] + timedelta(minutes=minutos), "EURUSD") is not None) == bloqueado
+    assert indice.bloqueio(evento['horario'] - timedelta(minutes=15, microseconds=1), "EURUSD") is None
+    assert indice.bloqueio(evento['horario'] + timedelta(minutes=15, microseconds=1), "EURUSD") is None
+
+
+def test_eventos_sobrepostos_na_mesma_moeda():
+    # Janelas encadeadas: 10:00, 10:20 e 10:25 com margem de 15 min cobrem de 9:45 a 10:40 sem buraco
+    eventos = [_evento("EUR", INICIO + timedelta(hours=10, minutes=m), str(m)) for m in (25, 0, 20)]
+    indice = IndiceNoticias(eventos, 15)
+    for minuto in range(-16, 42):
+        horario = INICIO + timedelta(hours=10, minutes=minuto)
+        _confere(indice, horario, eventos, 15, "EURUSD")
+    assert indice.bloqueio(INICIO + timedelta(hours=10, minutes=35), "EURUSD")['descricao'] in ("20", "25")
+
+
+def test_par_bloqueado_so_pelas_suas_moedas():
+    horario = INICIO + timedelta(hours=14, minutes=30)
+    eur = IndiceNoticias([_evento("EUR", horario)])
+    usd = IndiceNoticias([_evento("USD", horario)])
+    assert eur.bloqueio(horario, "EURGBP") is not None
+    assert eur.bloqueio(horario, "GBPEUR") is not None
+    assert usd.bloqueio(horario, "EURGBP") is None
+    assert usd.bloqueio(horario, "EURUSD") is not None
+    assert usd.bloqueio(horario) is not None  # Sem símbolo: bloqueio global, como antes
@@ -0,0 +1,33 @@
+# Parser rápido do calendário (extrair_eventos) contra o parser de referência (extrair_eventos_bs4)
+# nos payloads de tests/fixtures/calendar. Payloads gravados com
+# `python investing_news.py --dias 7 --gravar tests/fixtures/calendar` entram automaticamente.
+
+import glob
+import os
+from datetime import date
+
+import pytest
+
+from investing_news import extrair_eventos, extrair_eventos_bs4
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "fixtures", "calendar", "*.html")))
+
+
+def _payload(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("caminho", FIXTURES, ids=os.path.basename)
+def test_extrair_eventos_igual_ao_bs4(caminho):
+    pytest.importorskip("bs4")
+    html_data = _payload(caminho)
+    hoje = date(2026, 10, 19)
+    eventos = extrair_eventos(html_data, hoje)
+    assert eventos == extrair_eventos_bs4(html_data, hoje)
+    assert eventos  # O payload precisa ter eventos que passam pelos filtros
+
+
+def test_linhas_comentadas_sao_ignoradas():
+    html_data = _payload(os.path.join(os.path.dirname(__file__), "fixtures", "calendar", "edge_cases.html"))
+    assert "Comentado" not in [evento["descricao"] for evento in extrair_eventos(html_data, date(2026, 10, 19))]
@@ -0,0 +1,115 @@
+# OutcomeResolver com um buffer falso: fechamentos por (símbolo, vela) e a última vela de cada símbolo
+
+from outcome_resolver import OutcomeResolver
+
+PERIOD = 300
+T0 = 1_700_000_100  # Abertura de uma vela M5
+
+
+class _Buffer:
+    def __init__(self):
+        self.closes = {}
+        self.last = {}
+
+    def add(self, symbol, bar_time, close):
+        self.closes[(symbol, bar_time)] = close
+        self.last[symbol] = max(self.last.get(symbol, bar_time), bar_time)
+
+    def lookup(self, symbol, bar_time):
+        return self.closes.get((symbol, bar_time)), self.last.get(symbol)
+
+
+def _velas(buffer, symbol, closes, start=T0):
+    for i, close in enumerate(closes):
+        buffer.add(symbol, start + i * PERIOD, close)
+
+
+def test_vencimentos_saem_em_ordem_do_heap():
+    buffer = _Buffer()
+    resolver = OutcomeResolver((1, 3), period=PERIOD)
+    # Sinais fora de ordem: a ordem de saída é a do vencimento, não a de entrada
+    resolver.add("GBPUSD", "sell ⬇️", 1.25, T0 + 2 * PERIOD)
+    resolver.add("EURUSD", "buy ⬆️", 1.10, T0)
+    resolver.add("USDJPY", "buy ⬆️", 150.0, T0 + PERIOD)
+    for symbol in ("EURUSD", "GBPUSD", "USDJPY"):
+        _velas(buffer, symbol, [1.0] * 10)
+    assert resolver.next_due() == T0 + PERIOD
+
+    results = resolver.resolve(T0 + 9 * PERIOD, buffer.lookup)
+    dues = [bar_time + bars * PERIOD for _, bar_time, bars, *_ in results]
+    assert dues == sorted(dues)
+    assert [(symbol, bars) for symbol, _, bars, *_ in results] == [
+        ("EURUSD", 1), ("USDJPY", 1), ("GBPUSD", 1), ("EURUSD", 3), ("USDJPY", 3), ("GBPUSD", 3)]
+    assert len(resolver) == 0 and resolver.next_due() is None
+
+
+def test_sucesso_pelo_fechamento_da_vela_de_saida():
+    buffer = _Buffer()
+    resolver = OutcomeResolver((1,), period=PERIOD)
+    resolver.add("EURUSD", "buy ⬆️", 1.10, T0)
+    resolver.add("GBPUSD", "sell ⬇️", 1.25, T0)
+    _velas(buffer, "EURUSD", [1.11, 1.0])
+    _velas(buffer, "GBPUSD", [1.26, 1.0])
+    results = resolver.resolve(T0 + PERIOD, buffer.lookup)
+    assert [(symbol, official, close, success) for symbol, _, _, official, _, _, close, success in results] == [
+        ("EURUSD", True, 1.11, True), ("GBPUSD", True, 1.26, False)]
+    assert resolver.stats()['expiry1_success'] == 1 and resolver.stats()['expiry1_failed'] == 1
+
+
+def test_adia_sem_vela_de_saida_e_expira_apos_max_delay():
+    buffer = _Buffer()
+    resolver = OutcomeResolver((1,), period=PERIOD, max_delay=3)
+    resolver.add("EURUSD", "buy ⬆️", 1.10, T0)
+    _velas(buffer, "EURUSD", [1.11])  # Só a vela do sinal: a seguinte ainda não chegou
+
+    due = T0 + PERIOD
+    for now in (due, due + PERIOD, due + 2 * PERIOD):
+        assert resolver.resolve(now, buffer.lookup) == []
+        assert len(resolver) == 1
+    assert resolver.stats()['deferred'] == 3
+
+    # Passadas max_delay velas, a expiração é dada como perdida (saída e sucesso None)
+    results = resolver.resolve(due + 3 * PERIOD, buffer.lookup)
+    assert [(close, success) for *_, close, success in results] == [(None, None)]
+    assert resolver.stats()['expired'] == 1 and len(resolver) == 0
+
+
+def test_vela_de_saida_atrasada_resolvida_quando_chega():
+    buffer = _Buffer()
+    resolver = OutcomeResolver((1,), period=PERIOD, max_delay=3)
+    resolver.add("EURUSD", "buy ⬆️", 1.10, T0)
+    _velas(buffer, "EURUSD", [1.11])
+    assert resolver.resolve(T0 + PERIOD, buffer.lookup) == []
+    _velas(buffer, "EURUSD", [1.0], start=T0 + PERIOD)
+    results = resolver.resolve(T0 + 2 * PERIOD, buffer.lookup)
+    assert [(close, success) for *_, close, success in results] == [(1.11, True)]
+
+
+def test_restaurado_ignora_expiracoes_antes_da_oficial():
+    resolver = OutcomeResolver((3, 1, 5), period=PERIOD)
+    resolver.add("EURUSD", "buy ⬆️", 1.10, T0, restored=True)
+    assert sorted(entry[-1] for entry in resolver.heap) == [3, 5]
+    buffer = _Buffer()
+    _velas(buffer, "EURUSD", [1.11, 1.09, 1.12, 1.10, 1.08, 1.0])
+    results = resolver.resolve(T0 + 5 * PERIOD, buffer.lookup)
+    assert [(bars, official) for _, _, bars, official, *_ in results] == [(3, True), (5, False)]
+
+    resolver = OutcomeResolver((3, 1, 5), period=PERIOD)
+    resolver.add("EURUSD", "buy ⬆️", 1.10, T0)
+    assert sorted(entry[-1] for entry in resolver.heap) == [1, 3, 5]
+
+
+def test_um_resultado_por_expiracao():
+    buffer = _Buffer()
+    resolver = OutcomeResolver((1, 3, 5), period=PERIOD)
+    resolver.add("EURUSD", "buy ⬆️", 1.10, T0)
+    closes = [1.11, 1.09, 1.12, 1.10, 1.08, 1.0]
+    _velas(buffer, "EURUSD", closes)
+
+    results = []
+    for i in range(1, len(closes) + 3):
+        results += resolver.resolve(T0 + i * PERIOD, buffer.lookup)
+    assert [(bars, close, success) for _, _, bars, _, _, _, close, success in results] == [
+        (1, 1.11, True), (3, 1.12, True), (5, 1.08, False)]
+    assert [official for _, _, _, official, *_ in results] == [True, False, False]
+    assert resolver.signals == {} and len(resolver) == 0
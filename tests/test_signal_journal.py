@@ -0,0 +1,144 @@
+# Diário de sinais: releitura após queda, checkpoint, pendentes restaurados e consultas
+
+import os
+import shutil
+from datetime import datetime
+
+import pytest
+
+import signal_journal
+from signal_journal import SignalJournal
+
+MOMENTO = datetime(2026, 10, 19, 10, 5).timestamp()
+DATA = "2026-10-19"
+
+
+@pytest.fixture(autouse=True)
+def _relogio_fixo(monkeypatch):
+    # Data e hora dos registros fixas (o diário indexa por data e hora do sinal)
+    monkeypatch.setattr(signal_journal.time, "time", lambda: MOMENTO)
+
+
+def _estado(journal):
+    return (journal.next_id, journal.totals, journal.pending, dict(journal.outcomes), dict(journal.offsets),
+            journal.result_offsets, journal.signal_info)
+
+
+def _preenche(journal):
+    # 5 sinais: EURUSD acerto, erro e expirado, GBPUSD acerto e USDJPY pendente
+    ids = [journal.record_signal(symbol, signal, price, 1_700_000_100 + i * 300, "10:05:00")
+           for i, (symbol, signal, price) in enumerate([("EURUSD", "buy ⬆️", 1.1), ("EURUSD", "sell ⬇️", 1.2),
+                                                        ("GBPUSD", "buy ⬆️", 1.3), ("USDJPY", "sell ⬇️", 150.0),
+                                                        ("EURUSD", "buy ⬆️", 1.15)])]
+    journal.record_result(ids[0], 1.11, True)
+    journal.record_result(ids[1], 1.21, False)
+    journal.record_result(ids[2], 1.31, True)
+    journal.record_expired(ids[4])
+    journal.record_expiry("EURUSD", 1_700_000_100, 3, 1.12, True)
+    journal.record_expiry("EURUSD", 1_700_000_100, 5, None, None)
+    return ids
+
+
+def test_linha_incompleta_no_final_e_truncada(tmp_path):
+    path = str(tmp_path / "signals.jsonl")
+    journal = SignalJournal(path)
+    _preenche(journal)
+    journal.close()
+    size = os.path.getsize(path)
+
+    for checkpoint in (True, False):
+        if not checkpoint:
+            os.remove(path + ".idx")
+        with open(path, "ab") as f:
+            f.write(b'{"t": "signal", "id": 6, "sym')  # Queda no meio da escrita
+        journal = SignalJournal(path)
+        assert os.path.getsize(path) == size
+        assert journal.totals == {'total': 5, 'success': 2, 'failed': 1}
+        assert journal.next_id == 6
+        journal.close()
+
+
+def test_retoma_do_checkpoint_relendo_so_o_final(tmp_path, monkeypatch):
+    path = str(tmp_path / "signals.jsonl")
+    journal = SignalJournal(path)
+    _preenche(journal)
+    journal.close()
+
+    applied = []
+    original = SignalJournal._apply
+    monkeypatch.setattr(SignalJournal, "_apply", lambda self, record, offset: (applied.append(record["t"]),
+                                                                              original(self, record, offset)))
+    journal = SignalJournal(path)
+    assert applied == []
+    rid = journal.record_signal("EURUSD", "buy ⬆️", 1.4, 1_700_003_000, "10:05:00")
+    journal.flush()  # Sem fechar: o checkpoint continua no tamanho anterior (como após uma queda)
+    journal.file.close()
+    restored = _estado(journal)
+
+    applied.clear()
+    journal = SignalJournal(path)
+    assert applied == ["signal"]
+    assert _estado(journal) == restored and rid in journal.pending
+    journal.close()
+
+    # Mesmo estado de uma releitura completa, sem checkpoint
+    os.remove(path + ".idx")
+    full = SignalJournal(path)
+    assert _estado(full) == restored
+    full.close()
+
+
+def test_checkpoint_de_outro_diario_e_descartado(tmp_path, capsys):
+    path = str(tmp_path / "signals.jsonl")
+    journal = SignalJournal(path)
+    journal.record_signal("AUDUSD", "buy ⬆️", 0.65, 1_700_000_100, "10:05:00")
+    journal.close()
+
+    # Diário trocado por outro maior (o tamanho do checkpoint ainda cabe nele)
+    other_path = str(tmp_path / "other.jsonl")
+    other = SignalJournal(other_path)
+    _preenche(other)
+    other.close()
+    shutil.copyfile(other_path, path)
+    size = os.path.getsize(path)
+    capsys.readouterr()
+
+    journal = SignalJournal(path)
+    assert "não corresponde" in capsys.readouterr().out
+    assert os.path.getsize(path) == size  # Nada truncado
+    expected = SignalJournal(other_path)
+    assert _estado(journal) == _estado(expected)
+    journal.close()
+    expected.close()
+
+
+def test_pendentes_totais_e_consultas_restaurados(tmp_path):
+    path = str(tmp_path / "signals.jsonl")
+    journal = SignalJournal(path)
+    ids = _preenche(journal)
+
+    def confere(journal):
+        assert journal.totals == {'total': 5, 'success': 2, 'failed': 1}
+        assert list(journal.pending) == [ids[3]]
+        assert journal.pending_by_symbol()["USDJPY"]["entry_price"] == 150.0
+        assert journal.win_rate() == {'resolved': 3, 'success': 2, 'failed': 1, 'win_rate': 2 / 3}
+        assert journal.win_rate(symbol="EURUSD")['win_rate'] == 0.5
+        assert journal.win_rate(symbol="EURUSD", hour=10) == {'resolved': 2, 'success': 1, 'failed': 1, 'win_rate': 0.5}
+        assert journal.win_rate(symbol="EURUSD", hour=11)['win_rate'] is None
+        assert journal.win_rate(hour=10)['resolved'] == 3
+        assert journal.win_rate(date=DATA)['success'] == 2
+        assert journal.win_rate(expiry=3)['win_rate'] == 1.0
+        assert journal.win_rate(expiry=5)['resolved'] == 0
+        records = journal.records("EURUSD", DATA)
+        assert [(r["id"], r.get("exit_price"), r.get("success")) for r in records] == [
+            (ids[0], 1.11, True), (ids[1], 1.21, False), (ids[4], None, None)]
+        assert journal.records("GBPUSD", "2026-10-20") == []
+
+    confere(journal)
+    journal.close()
+    for checkpoint in (True, False):
+        if not checkpoint:
+            os.remove(path + ".idx")
+        journal = SignalJournal(path)
+        confere(journal)
+        journal.close()
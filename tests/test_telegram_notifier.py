@@ -0,0 +1,113 @@
+# Fila do Telegram com uma sessão HTTP falsa: agrupamento, limite de envio, backoff e reenvio
+
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import telegram_notifier
+from telegram_notifier import MAX_MESSAGE_LENGTH, TelegramQueue
+
+
+class _Resposta:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body if body is not None else {}
+        self.text = str(self.body)
+
+    def json(self):
+        if isinstance(self.body, Exception):
+            raise self.body
+        return self.body
+
+
+class _Sessao:
+    # Responde com `responder(texto)` (ou com a próxima resposta da lista) e guarda os envios
+    def __init__(self, responder):
+        self.responder = responder
+        self.posts = []
+
+    def post(self, url, data, timeout):
+        self.posts.append((data["chat_id"], data["text"]))
+        if callable(self.responder):
+            response = self.responder(data["text"])
+        else:
+            response = self.responder.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def fila():
+    def cria(responder, **params):
+        params = dict(dict(min_interval=0, coalesce_seconds=0.2), **params)
+        q = TelegramQueue(**params)
+        q.session = _Sessao(responder)
+        return q
+    return cria
+
+
+@pytest.fixture
+def esperas(monkeypatch):
+    # Relógio do módulo sem dormir de verdade: guarda as esperas pedidas
+    sleeps = []
+    monkeypatch.setattr(telegram_notifier, "time", SimpleNamespace(monotonic=time.monotonic, sleep=sleeps.append))
+    return sleeps
+
+
+def test_rajada_agrupada_em_mensagens_de_ate_4096(fila):
+    q = fila(lambda text: _Resposta(200))
+    messages = [f"{i:03d} " + "x" * 496 for i in range(30)]
+    for message in messages:
+        q.put("token", "A", message)
+    q.put("token", "B", "outro chat")
+    assert q.flush(timeout=10)
+
+    posts = q.session.posts
+    assert all(len(text) <= MAX_MESSAGE_LENGTH for _, text in posts)
+    digests = [text for chat, text in posts if chat == "A"]
+    assert "\n\n".join(digests).split("\n\n") == messages  # Nada perdido, na ordem
+    assert len(digests) == 4  # 8 mensagens de 500 caracteres (mais os separadores) por envio
+    assert [text for chat, text in posts if chat == "B"] == ["outro chat"]
+    assert q.stats()['sent'] == len(posts) and q.stats()['coalesced'] == 31 - len(posts)
+    assert q.stats()['failed'] == 0
+
+
+def test_429_espera_o_retry_after(fila, esperas):
+    q = fila([_Resposta(429, {"parameters": {"retry_after": 7}}), _Resposta(429, ValueError("sem JSON")),
+              _Resposta(200)], backoff=0.5)
+    assert q._post("token", "A", "oi") == 200
+    assert esperas == [7.0, 0.5]  # Sem retry_after legível, espera o backoff
+    assert len(q.session.posts) == 3
+
+
+def test_backoff_limitado_pelas_tentativas(fila, esperas):
+    q = fila([_Resposta(500), requests.ConnectionError("rede"), _Resposta(502), _Resposta(503), _Resposta(200)],
+             max_retries=3, backoff=0.5)
+    assert q._post("token", "A", "oi") is None  # A quinta resposta nunca é pedida
+    assert len(q.session.posts) == 4
+    assert esperas == [0.5, 1.0, 2.0, 4.0]
+
+
+def test_erro_permanente_nao_repete(fila, esperas):
+    q = fila([_Resposta(403, {"description": "bot bloqueado"})])
+    assert q._post("token", "A", "oi") == 403
+    assert esperas == [] and len(q.session.posts) == 1
+
+
+def test_mensagem_agrupada_recusada_reenviada_uma_a_uma(fila):
+    # HTML inválido em uma das mensagens: o Telegram recusa o agrupamento inteiro
+    q = fila(lambda text: _Resposta(400) if "<b>" in text and "</b>" not in text else _Resposta(200))
+    messages = ["resultado 1", "resultado <b>2", "resultado 3"]
+    for message in messages:
+        q.put("token", "A", message)
+    assert q.flush(timeout=10)
+    assert [text for _, text in q.session.posts] == ["\n\n".join(messages)] + messages
+    assert q.stats()['sent'] == 2 and q.stats()['failed'] == 1
+
+    # O worker continua vivo para as próximas mensagens
+    q.put("token", "A", "depois")
+    assert q.flush(timeout=10)
+    assert q.session.posts[-1] == ("A", "depois") and q.worker.is_alive()
@@ -0,0 +1,76 @@
+# Índice de gatilhos: sempre que evaluate_entry dispararia com um preço, check() precisa acusar o toque
+
+import numpy as np
+import pytest
+
+from benchmark import synthetic_rates
+from signals import evaluate_entry
+from support_resistance import calculate_support_resistance
+from symbol_registry import get_symbol_info, set_symbol_source
+from trigger_index import TriggerIndex
+
+
+@pytest.fixture(autouse=True)
+def _sem_fonte_de_dados():
+    set_symbol_source(None)
+    yield
+    set_symbol_source(None)
+
+
+def _caminho(rng, open_points, levels):
+    # Preços da vela em pontos: passeio aleatório com saltos exatos para um nível e saltos que
+    # atravessam um nível sem parar nele (sem nenhum preço dentro da faixa)
+    price = open_points
+    for _ in range(60):
+        choice = rng.random()
+        if choice < 0.1 and levels:
+            price = int(rng.choice(levels))
+        elif choice < 0.25 and levels:
+            level = int(rng.choice(levels))
+            jump = int(rng.integers(3, 40))
+            price = level + jump if price < level else level - jump
+        else:
+            price += int(rng.integers(-15, 16))
+        yield price
+
+
+@pytest.mark.parametrize("symbol", ["EURUSD", "USDJPY"])
+@pytest.mark.parametrize("tolerance_pips", [0.5, 0])
+def test_check_acusa_todo_toque_que_gera_sinal(symbol, tolerance_pips):
+    rng = np.random.default_rng(21)
+    info = get_symbol_info(symbol)
+    rates = synthetic_rates(2000, symbol, 22)
+    retracement = {symbol: {'has_retraced': True, 'body_size': 0}}
+    index = TriggerIndex(tolerance_pips)
+    fired = crossed = 0
+
+    for _ in range(120):
+        end = int(rng.integers(100, len(rates)))
+        window = rates[end - 100:end].copy()
+        support, resistance = calculate_support_resistance(window, symbol)
+        if support is None:
+            continue
+        min_distance_pips = int(rng.integers(0, 6))
+        # Abertura entre os níveis (ou fora, às vezes), como no início de uma vela M5
+        open_points, support_points, resistance_points = (int(p) for p in info.to_points(
+            [window[-1]['open'], support, resistance]))
+        if rng.random() < 0.8 and resistance_points - support_points > 2:
+            open_points = int(rng.integers(support_points + 1, resistance_points))
+        window[-1]['open'] = info.to_price(open_points)
+        index.arm(symbol, int(window[-1]['time']), float(window[-1]['open']), support, resistance, min_distance_pips)
+
+        previous = None
+        for price in _caminho(rng, open_points, [support_points, resistance_points]):
+            touched = index.check(symbol, float(info.to_price(price)))
+            # O preço passou por todos os pontos entre o anterior e o atual
+            low, high = (price, price) if previous is None else (min(previous, price), max(previous, price))
+            candidates = [price] + [level for level in (support_points, resistance_points)
+                                    if low <= level <= high and level != price]
+            for candidate in candidates:
+                window[-1]['close'] = info.to_price(candidate)
+                if evaluate_entry(window, support, resistance, symbol, min_distance_pips, retracement):
+                    fired += 1
+                    crossed += candidate != price
+                    assert touched, (symbol, support, resistance, previous, price, candidate)
+            previous = price
+    assert fired and crossed
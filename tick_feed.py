@@ -0,0 +1,125 @@
+# === tick_feed.py ===
+# Atualização da vela em formação a partir do fluxo de ticks de cada símbolo.
+#
+# Em vez de buscar as velas de novo a cada passada, o robô consulta só os ticks novos desde o
+# último recebido (copy_ticks_from) e monta com eles a vela M5 em formação (open/high/low/close
+# e volume de ticks), gravando-a no buffer do mt5_collector. A vela que fechou continua vindo do
+# MT5, com uma sincronização por símbolo a cada nova vela.
+#
+# Cada tick também atualiza o controle de retração (retracement_data), com a mesma regra de
+# main.py aplicada à vela parcial de cada tick, e a passada de análise só precisa rodar para
+# os símbolos cuja vela mudou.
+
+import numpy as np
+
+from mt5_collector import get_buffered_rates, get_ticks, update_forming_bar, timeframe_seconds
+
+# Máximo de ticks buscados por consulta
+MAX_TICKS = 100000
+
+
+class TickFeed:
+    """
+    Mantém a vela em formação de cada símbolo a partir dos ticks.
+
+    :param timeframe: Timeframe das velas mantidas (5 = M5)
+    :param count: Quantidade de velas lidas do buffer na sincronização
+    :param min_retr_pct: Percentual mínimo de retração (mesma regra de main.py)
+    """
+
+    def __init__(self, timeframe=5, count=100, min_retr_pct=0.2):
+        self.timeframe = timeframe
+        self.period = timeframe_seconds(timeframe)
+        self.count = count
+        self.min_retr_pct = min_retr_pct
+        self.state = {}  # símbolo -> vela em formação montada pelos ticks
+        self.polls = 0
+        self.ticks_received = 0
+        self.changes = 0
+
+    def _start_bar(self, symbol, bar_time, sync=True):
+        # Nova vela: a anterior (fechada) vem do MT5 na sincronização do buffer
+        if sync and get_buffered_rates(symbol, self.timeframe, self.count) is None:
+            return None
+        state = {
+            'bar_time': bar_time,
+            'open': None, 'high': None, 'low': None, 'close': None, 'volume': 0,
+            'last_msc': bar_time * 1000 - 1,
+        }
+        self.state[symbol] = state
+        return state
+
+    def _poll_symbol(self, symbol, retracement_data):
+        state = self.state.get(symbol)
+        if state is None:
+            rates = get_buffered_rates(symbol, self.timeframe, self.count)
+            if rates is None:
+                return False
+            state = self._start_bar(symbol, int(rates[-1]['time']), sync=False)
+
+        # Ticks a partir do segundo do último tick recebido; os já processados são descartados.
+        # (Ticks novos com o mesmo time_msc do último recebido também são descartados.)
+        ticks = get_ticks(symbol, state['last_msc'] // 1000, MAX_TICKS)
+        if ticks is None or len(ticks) == 0:
+            return False
+        ticks = ticks[(ticks['time_msc'] > state['last_msc']) & (ticks['bid'] > 0)]
+        if not len(ticks):
+            return False
+        self.ticks_received += len(ticks)
+        last_msc = int(ticks['time_msc'][-1])
+
+        buckets = ticks['time'] // self.period * self.period
+        changed = False
+        for bar_time in np.unique(buckets):
+            prices = ticks['bid'][buckets == bar_time]
+            bar_time = int(bar_time)
+            if bar_time < state['bar_time']:
+                continue
+            if bar_time > state['bar_time']:
+                state = self._start_bar(symbol, bar_time)
+                if state is None:
+                    return changed
+                changed = True
+
+            before = (state['open'], state['high'], state['low'], state['close'])
+            if state['open'] is None:
+                state['open'] = state['high'] = state['low'] = float(prices[0])
+
+            # Máxima/mínima acumuladas tick a tick, para avaliar a retração de cada vela parcial
+            highs = np.maximum.accumulate(np.maximum(prices, state['high']))
+            lows = np.minimum.accumulate(np.minimum(prices, state['low']))
+            state['high'], state['low'], state['close'] = float(highs[-1]), float(lows[-1]), float(prices[-1])
+            state['volume'] += len(prices)
+            changed |= before != (state['open'], state['high'], state['low'], state['close'])
+
+            if retracement_data is not None and symbol in retracement_data:
+                body = np.abs(prices - state['open'])
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    retr_up = (highs - prices) / body
+                    retr_down = (prices - lows) / body
+                retraced = (body > 0.00001) & ((retr_up >= self.min_retr_pct) | (retr_down >= self.min_retr_pct))
+                if retraced.any():
+                    retracement_data[symbol]['has_retraced'] = True
+                retracement_data[symbol]['body_size'] = float(body[-1])
+
+            update_forming_bar(symbol, self.timeframe, state['bar_time'], state['open'],
+                               state['high'], state['low'], state['close'], state['volume'])
+
+        state['last_msc'] = last_msc
+        return changed
+
+    def poll(self, symbols, retracement_data=None):
+        """
+        Processa os ticks novos de cada símbolo.
+
+        :param symbols: Símbolos a consultar
+        :param retracement_data: Controle de retração de main.py, atualizado a cada tick (opcional)
+        :return: Lista dos símbolos cuja vela em formação mudou (ou que abriram vela nova)
+        """
+        self.polls += 1
+        changed = [symbol for symbol in symbols if self._poll_symbol(symbol, retracement_data)]
+        self.changes += len(changed)
+        return changed
+
+    def stats(self):
+        return {'polls': self.polls, 'ticks': self.ticks_received, 'changes': self.changes}
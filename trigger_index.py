@@ -0,0 +1,108 @@
+# === trigger_index.py ===
+# Índice de gatilhos de preço: só roda as regras completas quando o preço toca um nível.
+#
+# O suporte e a resistência são calculados ignorando as 6 velas mais recentes, então não mudam
+# enquanto a vela M5 está em formação. A cada nova vela o índice é "armado" por símbolo com as
+# faixas (nível ± tolerância) dos lados que ainda podem gerar sinal nessa vela (abertura entre
+# os níveis e distância mínima respeitada). Depois disso, cada preço novo é conferido em O(1)
+# contra as faixas; lateralização, pavios e timeframes maiores só são avaliados nos toques.
+#
+# Níveis, faixas e preços são comparados em pontos inteiros (symbol_registry); levels_of
+# continua devolvendo os níveis como preço.
+
+import numpy as np
+
+from symbol_registry import get_symbol_info
+
+
+class TriggerIndex:
+    """
+    Faixas de suporte/resistência por símbolo, armadas a cada vela.
+
+    :param tolerance_pips: Meia largura (em pips) da faixa em torno de cada nível
+    """
+
+    def __init__(self, tolerance_pips=0.5):
+        self.tolerance_pips = tolerance_pips
+        self.levels = {}  # símbolo -> estado armado na vela atual
+        self.arms = 0
+        self.checks = 0
+        self.touches = 0
+
+    def needs_arming(self, symbol, bar_time, open_price):
+        """True se o símbolo ainda não foi armado para esta vela (ou se a abertura mudou)."""
+        entry = self.levels.get(symbol)
+        return entry is None or entry['bar_time'] != bar_time or entry['open'] != open_price
+
+    def arm(self, symbol, bar_time, open_price, support, resistance, min_distance_pips):
+        """
+        Arma o símbolo para a vela com os níveis do último cálculo de suporte/resistência.
+
+        Um lado só fica armado se puder gerar sinal nesta vela (mesmas condições de
+        evaluate_entry que não dependem do preço atual); níveis NaN desarmam os dois lados.
+        """
+        info = get_symbol_info(symbol)
+        tolerance = self.tolerance_pips * info.pip_points
+        inside = support < open_price < resistance  # Falso se algum nível for NaN
+        if inside:
+            open_points, support_points, resistance_points = (int(p) for p in info.to_points([open_price, support, resistance]))
+            buy = abs(open_points - support_points) >= min_distance_pips * info.pip_points
+            sell = abs(resistance_points - open_points) >= min_distance_pips * info.pip_points
+        else:
+            support_points = resistance_points = None
+            buy = sell = False
+        self.levels[symbol] = {
+            'bar_time': bar_time,
+            'open': open_price,
+            'point': info.point,
+            'support': support,
+            'resistance': resistance,
+            'support_points': support_points,
+            'resistance_points': resistance_points,
+            'buy_band': (support_points - tolerance, support_points + tolerance) if buy else None,
+            'sell_band': (resistance_points - tolerance, resistance_points + tolerance) if sell else None,
+            'last_price': None,
+        }
+        self.arms += 1
+
+    def check(self, symbol, price):
+        """
+        Confere um preço novo contra as faixas armadas do símbolo (O(1)).
+
+        :return: True se o preço está dentro de uma faixa ou cruzou um nível desde o último preço
+        """
+        entry = self.levels.get(symbol)
+        if entry is None:
+            return False
+        self.checks += 1
+        price = int(np.rint(price / entry['point']))  # Em pontos
+        last_price = entry['last_price']
+        entry['last_price'] = price
+
+        for band, level in ((entry['buy_band'], entry['support_points']), (entry['sell_band'], entry['resistance_points'])):
+            if band is None:
+                continue
+            crossed = last_price is not None and min(last_price, price) <= level <= max(last_price, price)
+            if band[0] <= price <= band[1] or crossed:
+                self.touches += 1
+                return True
+        return False
+
+    def levels_of(self, symbols):
+        """Suportes e resistências armados dos símbolos, na ordem recebida."""
+        return ([self.levels[s]['support'] for s in symbols], [self.levels[s]['resistance'] for s in symbols])
+
+    def stats(self):
+        return {'arms': self.arms, 'checks': self.checks, 'touches': self.touches}
+
+    def export(self):
+        """Faixas armadas e contadores, para o snapshot de reinício a quente."""
+        return {'levels': self.levels, **self.stats()}
+
+    def restore(self, state):
+        """
+        Restaura as faixas armadas e os contadores do snapshot. Faixas de uma vela que já
+        passou são rearmadas normalmente (needs_arming compara a abertura da vela).
+        """
+        self.levels.update(state['levels'])
+        self.arms, self.checks, self.touches = state['arms'], state['checks'], state['touches']